@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Game, Player, Syndication, PreliminaryLine, StatisticsCache
+from django.conf import settings
+from django.db import transaction
+from .models import CustomUser, Game, Player, Syndication, PreliminaryLine, StatisticsCache, Leaderboard
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 
 
@@ -34,11 +36,110 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('email',)
 
 
+class RebuildStatsOnChangeMixin:
+    """
+    Game and player edits change the public pages, so rebuild the statistics cache (which also
+    bumps the archive version behind the page ETags) once the change is committed. The rebuild
+    runs in a background thread so the admin page doesn't wait for it, and edits saved while one
+    runs share a single rebuild after it. With PRERENDER_ON_SAVE the edited games' pre-rendered
+    pages are re-rendered along with it, whichever game is the newest.
+    """
+    # Attribute holding the id of the game an edited object belongs to
+    game_id_attr = 'pk'
+
+    def _rebuild_stats(self, game_ids):
+        # Imported here so the admin registration at startup doesn't load the stats engine
+        from .stats_utils import update_statistics_cache
+        from .swr import run_coalesced_in_background
+
+        def rebuild():
+            if settings.PRERENDER_ON_SAVE:
+                from .prerender import mark_edited
+                mark_edited(game_ids)
+            run_coalesced_in_background('update_statistics_cache', update_statistics_cache)
+        transaction.on_commit(rebuild)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self._rebuild_stats([getattr(obj, self.game_id_attr)])
+
+    def delete_model(self, request, obj):
+        game_id = getattr(obj, self.game_id_attr)
+        super().delete_model(request, obj)
+        self._rebuild_stats([game_id])
+
+    def delete_queryset(self, request, queryset):
+        game_ids = set(queryset.values_list(self.game_id_attr, flat=True))
+        super().delete_queryset(request, queryset)
+        self._rebuild_stats(game_ids)
+
+
+class GameAdmin(RebuildStatsOnChangeMixin, admin.ModelAdmin):
+    list_display = ('id', 'air_date', 'episode_number', 'episode_title', 'submitted_by')
+    list_select_related = ('submitted_by',)
+    list_filter = ('episode_number',)
+    date_hierarchy = 'air_date'
+    search_fields = ('=id', 'episode_title')
+    autocomplete_fields = ('submitted_by',)
+    list_per_page = 50
+    show_full_result_count = False
+
+
+class PlayerAdmin(RebuildStatsOnChangeMixin, admin.ModelAdmin):
+    # __str__ reads game.air_date, so the game is joined rather than fetched per row
+    list_display = ('name', 'game', 'podium_number', 'total_winnings')
+    list_select_related = ('game',)
+    list_filter = ('podium_number', 'won_tiebreaker')
+    search_fields = ('name', '=game__id')
+    autocomplete_fields = ('game',)
+    list_per_page = 50
+    show_full_result_count = False
+    game_id_attr = 'game_id'
+
+
+class PreliminaryLineAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'game', 'round_number', 'episode_correct_count')
+    list_select_related = ('game',)
+    list_filter = ('round_number', 'episode_correct_count')
+    search_fields = ('topic', '=game__id')
+    autocomplete_fields = ('game',)
+    list_per_page = 50
+    show_full_result_count = False
+
+
+class LeaderboardAdmin(admin.ModelAdmin):
+    list_display = ('name', 'score', 'game_type', 'play_type', 'game_played', 'date')
+    list_select_related = ('game_played',)
+    list_filter = ('game_type', 'play_type', 'date')
+    search_fields = ('name',)
+    raw_id_fields = ('game_played',)
+    list_per_page = 50
+    show_full_result_count = False
+
+
+class StatisticsCacheAdmin(admin.ModelAdmin):
+    list_display = ('id', 'updated_at', 'through_game', 'format_version', 'encoding', 'keyframe')
+    list_select_related = ('through_game',)
+    raw_id_fields = ('through_game',)
+    # The stored payload and pre-rendered HTML are large and not meant to be edited by hand, and
+    # the delta chain links only make sense as written
+    exclude = ('payload', 'fragments')
+    readonly_fields = ('updated_at', 'format_version', 'encoding', 'data', 'base', 'keyframe')
+    list_per_page = 50
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('data', 'payload', 'fragments')
+        return queryset
+
+
 # Register your models here.
 admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(Game)
-admin.site.register(Player)
+admin.site.register(Game, GameAdmin)
+admin.site.register(Player, PlayerAdmin)
 admin.site.register(Syndication)
-admin.site.register(PreliminaryLine)
-admin.site.register(StatisticsCache)
-
+admin.site.register(PreliminaryLine, PreliminaryLineAdmin)
+admin.site.register(Leaderboard, LeaderboardAdmin)
+admin.site.register(StatisticsCache, StatisticsCacheAdmin)
@@ -0,0 +1,16 @@
+from django.contrib.staticfiles import finders
+from django.core.checks import Error, Tags, register
+
+# The front-end build output (npm run build) the templates link to. static/dist is not committed,
+# so a checkout or image that skipped the build would otherwise serve unstyled pages without charts
+BUILT_ASSETS = ['dist/site.css', 'dist/vendor/chart.umd.js', 'dist/vendor/tone.js']
+
+
+@register(Tags.staticfiles)
+def check_built_assets(app_configs, **kwargs):
+    """
+    Runs with manage.py check, runserver and collectstatic, so a missing build stops a deploy.
+    """
+    return [Error(f'Static file {path} is missing.', hint='Build them with npm install && npm run build.',
+                  id='archives.E001')
+            for path in BUILT_ASSETS if not finders.find(path)]
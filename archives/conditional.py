@@ -0,0 +1,64 @@
+"""
+ETags for the public pages and the leaderboard fragments. They are derived from the archive
+data version (the newest StatisticsCache row, written after every game save) rather than from
+the rendered body, so a request whose If-None-Match still matches is answered with 304 before
+the view renders anything. The archive pages take the version from the read model
+(archives/read_model.py), so usually without a query at all. The leaderboard ETags hash the
+cached leaderboard tables, which are just as cheap to get.
+"""
+from .read_model import get_snapshot
+from .syndication import get_syndication_by_state
+from gameplay.leaderboards import get_leaderboard_tables
+from django.conf import settings
+import hashlib
+import os
+
+_release = None
+
+
+def template_release():
+    """
+    Identifies the deployed templates, so a deploy that changes a page also changes its ETag.
+    Uses APP_RELEASE when set, otherwise the newest template modification time.
+    """
+    global _release
+    if _release is None:
+        release = settings.APP_RELEASE
+        if not release:
+            latest = 0
+            for directory in settings.TEMPLATES[0]['DIRS']:
+                for dirpath, _, filenames in os.walk(directory):
+                    for filename in filenames:
+                        latest = max(latest, os.path.getmtime(os.path.join(dirpath, filename)))
+            release = str(int(latest))
+        _release = release
+    return _release
+
+
+def _etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def archive_etag(request, *args, **kwargs):
+    # The navigation differs per user, so only anonymous pages are shared
+    if request.user.is_authenticated:
+        return None
+    return _etag(template_release(), get_snapshot().version, request.get_full_path())
+
+
+def show_info_etag(request):
+    if request.user.is_authenticated:
+        return None
+    return _etag(template_release(), *get_syndication_by_state()['states'])
+
+
+def static_page_etag(request):
+    if request.user.is_authenticated:
+        return None
+    return _etag(template_release(), request.path)
+
+
+def leaderboard_etag(request):
+    # Taken from the cached tables themselves, so a 304 always matches what a 200 would send
+    tables = get_leaderboard_tables(request.GET.get('game_type', 'prelim'), request.GET.get('play_type', 'solo'))
+    return _etag(template_release(), tables['etag'])
@@ -0,0 +1,85 @@
+"""
+Primary/replica routing, active when a 'replica' database is configured (DB_REPLICA_HOST or
+DB_REPLICA_NAME, see settings).
+
+Reads only go to the replica inside use_replica() (the @replica_reads public views and the
+statistics rebuild); everything else, including the scorekeeper flows and the admin, reads
+from primary. The first write in a request pins the rest of that request to primary, and
+ReplicaPinMiddleware carries the pin over to the same client's next requests for
+DB_REPLICA_PIN_SECONDS so they read their own writes despite replication lag.
+"""
+from django.conf import settings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+REPLICA = 'replica'
+PIN_COOKIE = 'primary_pin'
+
+_use_replica = ContextVar('use_replica', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+@contextmanager
+def use_replica():
+    """
+    Lets reads in this block go to the replica (unless the request is pinned to primary).
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not _pinned.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        # No opinion: related lookups stay on their instance's database, everything else uses default
+        return None
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db == 'default'
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins requests to primary while the client's pin cookie is set, and sets it after any request
+    that wrote to the database.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'DB_REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        token = _pinned.set(PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if _pinned.get() and PIN_COOKIE not in request.COOKIES:
+                response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+            return response
+        finally:
+            _pinned.reset(token)
@@ -46,11 +46,31 @@ class PreliminaryLineForm(forms.ModelForm):
         model = PreliminaryLine
         fields = '__all__'
         widgets = {
+            # Entered by game id; a dropdown would load every game in the archive
+            'game': forms.NumberInput(attrs={'min': 1}),
             'order_description': forms.TextInput(attrs={'placeholder': 'e.g., Lowest to Highest'}),
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['game'].queryset = Game.objects.order_by('-id')
-        self.fields['game'].label_from_instance = lambda obj: f"Ep {obj.id}: {obj.episode_title}"
 
+
+class PreliminaryRoundForm(PreliminaryLineForm):
+    """
+    One round in a batch entry; the game is chosen once for the whole batch.
+    """
+    class Meta(PreliminaryLineForm.Meta):
+        exclude = ('game',)
+        widgets = {
+            'round_number': forms.HiddenInput(),
+            'order_description': forms.TextInput(attrs={'placeholder': 'e.g., Lowest to Highest'}),
+        }
+
+    def has_changed(self):
+        # The round number is prefilled, so a round only counts as entered once something else is
+        return any(name != 'round_number' for name in self.changed_data)
+
+
+PreliminaryRoundFormSet = forms.formset_factory(PreliminaryRoundForm, extra=0, max_num=4, validate_max=True)
+
+
+class PreliminaryBatchGameForm(forms.Form):
+    game = forms.ModelChoiceField(queryset=Game.objects.all(), widget=forms.NumberInput(attrs={'min': 1}))
@@ -0,0 +1,64 @@
+import statistics
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = 'Measures per-request latency with and without persistent database connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/statistics/', help='URL path to request.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per mode.')
+        parser.add_argument('--max-age', type=int, default=None,
+                            help='CONN_MAX_AGE for the persistent run (defaults to the configured value, or 60).')
+
+    def handle(self, *args, **options):
+        application = get_wsgi_application()
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        max_age = options['max_age']
+        if max_age is None:
+            max_age = connection.settings_dict.get('CONN_MAX_AGE') or 60
+
+        self.stdout.write(self.style.NOTICE(
+            f"Benchmarking {options['path']} ({options['requests']} requests per mode, "
+            f"engine {connection.settings_dict['ENGINE']})..."))
+
+        for label, age in (('per-request connections (CONN_MAX_AGE=0)', 0),
+                           (f'persistent connections (CONN_MAX_AGE={max_age})', max_age)):
+            timings = self._run(application, host, options['path'], options['requests'], age)
+            timings.sort()
+            self.stdout.write(
+                f"{label}: mean {statistics.mean(timings):.2f} ms, "
+                f"p50 {timings[len(timings) // 2]:.2f} ms, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+
+    def _run(self, application, host, path, count, max_age):
+        """
+        Drives the real WSGI handler (not the test client, which suppresses connection cleanup)
+        so request_started/request_finished close or keep connections exactly as under gunicorn.
+        """
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+        def start_response(status, headers, exc_info=None):
+            if not status.startswith(('2', '3')):
+                raise RuntimeError(f'{path} responded with {status}')
+
+        timings = []
+        for _ in range(count):
+            environ = {'PATH_INFO': path, 'HTTP_HOST': host}
+            setup_testing_defaults(environ)
+            start = time.perf_counter()
+            response = application(environ, start_response)
+            for _chunk in response:
+                pass
+            response.close()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+# python manage.py bench_connections --path /statistics/ --requests 200
@@ -0,0 +1,143 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from archives.models import Game, CustomUser
+from archives.stats_utils import update_statistics_cache
+from archives.synthetic import generate_archive, clear_archive
+
+
+class Command(BaseCommand):
+    help = ('Generates synthetic archives at one or more scales and times the statistics rebuild and the '
+            'public/gameplay views, reporting wall time and query counts as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, nargs='+', default=[100],
+                            help='Archive sizes to benchmark, e.g. --games 100 10000 100000.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (after one warm-up).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic archive.')
+        parser.add_argument('--output', help='Write results as JSON to this file.')
+        parser.add_argument('--compare', help='Previous JSON results to compare against.')
+        parser.add_argument('--reuse', action='store_true',
+                            help='Benchmark the data already in the database instead of generating archives.')
+        parser.add_argument('--keep', action='store_true', help='Leave the last synthetic archive in place.')
+
+    def handle(self, *args, **options):
+        if options['reuse']:
+            scales = [None]
+        else:
+            if Game.objects.exists():
+                raise CommandError('Database already contains games. Point DB_NAME at a scratch database '
+                                   '(e.g. DB_ENGINE=sqlite DB_NAME=/tmp/bench.sqlite3) or pass --reuse.')
+            scales = options['games']
+
+        results = {'commit': self._git_revision(), 'python': platform.python_version(),
+                   'database': connection.vendor, 'scales': []}
+
+        for num_games in scales:
+            if num_games is not None:
+                self.stdout.write(self.style.NOTICE(f'Generating synthetic archive of {num_games} games...'))
+                start = time.perf_counter()
+                generate_archive(num_games, seed=options['seed'])
+                self.stdout.write(f'  generated in {time.perf_counter() - start:.1f}s')
+
+            scale = {'games': Game.objects.count(), 'benchmarks': self._run_benchmarks(options['repeat'])}
+            results['scales'].append(scale)
+            self._report(scale)
+
+            if num_games is not None and not (options['keep'] and num_games == scales[-1]):
+                clear_archive()
+
+        if options['compare']:
+            self._compare(results, options['compare'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _run_benchmarks(self, repeat):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        client = Client(HTTP_HOST=host)
+        user = CustomUser.objects.filter(is_superuser=True).first()
+        if user is None:
+            user = CustomUser.objects.create_superuser(email='benchmark@example.com', password=None)
+        client.force_login(user)
+
+        game_ids = list(Game.objects.order_by('-air_date', '-episode_number').values_list('id', flat=True))
+        middle_game = game_ids[len(game_ids) // 2] if game_ids else 0
+        last_page = (len(game_ids) - 1) // 5 + 1 if game_ids else 1
+
+        benchmarks = [
+            ('update_statistics_cache', update_statistics_cache),
+            ('index', lambda: client.get(reverse('index'))),
+            ('recent_games_view', lambda: client.get(reverse('recent_games'))),
+            ('recent_games_view (last page)', lambda: client.get(reverse('recent_games'), {'page': last_page})),
+            ('statistics_view', lambda: client.get(reverse('statistics'))),
+            ('game_permalink_view', lambda: client.get(reverse('game_permalink', args=[middle_game]))),
+            ('prelim_game_view', lambda: client.get(reverse('gameplay:prelim_game'))),
+            ('get_leaderboard_api', lambda: client.get(reverse('gameplay:get_leaderboard_api'),
+                                                       {'game_type': 'prelim', 'play_type': 'solo'})),
+        ]
+
+        results = []
+        for name, func in benchmarks:
+            self._check(name, func())
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    self._check(name, func())
+                    timings.append((time.perf_counter() - start) * 1000)
+            results.append({'name': name, 'runs': repeat, 'queries': len(ctx.captured_queries),
+                            'min_ms': round(min(timings), 3), 'median_ms': round(statistics.median(timings), 3),
+                            'mean_ms': round(statistics.mean(timings), 3)})
+        return results
+
+    def _check(self, name, result):
+        # Views return HTTP responses; the statistics rebuild returns its data, which isn't checked
+        status_code = getattr(result, 'status_code', None)
+        if status_code is not None and status_code >= 400:
+            raise CommandError(f'{name} responded with {status_code}')
+
+    def _report(self, scale):
+        self.stdout.write(self.style.SUCCESS(f"\n{scale['games']} games"))
+        self.stdout.write(f"{'benchmark':<32}{'median ms':>12}{'min ms':>12}{'queries':>10}")
+        for b in scale['benchmarks']:
+            self.stdout.write(f"{b['name']:<32}{b['median_ms']:>12.2f}{b['min_ms']:>12.2f}{b['queries']:>10}")
+
+    def _compare(self, results, path):
+        with open(path) as f:
+            previous = {s['games']: {b['name']: b for b in s['benchmarks']} for s in json.load(f)['scales']}
+        for scale in results['scales']:
+            baseline = previous.get(scale['games'])
+            if not baseline:
+                self.stdout.write(self.style.WARNING(f"No baseline for {scale['games']} games in {path}"))
+                continue
+            self.stdout.write(self.style.SUCCESS(f"\n{scale['games']} games vs {path}"))
+            for b in scale['benchmarks']:
+                old = baseline.get(b['name'])
+                if not old:
+                    continue
+                change = (b['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+                self.stdout.write(style(f"{b['name']:<32}{change:>+10.1f}% time"
+                                        f"{b['queries'] - old['queries']:>+8} queries"))
+
+    def _git_revision(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=settings.BASE_DIR, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+# DB_ENGINE=sqlite DB_NAME=/tmp/bench.sqlite3 python manage.py benchmark --games 100 10000 --output bench.json
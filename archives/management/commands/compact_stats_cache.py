@@ -0,0 +1,128 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from archives.models import StatisticsCache
+from archives.stats_payload import (DELTA_VERSION, align_players, decode_payload, encode_payload, patch_payload,
+                                    stored_payload)
+from archives.stats_versions import load_stats, normalized, payload_version_fields, with_intervals
+
+BATCH_SIZE = 100
+
+
+def _size(data, payload, fragments):
+    size = len(bytes(payload)) if payload is not None else 0
+    for value in (data, fragments):
+        if value:
+            size += len(json.dumps(value))
+    return size
+
+
+def _checksum(stats):
+    return hashlib.md5(json.dumps(stats, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Re-encodes the StatisticsCache history as keyframes and deltas (see archives/stats_versions.py), '
+            'including rows saved before deltas existed, and clears the fragments of all but the newest row.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keyframe-interval', type=int, default=settings.STATS_CACHE_KEYFRAME_INTERVAL,
+                            help='Store every Nth row in full (default STATS_CACHE_KEYFRAME_INTERVAL).')
+        parser.add_argument('--encoding', choices=['json', 'zlib', 'msgpack'], default=settings.STATS_CACHE_ENCODING,
+                            help='Encoding for the rewritten rows (default STATS_CACHE_ENCODING).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the sizes the compaction would reach, then roll it back.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Check every row still reads back the same statistics afterwards.')
+
+    def handle(self, *args, **options):
+        links = dict(StatisticsCache.objects.order_by('id').values_list('id', 'base_id'))
+        if not links:
+            self.stdout.write('No statistics cache rows to compact.')
+            return
+
+        with transaction.atomic():
+            before, after, checksums, keyframes = self._compact(list(links), links, options)
+            if options['verify']:
+                self._verify(checksums)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(f'{len(links)} rows, {keyframes} keyframes: {before / 1024:.1f} KiB -> '
+                          f'{after / 1024:.1f} KiB ({after / before * 100:.1f}%)')
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Dry run complete; statistics cache left unchanged.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Statistics cache compacted.'))
+
+    def _compact(self, ids, links, options):
+        """
+        Rewrites the rows in id order, each as a delta against the one before it. The old chains are
+        replaced as we go, so each row's original payload is rebuilt from the original payloads of
+        the rows it was stored against, kept until nothing else builds on them.
+        """
+        remaining = {}
+        for base_id in links.values():
+            if base_id is not None:
+                remaining[base_id] = remaining.get(base_id, 0) + 1
+
+        originals, checksums = {}, {}
+        before = after = keyframes = deltas = 0
+        previous = previous_payload = None
+        for start in range(0, len(ids), BATCH_SIZE):
+            rows = StatisticsCache.objects.in_bulk(ids[start:start + BATCH_SIZE])
+            for pk in ids[start:start + BATCH_SIZE]:
+                row = rows[pk]
+                before += _size(row.data, row.payload, row.fragments)
+                if row.format_version == 1:
+                    payload = normalized(encode_payload(row.data))
+                elif row.format_version == DELTA_VERSION:
+                    base_id = links[pk]
+                    if base_id not in originals:
+                        raise CommandError(f'Statistics cache {pk} builds on {base_id}, which is not stored before it')
+                    payload = patch_payload(json.loads(json.dumps(originals[base_id])),
+                                            stored_payload(row.encoding, row.data, row.payload))
+                    remaining[base_id] -= 1
+                    if not remaining[base_id]:
+                        del originals[base_id]
+                else:
+                    payload = stored_payload(row.encoding, row.data, row.payload)
+                if remaining.get(pk):
+                    originals[pk] = payload
+                if options['verify']:
+                    checksums[pk] = _checksum(with_intervals(
+                        row.data if row.format_version == 1 else decode_payload(payload), row.intervals))
+
+                fields = payload_version_fields(payload, options['encoding'], previous, previous_payload,
+                                                 interval=options['keyframe_interval'], deltas=deltas)
+                if pk != ids[-1]:
+                    fields['fragments'] = {}
+                StatisticsCache.objects.filter(pk=pk).update(**fields)
+                after += _size(fields['data'], fields['payload'], fields.get('fragments', row.fragments))
+
+                if fields['format_version'] == DELTA_VERSION:
+                    deltas += 1
+                    # What the delta reads back as, the base for the next one
+                    payload = align_players(previous_payload, payload)
+                else:
+                    keyframes += 1
+                    deltas = 0
+                row.format_version = fields['format_version']
+                row.keyframe_id = fields.get('keyframe_id')
+                previous, previous_payload = row, payload
+        return before, after, checksums, keyframes
+
+    def _verify(self, checksums):
+        mismatched = [pk for pk, checksum in checksums.items()
+                      if _checksum(load_stats(StatisticsCache.objects.get(pk=pk))) != checksum]
+        if mismatched:
+            raise CommandError(f'{len(mismatched)} rows read back different statistics, e.g. {mismatched[:5]}; '
+                               'rolled back')
+        self.stdout.write(self.style.SUCCESS(f'Verified: all {len(checksums)} rows read back unchanged.'))
+
+# python manage.py compact_stats_cache --dry-run
+# python manage.py compact_stats_cache --keyframe-interval 50 --verify
@@ -0,0 +1,103 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Drives concurrent GET traffic at a running server (e.g. the container) and reports throughput '
+            'and latency percentiles per path.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the running server.')
+        parser.add_argument('--paths', nargs='+', default=['/', '/recent-games/', '/statistics/'],
+                            help='Paths to request, round-robin.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous clients.')
+        parser.add_argument('--duration', type=float, default=15, help='Seconds to run (after one check request per path).')
+        parser.add_argument('--compressed', action='store_true', help='Send Accept-Encoding: gzip, br like a browser.')
+        parser.add_argument('--output', help='Write results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        headers = {'Accept-Encoding': 'gzip, br'} if options['compressed'] else {}
+        for path in options['paths']:
+            status, _ = self._fetch(base + path, headers)
+            if status is None or status >= 400:
+                raise CommandError(f'{base}{path} responded with {status}')
+
+        self.stdout.write(self.style.NOTICE(
+            f"{options['concurrency']} clients for {options['duration']:.0f}s against {base}..."))
+        samples = {path: [] for path in options['paths']}
+        errors = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def client(offset):
+            n = offset
+            while time.perf_counter() < deadline:
+                path = options['paths'][n % len(options['paths'])]
+                n += 1
+                start = time.perf_counter()
+                status, error = self._fetch(base + path, headers)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if status == 200:
+                        samples[path].append(elapsed)
+                    else:
+                        errors.append(f'{path}: {error or status}')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(client, range(options['concurrency'])))
+        wall = time.perf_counter() - started
+
+        results = {'url': base, 'concurrency': options['concurrency'], 'seconds': round(wall, 2),
+                   'requests': sum(len(s) for s in samples.values()), 'errors': len(errors), 'paths': []}
+        results['requests_per_second'] = round(results['requests'] / wall, 1)
+        for path, timings in samples.items():
+            timings.sort()
+            results['paths'].append({
+                'path': path, 'requests': len(timings),
+                'p50_ms': round(self._percentile(timings, 50), 1), 'p95_ms': round(self._percentile(timings, 95), 1),
+                'p99_ms': round(self._percentile(timings, 99), 1),
+                'mean_ms': round(statistics.mean(timings), 1) if timings else 0})
+        self._report(results, errors)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _fetch(self, url, headers):
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+        except (urllib.error.URLError, OSError) as e:
+            return None, str(e)
+
+    def _percentile(self, values, pct):
+        if not values:
+            return 0
+        return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+    def _report(self, results, errors):
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{results['requests']} requests in {results['seconds']}s: {results['requests_per_second']} req/s, "
+            f"{results['errors']} errors"))
+        self.stdout.write(f"{'path':<24}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for p in results['paths']:
+            self.stdout.write(f"{p['path']:<24}{p['requests']:>10}{p['p50_ms']:>10.1f}{p['p95_ms']:>10.1f}"
+                              f"{p['p99_ms']:>10.1f}")
+        for error in errors[:5]:
+            self.stdout.write(self.style.WARNING(error))
+
+# python manage.py load_test --url http://localhost:8000 --concurrency 32 --duration 30 --output load.json
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from archives.prerender import prerender_site
+import time
+
+
+class Command(BaseCommand):
+    help = 'Renders the public archive pages to static files (with .gz/.br variants) for the web server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Output directory (default: PRERENDER_ROOT).')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only re-render pages affected by games added since the last build.')
+
+    def handle(self, *args, **kwargs):
+        output = kwargs['output'] or settings.PRERENDER_ROOT
+        self.stdout.write(self.style.NOTICE(f'Pre-rendering public pages into {output}...'))
+        start = time.perf_counter()
+        result = prerender_site(output_dir=output, incremental=kwargs['incremental'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.perf_counter() - start:.1f}s: {result['written']} files written, "
+            f"{result['unchanged']} unchanged."))
+
+# python manage.py prerender_site
+# python manage.py prerender_site --incremental
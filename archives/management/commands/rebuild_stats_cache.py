@@ -1,17 +1,94 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from archives.profiling import SectionProfiler
 from archives.stats_utils import update_statistics_cache
+import cProfile
+import io
+import json
+import pstats
+import resource
+import tracemalloc
 
 
 class Command(BaseCommand):
     help = 'Recalculates all statistics and saves them to the StatisticsCache model.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='store_true',
+                            help='Report wall time and query count for each section of the rebuild.')
+        parser.add_argument('--cprofile', metavar='FILE',
+                            help='Run under cProfile, dump the stats to FILE and print the top functions.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Compute the statistics without writing a new StatisticsCache row.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Shard the per-game pass across this many processes.')
+        parser.add_argument('--memory', action='store_true',
+                            help='Report the peak memory of the rebuild (traced allocations and process RSS).')
+        parser.add_argument('--verify', action='store_true',
+                            help='Also run the serial rebuild and check it matches the parallel result.')
+
     def handle(self, *args, **kwargs):
         self.stdout.write(self.style.NOTICE('Starting statistics cache rebuild...'))
+        save = not kwargs['dry_run']
+        workers = kwargs['workers']
+        profiler = SectionProfiler() if kwargs['profile'] else None
 
+        if kwargs['memory']:
+            tracemalloc.start()
         try:
-            update_statistics_cache()
-            self.stdout.write(self.style.SUCCESS('Successfully rebuilt and saved statistics cache!'))
+            if profiler:
+                with profiler:
+                    data = self._rebuild(save, profiler, kwargs['cprofile'], workers)
+            else:
+                data = self._rebuild(save, profiler, kwargs['cprofile'], workers)
+
+            if kwargs['verify']:
+                serial = update_statistics_cache(save=False)
+                if json.dumps(serial, sort_keys=True, default=str) != json.dumps(data, sort_keys=True, default=str):
+                    raise CommandError(f'Parallel rebuild with {workers} workers does not match the serial rebuild')
+                self.stdout.write(self.style.SUCCESS(f'Verified: {workers}-worker result matches the serial rebuild.'))
+
+            if save:
+                self.stdout.write(self.style.SUCCESS('Successfully rebuilt and saved statistics cache!'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Dry run complete; statistics cache left unchanged.'))
+        except CommandError:
+            raise
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'An error occurred: {e}'))
+            return
+
+        if profiler:
+            self._report(profiler)
+        if kwargs['memory']:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # ru_maxrss is in KiB on Linux; it covers the whole process, including startup
+            rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(f"\nPeak traced allocations {traced_peak / 2 ** 20:.1f} MiB, "
+                              f"peak RSS {rss_peak / 1024:.1f} MiB")
+
+    def _rebuild(self, save, profiler, cprofile_path, workers):
+        if not cprofile_path:
+            return update_statistics_cache(save=save, profiler=profiler, workers=workers)
+
+        cprofiler = cProfile.Profile()
+        data = cprofiler.runcall(update_statistics_cache, save=save, profiler=profiler, workers=workers)
+        cprofiler.dump_stats(cprofile_path)
+        self.stdout.write(self.style.NOTICE(f'cProfile stats written to {cprofile_path}'))
+        report = io.StringIO()
+        pstats.Stats(cprofiler, stream=report).sort_stats('cumulative').print_stats(15)
+        self.stdout.write(report.getvalue())
+        return data
+
+    def _report(self, profiler):
+        total_ms = sum(s['ms'] for s in profiler.sections)
+        self.stdout.write(f"\n{'section':<24}{'ms':>10}{'share':>8}{'queries':>9}")
+        for s in profiler.sections:
+            share = s['ms'] / total_ms * 100 if total_ms else 0
+            self.stdout.write(f"{s['name']:<24}{s['ms']:>10.1f}{share:>7.1f}%{s['queries']:>9}")
+        self.stdout.write(f"{'total':<24}{total_ms:>10.1f}{'':>8}{profiler.recorder.count:>9}")
 
-# python manage.py rebuild_stats_cache
\ No newline at end of file
+# python manage.py rebuild_stats_cache
+# python manage.py rebuild_stats_cache --profile --dry-run --cprofile rebuild.prof
+# python manage.py rebuild_stats_cache --workers 8 --verify
+# python manage.py rebuild_stats_cache --dry-run --memory
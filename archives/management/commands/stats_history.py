@@ -0,0 +1,76 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from archives.db_router import use_replica
+from archives.stats_history import StatsHistory
+
+
+def _pct(part, whole):
+    return round(part / whole * 100, 2) if whole else 0
+
+
+# Each trend: columns computed per game from counter series, (header, [counter paths], fn)
+TRENDS = {
+    'turn': [(f'turn{t}_pct', [('turn_stats', t, 'correct'), ('turn_stats', t, 'attempts')], _pct)
+             for t in range(1, 5)],
+    'advancement': [
+        column for p in range(1, 5) for column in (
+            (f'podium{p}_advanced_pct', [('advancement_stats_raw', p, 'advanced'), ('advancement_stats_raw', p, 'total')],
+             _pct),
+            (f'podium{p}_won_pct', [('advancement_stats_raw', p, 'won'), ('advancement_stats_raw', p, 'total')], _pct),
+        )],
+    'comebacks': [('comeback_count', [('comeback_count',)], lambda count: count),
+                  ('comeback_pct', [('comeback_count',), ('total_fast_line_games',)], _pct),
+                  ('max_diff', [('comeback_max_diff',)], lambda diff: diff)],
+}
+
+
+class Command(BaseCommand):
+    help = ('Builds the statistics history (every counter after every game, in one pass) and prints the '
+            'statistics through given games as JSON, or a trend across all games as CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', type=int, nargs='+', metavar='N',
+                            help='Game numbers (1 = first game aired) to report the statistics through.')
+        parser.add_argument('--trend', choices=sorted(TRENDS), help='Write this trend, one row per game, as CSV.')
+        parser.add_argument('--output', help='Write to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if not options['through'] and not options['trend']:
+            raise CommandError('Pass --through N [N ...] and/or --trend NAME.')
+
+        start = time.perf_counter()
+        with use_replica():
+            history = StatsHistory.build()
+        self.stderr.write(f'History of {len(history)} games built in {time.perf_counter() - start:.2f}s')
+
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            if options['through']:
+                for n in options['through']:
+                    if not 1 <= n <= len(history):
+                        raise CommandError(f'--through {n} is outside 1..{len(history)}')
+                with use_replica():
+                    report = {n: history.statistics_through(n) for n in options['through']}
+                json.dump(report, out, indent=2, default=str)
+                out.write('\n')
+            if options['trend']:
+                self._write_trend(history, TRENDS[options['trend']], out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    def _write_trend(self, history, columns, out):
+        writer = csv.writer(out)
+        writer.writerow(['game_number', 'game_id'] + [header for header, _, _ in columns])
+        series = [[history.series(path) for path in paths] for _, paths, _ in columns]
+        for i in range(len(history)):
+            writer.writerow([i + 1, history.game_ids[i + 1]] + [
+                fn(*(s[i] for s in column_series)) for (_, _, fn), column_series in zip(columns, series)])
+
+# python manage.py stats_history --through 20 50
+# python manage.py stats_history --trend turn --output turn_trend.csv
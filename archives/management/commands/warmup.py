@@ -0,0 +1,88 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from archives.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = ('Warms up this process (templates, URLs, database connections, archive snapshot, leaderboards) '
+            'and reports each step. With --benchmark, measures first-request latency of fresh processes '
+            'with and without the warm-up.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmark', action='store_true', help='Run the cold-start benchmark.')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode (benchmark).')
+        parser.add_argument('--paths', nargs='+', default=['/', '/recent-games/', '/statistics/'],
+                            help='Paths to request (benchmark).')
+        # Used by --benchmark to run one measurement in a fresh interpreter
+        parser.add_argument('--probe', action='store_true', help='Internal: measure this process and print JSON.')
+        parser.add_argument('--no-warmup', action='store_true', help='Internal: skip the warm-up when probing.')
+
+    def handle(self, *args, **options):
+        if options['probe']:
+            self.stdout.write(json.dumps(self._probe(options['paths'], not options['no_warmup'])))
+        elif options['benchmark']:
+            self._benchmark(options['paths'], options['runs'])
+        else:
+            results = warm_up()
+            for name, seconds, detail in results:
+                self.stdout.write(f"{name:<14}{seconds * 1000:>9.1f} ms  {detail}")
+            self.stdout.write(self.style.SUCCESS(f"Warm-up took {sum(r[1] for r in results) * 1000:.1f} ms"))
+
+    def _probe(self, paths, warm):
+        application = get_wsgi_application()
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        start = time.perf_counter()
+        if warm:
+            warm_up()
+        result = {'warmup_ms': (time.perf_counter() - start) * 1000, 'first_ms': {}, 'second_ms': {}}
+        for key in ('first_ms', 'second_ms'):
+            for path in paths:
+                result[key][path] = self._request(application, host, path)
+        return result
+
+    def _request(self, application, host, path):
+        def start_response(status, headers, exc_info=None):
+            if not status.startswith(('2', '3')):
+                raise RuntimeError(f'{path} responded with {status}')
+
+        environ = {'PATH_INFO': path, 'HTTP_HOST': host}
+        setup_testing_defaults(environ)
+        start = time.perf_counter()
+        response = application(environ, start_response)
+        for _chunk in response:
+            pass
+        response.close()
+        return (time.perf_counter() - start) * 1000
+
+    def _benchmark(self, paths, runs):
+        self.stdout.write(self.style.NOTICE(f'{runs} fresh processes per mode, paths {" ".join(paths)}...'))
+        for label, extra in (('cold', ['--no-warmup']), ('warmed', [])):
+            probes = []
+            for _ in range(runs):
+                command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'warmup', '--probe',
+                           '--paths', *paths, *extra]
+                completed = subprocess.run(command, capture_output=True, text=True)
+                if completed.returncode:
+                    raise CommandError(completed.stderr.strip().splitlines()[-1])
+                probes.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+            warmup_ms = statistics.median(p['warmup_ms'] for p in probes)
+            heading = f'{label} (warm-up {warmup_ms:.1f} ms)' if label == 'warmed' else label
+            self.stdout.write(self.style.SUCCESS(f'\n{heading}'))
+            self.stdout.write(f"{'path':<24}{'first ms':>12}{'second ms':>12}")
+            for path in paths:
+                first = statistics.median(p['first_ms'][path] for p in probes)
+                second = statistics.median(p['second_ms'][path] for p in probes)
+                self.stdout.write(f"{path:<24}{first:>12.1f}{second:>12.1f}")
+
+# python manage.py warmup
+# python manage.py warmup --benchmark --runs 5
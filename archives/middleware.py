@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from .profiling import QueryRecorder
+from collections import defaultdict, deque
+from contextlib import ExitStack
+import logging
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Recent samples (for percentiles) and running totals per view. Both are per process, so each
+# gunicorn worker reports its own traffic.
+_SAMPLE_LIMIT = 1000
+_samples = defaultdict(lambda: deque(maxlen=_SAMPLE_LIMIT))
+_totals = defaultdict(lambda: [0, 0.0, 0, 0.0])  # requests, wall ms, queries, db ms
+_samples_lock = threading.Lock()
+
+_COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+                       'application/javascript', 'text/javascript', 'application/xml', 'image/svg+xml'}
+# Dynamic responses are compressed per request, so trade a little ratio for speed
+_BROTLI_QUALITY = 5
+
+
+class QueryTimingMiddleware:
+    """
+    Records wall time, query count and database time for every request, reports them in a
+    Server-Timing header and keeps recent samples per view for metrics_view. Logs a warning
+    when a request issues more queries than REQUEST_QUERY_BUDGET (catches N+1 regressions).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'REQUEST_QUERY_BUDGET', 50)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+
+        response['Server-Timing'] = (f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+                                     f'app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}')
+
+        with _samples_lock:
+            _samples[view_name].append((total_ms, recorder.count, db_ms))
+            totals = _totals[view_name]
+            totals[0] += 1
+            totals[1] += total_ms
+            totals[2] += recorder.count
+            totals[3] += db_ms
+
+        if recorder.count > self.query_budget:
+            logger.warning('%s issued %d queries (budget %d) in %.1f ms for %s',
+                           view_name, recorder.count, self.query_budget, total_ms, request.path)
+        return response
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def render_metrics():
+    """
+    Renders the collected samples in the Prometheus text exposition format. Quantiles cover the
+    most recent requests per view; _sum and _count are running totals since the worker started.
+    """
+    with _samples_lock:
+        samples = {view: list(values) for view, values in _samples.items()}
+        totals = {view: list(values) for view, values in _totals.items()}
+
+    metrics = [
+        ('perfectarchive_request_ms', 'Request wall time in milliseconds.', 0, 1),
+        ('perfectarchive_request_queries', 'Database queries per request.', 1, 2),
+        ('perfectarchive_request_db_ms', 'Database time per request in milliseconds.', 2, 3),
+    ]
+    lines = []
+    for name, help_text, sample_index, total_index in metrics:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} summary')
+        for view in sorted(samples):
+            values = sorted(s[sample_index] for s in samples[view])
+            for q in (50, 95, 99):
+                lines.append(f'{name}{{view="{view}",quantile="{q / 100}"}} {_percentile(values, q):.3f}')
+            lines.append(f'{name}_sum{{view="{view}"}} {totals[view][total_index]:.3f}')
+            lines.append(f'{name}_count{{view="{view}"}} {totals[view][0]}')
+    return '\n'.join(lines) + '\n'
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip compression for responses of at least COMPRESSION_MIN_SIZE bytes. As in
+    Django's GZipMiddleware, gzip output gets random padding (BREACH mitigation); brotli has no
+    equivalent, so pages that carry a CSRF token fall back to gzip.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip() not in _COMPRESSIBLE_TYPES:
+            return response
+        if len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = {token.split(';')[0].strip() for token in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+        # A page that used the CSRF token sets the CSRF cookie (CsrfViewMiddleware has already
+        # cleared CSRF_COOKIE_NEEDS_UPDATE by the time the response gets here)
+        if brotli and 'br' in accepted and settings.CSRF_COOKIE_NAME not in response.cookies:
+            encoding, compressed = 'br', brotli.compress(response.content, quality=_BROTLI_QUALITY)
+        elif 'gzip' in accepted:
+            encoding, compressed = 'gzip', compress_string(response.content, max_random_bytes=100)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # A weak ETag still matches If-None-Match on the next request whichever encoding it gets
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0007_alter_customuser_role_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statisticscache',
+            name='fragments',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,140 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:59
+
+from django.db import migrations, models
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# The version 2 format as of this migration, copied from archives/stats_payload.py so later
+# changes there can't alter what it writes or reads
+COLORS = ['green', 'yellow', 'red', 'gray', 'blue']
+PLAYER_COLUMNS = ['id', 'name', 'podium_number', 'game_id', 'air_date', 'total_winnings', 'final_round_correct_count',
+                  'fast_line_correct_count', 'fast_line_incorrect_count', 'page_number']
+PLAYER_LISTS = ['top_fast_line_players', 'top_fast_line_scores', 'leaderboard_data']
+TABLES = ['podium_stats', 'advancement_stats', 'turn_performance', 'preliminary_round_dist', 'player_prelim_dist',
+          'player_advancement_dist', 'final_round_stats']
+
+
+def encode_payload(data):
+    players, player_index = [], {}
+
+    def ref(p):
+        row = [p['id'], p['name'], p['podium_number'], p['game']['id'], p['game']['air_date'], p['total_winnings'],
+               p['final_round_correct_count'], p['fast_line_correct_count'], p['fast_line_incorrect_count'],
+               p['page_number']]
+        key = json.dumps(row)
+        if key not in player_index:
+            player_index[key] = len(players)
+            players.append(row)
+        return [player_index[key], p['fast_line_total'], p['round_total']]
+
+    def cell(key, value):
+        return COLORS.index(value) if key.endswith('_color') and value in COLORS else value
+
+    def table(rows):
+        columns = []
+        for row in rows:
+            columns.extend(key for key in row if key not in columns)
+        return {'columns': columns, 'rows': [[cell(key, row.get(key)) for key in columns] for row in rows]}
+
+    return {
+        'v': 2,
+        'players': players,
+        'player_lists': {name: [ref(p) for p in data.get(name, [])] for name in PLAYER_LISTS},
+        'podium_leaderboards': [[pl['podium_number'], [ref(p) for p in pl['players']]]
+                                for pl in data.get('podium_leaderboards', [])],
+        'top_comebacks': [ref(c['player']) + [c['diff']] for c in data.get('top_comebacks', [])],
+        'tables': {name: table(data.get(name, [])) for name in TABLES},
+        'scalars': {key: value for key, value in data.items()
+                    if key not in PLAYER_LISTS and key not in TABLES and key not in ('podium_leaderboards',
+                                                                                     'top_comebacks')},
+    }
+
+
+def decode_payload(payload):
+    players = payload['players']
+
+    def player(ref):
+        row = dict(zip(PLAYER_COLUMNS, players[ref[0]]))
+        return {'id': row['id'], 'name': row['name'], 'podium_number': row['podium_number'],
+                'game': {'id': row['game_id'], 'air_date': row['air_date']}, 'fast_line_total': ref[1],
+                'total_winnings': row['total_winnings'], 'final_round_correct_count': row['final_round_correct_count'],
+                'fast_line_correct_count': row['fast_line_correct_count'],
+                'fast_line_incorrect_count': row['fast_line_incorrect_count'], 'round_total': ref[2],
+                'page_number': row['page_number']}
+
+    def rows(table):
+        decoded = []
+        for values in table['rows']:
+            row = {}
+            for key, value in zip(table['columns'], values):
+                if key.endswith('_color') and value is None: continue
+                row[key] = COLORS[value] if key.endswith('_color') and isinstance(value, int) else value
+            decoded.append(row)
+        return decoded
+
+    data = dict(payload['scalars'])
+    for name in PLAYER_LISTS:
+        data[name] = [player(ref) for ref in payload['player_lists'][name]]
+    data['podium_leaderboards'] = [{'podium_number': number, 'players': [player(ref) for ref in refs]}
+                                   for number, refs in payload['podium_leaderboards']]
+    data['top_comebacks'] = [{'player': player(ref[:3]), 'diff': ref[3]} for ref in payload['top_comebacks']]
+    for name in TABLES:
+        data[name] = rows(payload['tables'][name])
+    return data
+
+
+def stored_payload(encoding, data, blob):
+    if encoding == 'json':
+        return data
+    raw = zlib.decompress(bytes(blob))
+    return msgpack.unpackb(raw) if encoding == 'msgpack' else json.loads(raw)
+
+
+def upgrade_payloads(apps, schema_editor):
+    StatisticsCache = apps.get_model('archives', 'StatisticsCache')
+    for row in StatisticsCache.objects.filter(format_version=1).only('id', 'data').iterator(chunk_size=100):
+        blob = zlib.compress(json.dumps(encode_payload(row.data), separators=(',', ':')).encode())
+        StatisticsCache.objects.filter(pk=row.pk).update(format_version=2, encoding='zlib', data=None, payload=blob)
+
+
+def downgrade_payloads(apps, schema_editor):
+    StatisticsCache = apps.get_model('archives', 'StatisticsCache')
+    for row in StatisticsCache.objects.exclude(format_version=1).iterator(chunk_size=100):
+        data = decode_payload(stored_payload(row.encoding, row.data, row.payload))
+        StatisticsCache.objects.filter(pk=row.pk).update(format_version=1, encoding='json', data=data, payload=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0008_statisticscache_fragments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statisticscache',
+            name='encoding',
+            field=models.CharField(default='json', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='statisticscache',
+            name='format_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='statisticscache',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='statisticscache',
+            name='data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(upgrade_payloads, downgrade_payloads),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0009_compact_statistics_payload'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['game_type', 'play_type', 'date'], name='archives_le_game_ty_02034d_idx'),
+        ),
+    ]
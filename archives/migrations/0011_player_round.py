@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def turn_position(round_number, podium_number):
+    # Copied from archives.models as of this migration, so later changes there can't alter it
+    return (podium_number - round_number) % 4 + 1
+
+
+def backfill_rounds(apps, schema_editor):
+    Player = apps.get_model('archives', 'Player')
+    PlayerRound = apps.get_model('archives', 'PlayerRound')
+    rounds = []
+    for p in Player.objects.order_by('id').iterator(chunk_size=2000):
+        rounds.extend(PlayerRound(game_id=p.game_id, player_id=p.id, round_number=r, podium_number=p.podium_number,
+                                  turn_position=turn_position(r, p.podium_number),
+                                  correct=getattr(p, f'round{r}_correct'), score=getattr(p, f'round{r}_score'))
+                      for r in range(1, 5))
+        if len(rounds) >= 8000:
+            PlayerRound.objects.bulk_create(rounds)
+            rounds = []
+    PlayerRound.objects.bulk_create(rounds)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0010_leaderboard_type_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerRound',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('round_number', models.PositiveSmallIntegerField()),
+                ('podium_number', models.PositiveSmallIntegerField()),
+                ('turn_position', models.PositiveSmallIntegerField()),
+                ('correct', models.BooleanField(null=True)),
+                ('score', models.IntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='player_rounds', to='archives.game')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rounds', to='archives.player')),
+            ],
+            options={
+                'ordering': ['player', 'round_number'],
+                'indexes': [models.Index(fields=['turn_position', 'correct'], name='archives_pl_turn_po_404022_idx'), models.Index(fields=['game', 'round_number', 'correct'], name='archives_pl_game_id_498010_idx'), models.Index(fields=['podium_number', 'round_number', 'correct'], name='archives_pl_podium__e1724b_idx')],
+                'unique_together': {('player', 'round_number')},
+            },
+        ),
+        # Dropping the table on the way back removes the rows
+        migrations.RunPython(backfill_rounds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+import copy
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Copied from archives/stats_payload.py as of this migration, so later changes there can't alter it
+def stored_payload(encoding, data, blob):
+    if encoding == 'json':
+        return data
+    raw = zlib.decompress(bytes(blob))
+    return msgpack.unpackb(raw) if encoding == 'msgpack' else json.loads(raw)
+
+
+def payload_fields(payload, encoding):
+    if encoding == 'json':
+        return {'format_version': 2, 'encoding': 'json', 'data': payload, 'payload': None}
+    if encoding == 'msgpack' and msgpack:
+        return {'format_version': 2, 'encoding': 'msgpack', 'data': None,
+                'payload': zlib.compress(msgpack.packb(payload))}
+    return {'format_version': 2, 'encoding': 'zlib', 'data': None,
+            'payload': zlib.compress(json.dumps(payload, separators=(',', ':')).encode())}
+
+
+def patch_payload(value, ops):
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == 's' and not path:
+            value = op[2]
+            continue
+        parent = value
+        for key in path[:-1] if kind not in 'tk' else path:
+            parent = parent[key]
+        if kind == 's':
+            parent[path[-1]] = op[2]
+        elif kind == 'd':
+            del parent[path[-1]]
+        elif kind == 't':
+            parent[op[2]:] = op[3]
+        else:
+            parent[:] = [parent[i] if i >= 0 else op[3][-i - 1] for i in op[2]]
+    return value
+
+
+def materialize_deltas(apps, schema_editor):
+    # Before the chain links go, store every delta row in full again. Rows are rewritten in id
+    # order and a delta's base comes before it, so the base is always stored in full by then; only
+    # the previous row's payload is kept, since that is almost always the base.
+    StatisticsCache = apps.get_model('archives', 'StatisticsCache')
+    previous_pk = previous_payload = None
+    for row in StatisticsCache.objects.exclude(format_version=1).order_by('id').iterator(chunk_size=100):
+        payload = stored_payload(row.encoding, row.data, row.payload)
+        if row.format_version == 3:
+            if row.base_id == previous_pk:
+                base = copy.deepcopy(previous_payload)
+            else:
+                base_row = StatisticsCache.objects.get(pk=row.base_id)
+                base = stored_payload(base_row.encoding, base_row.data, base_row.payload)
+            payload = patch_payload(base, payload)
+            StatisticsCache.objects.filter(pk=row.pk).update(**payload_fields(payload, row.encoding))
+        previous_pk, previous_payload = row.pk, payload
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0011_player_round'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statisticscache',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='archives.statisticscache'),
+        ),
+        migrations.AddField(
+            model_name='statisticscache',
+            name='keyframe',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='archives.statisticscache'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, materialize_deltas),
+    ]
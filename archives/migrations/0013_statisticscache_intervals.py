@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:06
+
+from django.db import migrations, models
+import copy
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Copied from archives/stats_payload.py as of this migration, so later changes there can't alter it
+def stored_payload(encoding, data, blob):
+    if encoding == 'json':
+        return data
+    raw = zlib.decompress(bytes(blob))
+    return msgpack.unpackb(raw) if encoding == 'msgpack' else json.loads(raw)
+
+
+def payload_fields(payload, encoding):
+    if encoding == 'json':
+        return {'format_version': 2, 'encoding': 'json', 'data': payload, 'payload': None}
+    if encoding == 'msgpack' and msgpack:
+        return {'format_version': 2, 'encoding': 'msgpack', 'data': None,
+                'payload': zlib.compress(msgpack.packb(payload))}
+    return {'format_version': 2, 'encoding': 'zlib', 'data': None,
+            'payload': zlib.compress(json.dumps(payload, separators=(',', ':')).encode())}
+
+
+def patch_payload(value, ops):
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == 's' and not path:
+            value = op[2]
+            continue
+        parent = value
+        for key in path[:-1] if kind not in 'tk' else path:
+            parent = parent[key]
+        if kind == 's':
+            parent[path[-1]] = op[2]
+        elif kind == 'd':
+            del parent[path[-1]]
+        elif kind == 't':
+            parent[op[2]:] = op[3]
+        else:
+            parent[:] = [parent[i] if i >= 0 else op[3][-i - 1] for i in op[2]]
+    return value
+
+
+def with_table_intervals(payload, intervals):
+    payload = copy.deepcopy(payload)
+    for section, row_intervals in intervals.items():
+        table = payload['tables'].get(section)
+        if not table:
+            continue
+        keys = [key for row in row_intervals for key in row if key not in table['columns']]
+        table['columns'].extend(dict.fromkeys(keys))
+        for i, values in enumerate(table['rows']):
+            row = row_intervals[i] if i < len(row_intervals) else {}
+            values.extend(row.get(key) for key in table['columns'][len(values):])
+    return payload
+
+
+def without_table_intervals(payload, intervals):
+    for section, row_intervals in intervals.items():
+        table = payload['tables'].get(section)
+        keys = {key for row in row_intervals for key in row}
+        if not table or not keys:
+            continue
+        keep = [i for i, key in enumerate(table['columns']) if key not in keys]
+        table['columns'] = [table['columns'][i] for i in keep]
+        table['rows'] = [[values[i] for i in keep] for values in table['rows']]
+    return payload
+
+
+def fold_intervals(apps, schema_editor):
+    # Before the intervals field goes, put each row's intervals back into its statistics rows,
+    # where rows stored before it keep them (and the statistics history reads them). A delta's
+    # base changes shape with that, so every version 2 and 3 row is stored in full again, in id
+    # order as in 0012's reverse; `manage.py compact_stats_cache` re-encodes them as deltas.
+    StatisticsCache = apps.get_model('archives', 'StatisticsCache')
+    previous_pk = previous_payload = None
+    for row in StatisticsCache.objects.order_by('id').iterator(chunk_size=100):
+        if row.format_version == 1:
+            if row.intervals:
+                data = dict(row.data)
+                for section, row_intervals in row.intervals.items():
+                    data[section] = [dict(r, **row_intervals[i]) if i < len(row_intervals) else r
+                                     for i, r in enumerate(data.get(section, []))]
+                StatisticsCache.objects.filter(pk=row.pk).update(data=data)
+            continue
+        payload = stored_payload(row.encoding, row.data, row.payload)
+        if row.format_version == 3:
+            if row.base_id == previous_pk:
+                base = copy.deepcopy(previous_payload)
+            else:
+                # Already stored in full above, with its own intervals folded in
+                base_row = StatisticsCache.objects.get(pk=row.base_id)
+                base = without_table_intervals(stored_payload(base_row.encoding, base_row.data, base_row.payload),
+                                               base_row.intervals)
+            payload = patch_payload(base, payload)
+        StatisticsCache.objects.filter(pk=row.pk).update(
+            base=None, keyframe=None, **payload_fields(with_table_intervals(payload, row.intervals), row.encoding))
+        previous_pk, previous_payload = row.pk, payload
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0012_statisticscache_deltas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statisticscache',
+            name='intervals',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, fold_intervals),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
+from .stats_payload import DELTA_VERSION, decode_stats
 
 
 class CustomUserManager(BaseUserManager):
@@ -107,6 +108,58 @@ class Player(models.Model):
         unique_together = ('game', 'podium_number')
 
 
+def turn_position(round_number, podium_number):
+    """
+    The turn (1-4) a podium plays in a preliminary round: podium 1 goes first in round 1, and the
+    first turn moves one podium to the right each round.
+    """
+    return (podium_number - round_number) % 4 + 1
+
+
+class PlayerRound(models.Model):
+    """
+    One player's result in one preliminary round, the normalized form of Player's round columns
+    (which stay the source of truth). With the turn position stored, the turn and podium
+    statistics are plain GROUP BY queries. The game is copied from the player so per-game round
+    tallies don't need a join. Player saves keep the rows in step (signals.sync_player_rounds);
+    writes that bypass save() call sync() or rows_for() themselves.
+    """
+    game = models.ForeignKey(Game, related_name='player_rounds', on_delete=models.CASCADE)
+    player = models.ForeignKey(Player, related_name='rounds', on_delete=models.CASCADE)
+    round_number = models.PositiveSmallIntegerField()
+    podium_number = models.PositiveSmallIntegerField()
+    turn_position = models.PositiveSmallIntegerField()
+    correct = models.BooleanField(null=True)
+    score = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Player {self.player_id}, Round {self.round_number}"
+
+    @classmethod
+    def rows_for(cls, players):
+        """Unsaved rounds 1-4 for each of the given (saved) players."""
+        return [cls(game_id=p.game_id, player_id=p.id, round_number=r, podium_number=p.podium_number,
+                    turn_position=turn_position(r, p.podium_number),
+                    correct=getattr(p, f'round{r}_correct'), score=getattr(p, f'round{r}_score'))
+                for p in players for r in range(1, 5)]
+
+    @classmethod
+    def sync(cls, players):
+        """Rewrites the rounds of the given players from their current round columns."""
+        cls.objects.filter(player__in=[p.id for p in players]).delete()
+        cls.objects.bulk_create(cls.rows_for(players))
+
+    class Meta:
+        ordering = ['player', 'round_number']
+        unique_together = ('player', 'round_number')
+        indexes = [
+            # Turn performance, and per-round podium results
+            models.Index(fields=['turn_position', 'correct']),
+            models.Index(fields=['game', 'round_number', 'correct']),
+            models.Index(fields=['podium_number', 'round_number', 'correct']),
+        ]
+
+
 class Syndication(models.Model):
     state = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
@@ -123,11 +176,34 @@ class Syndication(models.Model):
 class StatisticsCache(models.Model):
     updated_at = models.DateTimeField(auto_now_add=True)
     through_game = models.ForeignKey(Game, on_delete=models.CASCADE, null=True, blank=True)
-    data = models.JSONField()
+    # Storage format, see archives/stats_payload.py. Version 1 rows keep the verbose JSON in data;
+    # version 2 rows hold the compact payload in data ('json') or in payload ('zlib', 'msgpack').
+    format_version = models.PositiveSmallIntegerField(default=1)
+    encoding = models.CharField(max_length=10, default='json')
+    data = models.JSONField(null=True, blank=True)
+    payload = models.BinaryField(null=True, blank=True)
+    # Pre-rendered statistics page sections, see archives/stats_fragments.py. Only the newest row's
+    # are served, so older rows have theirs cleared.
+    fragments = models.JSONField(default=dict, blank=True)
+    # Version 3 rows are deltas against base; keyframe is the full (version 2) row their chain
+    # starts from, see archives/stats_versions.py
+    base = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    keyframe = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # The bootstrap confidence intervals, kept out of the payload because they move with every game
+    # (see stats_versions.split_intervals). Every row keeps its own, for the statistics history.
+    intervals = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"Statistics Cache updated at {self.updated_at}"
 
+    @property
+    def stats(self):
+        """The statistics in their original (version 1) shape, whatever format the row is stored in."""
+        if self.format_version == DELTA_VERSION or self.intervals:
+            from .stats_versions import load_stats
+            return load_stats(self)
+        return decode_stats(self.format_version, self.encoding, self.data, self.payload)
+
 
 class PreliminaryLine(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='preliminary_lines')
@@ -184,4 +260,6 @@ class Leaderboard(models.Model):
 
     class Meta:
         ordering = ['-score']
+        # Serves the leaderboard API and the admin filters (type, play type, date range)
+        indexes = [models.Index(fields=['game_type', 'play_type', 'date'])]
 
@@ -0,0 +1,78 @@
+"""
+Batch entry of preliminary lines: saving many lines in one transaction and finding the next
+(game, round) that still needs a line.
+"""
+from .models import Game, PreliminaryLine
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+ROUNDS = range(1, 5)
+
+
+def _games_missing_lines():
+    missing = {f'missing_{r}': ~Exists(PreliminaryLine.objects.filter(game=OuterRef('pk'), round_number=r))
+               for r in ROUNDS}
+    return Game.objects.annotate(**missing).filter(
+        reduce(or_, (Q(**{name: True}) for name in missing))).order_by('id').values('id', *missing)
+
+
+def _first_missing(row):
+    return row['id'], next(r for r in ROUNDS if row[f'missing_{r}'])
+
+
+def next_missing_line():
+    """
+    Returns (game_id, round_number) of the next line to enter, or None when every game has all
+    four. Entry continues after the most recently entered game, so a backfill keeps moving
+    forward, and only wraps around to earlier gaps once nothing is missing after it. One
+    anti-join query (two when wrapping around).
+    """
+    last_game = PreliminaryLine.objects.order_by('-game_id').values('game_id')[:1]
+    row = _games_missing_lines().filter(id__gte=Coalesce(Subquery(last_game), Value(0))).first()
+    if row is None:
+        row = _games_missing_lines().first()
+    return _first_missing(row) if row else None
+
+
+def missing_rounds(game_id):
+    """
+    The rounds of one game that have no line yet.
+    """
+    existing = set(PreliminaryLine.objects.filter(game_id=game_id).values_list('round_number', flat=True))
+    return [r for r in ROUNDS if r not in existing]
+
+
+def _conflicts(keys):
+    game_ids = {g for g, _ in keys}
+    known_games = set(Game.objects.filter(id__in=game_ids).values_list('id', flat=True))
+    errors = [f'Game {g} does not exist.' for g in sorted(game_ids - known_games)]
+    existing = set(PreliminaryLine.objects.filter(game_id__in=game_ids).values_list('game_id', 'round_number'))
+    return errors + [f'Game {g}, Round {r} already has a line.' for g, r in sorted(existing.intersection(keys))]
+
+
+def save_lines(lines):
+    """
+    Validates and saves unsaved PreliminaryLine instances with one bulk_create in a single
+    transaction. Returns a list of error messages (nothing is saved if there are any).
+    """
+    keys = Counter((line.game_id, line.round_number) for line in lines)
+    errors = [f'Game {g}, Round {r} appears more than once.' for (g, r), n in sorted(keys.items()) if n > 1]
+    errors += [f'Round {r} is not a valid round.' for r in sorted({r for _, r in keys if r not in ROUNDS})]
+
+    try:
+        with transaction.atomic():
+            # Locking the games makes batches for the same game wait for each other, so two can't
+            # both find a round free and both insert it
+            list(Game.objects.select_for_update().filter(id__in={g for g, _ in keys}).values_list('id'))
+            errors += _conflicts(keys)
+            if errors:
+                return errors
+            PreliminaryLine.objects.bulk_create(lines)
+    except IntegrityError:
+        # e.g. a game deleted while its lines were inserted
+        return _conflicts(keys) or ['The lines conflict with a change saved at the same time; nothing was saved.']
+    return []
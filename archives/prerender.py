@@ -0,0 +1,202 @@
+"""
+Renders the public archive to static files so a front-end web server can serve it without
+touching gunicorn. Output layout under PRERENDER_ROOT:
+
+    index.html                      /
+    recent-games/index.html         /recent-games/ (page 1)
+    recent-games/page-<n>.html      /recent-games/?page=<n>
+    statistics/index.html, show-info/index.html, analysis/index.html, about/index.html
+    game/<id>/index.html            /game/<id>/ (redirects to the game's recent-games page)
+
+Every file also gets .gz (and .br when the brotli package is installed) variants for
+gzip_static/brotli_static. The files are the pages an anonymous visitor sees, so requests carrying
+a session cookie (signed-in users, who get their staff links) must go to Django. An nginx setup
+looks like:
+
+    map $cookie_sessionid $prerender_root { "" <PRERENDER_ROOT>; default /nonexistent; }
+
+    root $prerender_root;
+    location = /recent-games/ { try_files /recent-games/page-$arg_page.html /recent-games/index.html @django; }
+    location / { try_files $uri $uri/index.html @django; }
+
+With PRERENDER_ON_SAVE, saving a game re-renders incrementally in a background thread after the
+commit (prerender_in_background), as does editing a game or player in the admin (mark_edited).
+"""
+from .models import Game
+from .swr import run_coalesced_in_background
+from .views import index, recent_games_view, statistics_view, show_info_view, analysis_view, about_view
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils.html import escape
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GAMES_PER_PAGE = 5
+MANIFEST_NAME = 'prerender-manifest.json'
+
+# Pages that depend only on the current archive as a whole (not on a particular game page)
+ARCHIVE_PAGES = [('index', index), ('statistics', statistics_view)]
+FIXED_PAGES = [('show_info', show_info_view), ('analysis', analysis_view), ('about', about_view)]
+
+# Games saved since the background build last started, re-rendered by its next run
+_pending_game_ids = set()
+_pending_lock = threading.Lock()
+# Games edited in the admin, re-rendered by the run that follows the statistics rebuild the edit
+# triggers (that rebuild is what moves the pages to the new archive version)
+_edited_game_ids = set()
+
+
+def _render_view(view, url_name, query=None):
+    path = reverse(url_name)
+    request = RequestFactory().get(path, query or {})
+    request.user = AnonymousUser()
+    request.resolver_match = resolve(path)
+    return view(request).content
+
+
+def _redirect_page(target):
+    target = escape(target)
+    return (f'<!DOCTYPE html><html><head><meta charset="UTF-8"><link rel="canonical" href="{target}">'
+            f'<meta http-equiv="refresh" content="0; url={target}"></head>'
+            f'<body><a href="{target}">Continue to the game</a></body></html>').encode()
+
+
+def _output_path(url_name, page=None, game_id=None):
+    if url_name == 'index':
+        return 'index.html'
+    if url_name == 'recent_games':
+        return 'recent-games/index.html' if page == 1 else f'recent-games/page-{page}.html'
+    if url_name == 'game_permalink':
+        return f'game/{game_id}/index.html'
+    return reverse(url_name).strip('/') + '/index.html'
+
+
+class _Writer:
+    """
+    Writes files (plus compressed variants) only when their content hash changed.
+    """
+
+    def __init__(self, root, previous_hashes):
+        self.root = root
+        self.previous_hashes = previous_hashes
+        self.hashes = dict(previous_hashes)
+        self.written = 0
+        self.unchanged = 0
+
+    def write(self, relative_path, content):
+        digest = hashlib.sha256(content).hexdigest()
+        self.hashes[relative_path] = digest
+        full_path = os.path.join(self.root, relative_path)
+        if self.previous_hashes.get(relative_path) == digest and os.path.exists(full_path):
+            self.unchanged += 1
+            return
+        variants = [('', content), ('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli:
+            variants.append(('.br', brotli.compress(content)))
+        for suffix, data in variants:
+            _atomic_write(full_path + suffix, data)
+        self.written += 1
+
+    def remove(self, relative_path):
+        self.hashes.pop(relative_path, None)
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(self.root, relative_path + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def prerender_site(output_dir=None, incremental=False, changed_game_ids=()):
+    """
+    Renders the public pages into output_dir (PRERENDER_ROOT by default). A full build renders
+    everything. An incremental build re-renders the archive-wide pages, the recent-games pages
+    whose list of games changed, any page holding one of changed_game_ids, and the permalinks
+    whose target page moved. Returns counts of files written and left unchanged.
+    """
+    root = output_dir or settings.PRERENDER_ROOT
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    previous = {'hashes': {}, 'pages': []}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    if not incremental:
+        previous['pages'] = []
+
+    writer = _Writer(root, previous['hashes'])
+
+    for url_name, view in ARCHIVE_PAGES:
+        writer.write(_output_path(url_name), _render_view(view, url_name))
+    if not incremental:
+        for url_name, view in FIXED_PAGES:
+            writer.write(_output_path(url_name), _render_view(view, url_name))
+
+    game_ids = list(Game.objects.order_by('-air_date', '-episode_number').values_list('id', flat=True))
+    pages = [game_ids[i:i + GAMES_PER_PAGE] for i in range(0, len(game_ids), GAMES_PER_PAGE)] or [[]]
+    old_pages = previous['pages']
+    old_page_of = {game_id: n for n, ids in enumerate(old_pages, start=1) for game_id in ids}
+    changed = set(changed_game_ids)
+
+    for n, ids in enumerate(pages, start=1):
+        stale = n > len(old_pages) or old_pages[n - 1] != ids or changed.intersection(ids)
+        if stale:
+            writer.write(_output_path('recent_games', page=n), _render_view(recent_games_view, 'recent_games',
+                                                                           {'page': n}))
+        for game_id in ids:
+            if old_page_of.get(game_id) != n:
+                target = f"{reverse('recent_games')}?page={n}#game-{game_id}"
+                writer.write(_output_path('game_permalink', game_id=game_id), _redirect_page(target))
+
+    # Drop pages and permalinks that no longer exist (deleted games, fewer pages)
+    for n in range(len(pages) + 1, len(old_pages) + 1):
+        writer.remove(_output_path('recent_games', page=n))
+    for game_id in set(old_page_of) - set(game_ids):
+        writer.remove(_output_path('game_permalink', game_id=game_id))
+
+    _atomic_write(manifest_path, json.dumps({'hashes': writer.hashes, 'pages': pages}).encode())
+    return {'written': writer.written, 'unchanged': writer.unchanged}
+
+
+def _prerender_pending():
+    with _pending_lock:
+        changed = sorted(_pending_game_ids)
+        _pending_game_ids.clear()
+    prerender_site(incremental=True, changed_game_ids=changed)
+
+
+def mark_edited(game_ids):
+    """
+    Records games whose pages an edit changed, for the next prerender_in_background() to include.
+    """
+    with _pending_lock:
+        _edited_game_ids.update(game_ids)
+
+
+def prerender_in_background(changed_game_ids=()):
+    """
+    An incremental prerender_site() in a background thread, covering changed_game_ids and any
+    games marked as edited since the last one. Games saved while one runs are re-rendered together
+    in a single run after it.
+    """
+    with _pending_lock:
+        _pending_game_ids.update(changed_game_ids)
+        _pending_game_ids.update(_edited_game_ids)
+        _edited_game_ids.clear()
+    run_coalesced_in_background('prerender_site', _prerender_pending)
@@ -0,0 +1,52 @@
+from django.db import connections
+from contextlib import ExitStack
+import time
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts queries and accumulates the time spent in them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class SectionProfiler:
+    """
+    Splits a long computation into named sections and records wall time and query count for
+    each. Use as a context manager and call mark(name) at the end of every section.
+    """
+
+    def __init__(self):
+        self.sections = []
+        self.recorder = QueryRecorder()
+        self._stack = None
+        self._last_time = None
+        self._last_count = 0
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self.recorder))
+        self._last_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.sections.append({'name': name, 'ms': (now - self._last_time) * 1000,
+                              'queries': self.recorder.count - self._last_count})
+        self._last_time = now
+        self._last_count = self.recorder.count
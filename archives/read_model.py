@@ -0,0 +1,288 @@
+"""
+In-memory read model of the archive for the public views. Each worker process holds one
+immutable ArchiveSnapshot: every game in display order with its players and their computed
+outcomes, the top champions and the current statistics page fragments. A new snapshot replaces
+the old one wholesale when the archive version changes.
+
+The version is the id of the newest StatisticsCache row, which changes with every saved game
+and admin edit. It is probed at most once every READ_MODEL_PROBE_SECONDS, in the background,
+so in steady state the public pages run no queries at all. Saving a StatisticsCache row makes
+the next request in the same process probe straight away; other processes catch up within the
+probe interval.
+
+With ARCHIVE_SNAPSHOT_PATH set, the snapshot is also written to a binary file that every worker
+memory-maps instead of holding its own copy (archives/snapshot_file.py).
+"""
+from .models import Game, Player, StatisticsCache
+from . import swr
+from django.conf import settings
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+GAME_FIELDS = ('id', 'episode_title', 'air_date', 'episode_number', 'fast_line_tiebreaker_winner_podium')
+PLAYER_FIELDS = ('id', 'game_id', 'name', 'podium_number',
+                 'round1_correct', 'round2_correct', 'round3_correct', 'round4_correct',
+                 'round1_score', 'round2_score', 'round3_score', 'round4_score', 'won_tiebreaker',
+                 'fast_line_correct_count', 'fast_line_incorrect_count', 'fast_line_score',
+                 'final_round_correct_count', 'total_winnings')
+
+
+class GameRecord:
+    """
+    A game and its players (a tuple, by podium). Never modified once the snapshot is built.
+    """
+    __slots__ = GAME_FIELDS + ('players',)
+
+    def __init__(self, row):
+        for name, value in zip(GAME_FIELDS, row):
+            setattr(self, name, value)
+        self.players = ()
+
+
+class PlayerRecord:
+    """
+    A player with the values the archive pages show: round and fast line totals and whether
+    they advanced to the fast line and won the game. Never modified once the snapshot is built.
+    """
+    __slots__ = PLAYER_FIELDS[:1] + PLAYER_FIELDS[2:] + (
+        'game', 'round_total_score', 'fast_line_total_score', 'is_advancing', 'is_winner')
+
+    def __init__(self, row, game):
+        for name, value in zip(PLAYER_FIELDS, row):
+            if name != 'game_id':
+                setattr(self, name, value)
+        self.game = game
+        self.round_total_score = self.round1_score + self.round2_score + self.round3_score + self.round4_score
+        self.fast_line_total_score = self.round_total_score + (self.fast_line_score or 0)
+        self.is_advancing = False
+        self.is_winner = False
+
+
+class RankedPlayer:
+    """
+    A player as listed in the statistics leaderboards, with the list's own values attached
+    (the snapshot's PlayerRecord itself stays untouched).
+    """
+    __slots__ = ('player', 'fast_line_total', 'round_total', 'page_number')
+
+    def __init__(self, player, data):
+        self.player = player
+        self.fast_line_total = data.get('fast_line_total')
+        self.round_total = data.get('round_total')
+        self.page_number = data.get('page_number')
+
+    def __getattr__(self, name):
+        return getattr(self.player, name)
+
+
+def _set_outcomes(game):
+    """
+    Marks the players advancing to the fast line and the game's winner(s).
+    """
+    # Highest round total first; ties keep podium order
+    ranked = sorted(game.players, key=lambda p: p.round_total_score, reverse=True)
+    if not ranked:
+        return
+
+    advancing = []
+    if ranked[0].round_total_score >= 0:
+        advancing.append(ranked[0])
+    tiebreaker_winner = next((p for p in ranked if p.won_tiebreaker), None)
+    if tiebreaker_winner:
+        if tiebreaker_winner not in advancing:
+            advancing.append(tiebreaker_winner)
+    elif len(ranked) > 1 and ranked[1].round_total_score >= 0:
+        if ranked[1] not in advancing:
+            advancing.append(ranked[1])
+
+    # A fast line tie-breaker decides the winner, otherwise the highest fast line total
+    if game.fast_line_tiebreaker_winner_podium is not None:
+        winners = [p for p in advancing if p.podium_number == game.fast_line_tiebreaker_winner_podium][:1]
+    else:
+        best = max((p.fast_line_total_score for p in advancing), default=-1)
+        winners = [p for p in advancing if p.fast_line_total_score == best] if best >= 0 else []
+
+    for p in advancing:
+        p.is_advancing = True
+    for p in winners:
+        p.is_winner = True
+
+
+class ArchiveSnapshot:
+    __slots__ = ('version', 'games', 'games_by_id', 'players_by_id', 'position', 'top_champions', 'fragments')
+
+    def __init__(self, version, games, players):
+        self.version = version
+        # Newest first, as on the home and recent games pages
+        self.games = tuple(games)
+        self.games_by_id = {game.id: game for game in self.games}
+        self.players_by_id = {player.id: player for player in players}
+        self.position = {game.id: index for index, game in enumerate(self.games)}
+        top = sorted((p for p in players if p.total_winnings > 1000), key=lambda p: p.total_winnings, reverse=True)
+        self.top_champions = tuple(top[:3])
+        self.fragments = None
+
+    @property
+    def latest_game(self):
+        return self.games[0] if self.games else None
+
+
+def statistics_context(data, snapshot):
+    """
+    Turns cached statistics data back into a template context, taking the players it lists
+    from the snapshot.
+    """
+    context = dict(data)
+    context['latest_game'] = snapshot.games_by_id.get(context.get('latest_game_id'))
+
+    def rehydrate_players(player_data_list):
+        return [RankedPlayer(snapshot.players_by_id[p_data['id']], p_data)
+                for p_data in player_data_list or [] if p_data.get('id') in snapshot.players_by_id]
+
+    context['top_fast_line_players'] = rehydrate_players(context.get('top_fast_line_players'))
+    context['top_fast_line_scores'] = rehydrate_players(context.get('top_fast_line_scores'))
+    context['leaderboard_data'] = rehydrate_players(context.get('leaderboard_data'))
+    context['podium_leaderboards'] = [dict(podium_lb, players=rehydrate_players(podium_lb.get('players')))
+                                      for podium_lb in context.get('podium_leaderboards', [])]
+    # The comeback list links to each player's game
+    context['top_comebacks'] = [dict(comeback, player=snapshot.players_by_id.get(comeback.get('player', {}).get('id')))
+                                for comeback in context.get('top_comebacks', [])]
+    return context
+
+
+def _load_fragments(snapshot):
+    from .stats_fragments import render_fragments, fragments_are_current
+
+    cached_stats = StatisticsCache.objects.defer('data', 'payload').filter(pk=snapshot.version).first()
+    if cached_stats and fragments_are_current(cached_stats.fragments):
+        return cached_stats.fragments['html']
+    # No cache yet, or the templates changed since the last rebuild: render from the data, in
+    # memory only (this runs on the read path), until the next rebuild stores them
+    return render_fragments(statistics_context(cached_stats.stats, snapshot) if cached_stats else {})['html']
+
+
+def build_snapshot(version):
+    """
+    Loads the archive in three queries (games, players, the statistics cache row of version).
+    """
+    games = [GameRecord(row) for row in
+             Game.objects.order_by('-air_date', '-episode_number').values_list(*GAME_FIELDS)]
+    games_by_id = {game.id: game for game in games}
+
+    players = []
+    players_of = {}
+    for row in Player.objects.order_by('game_id', 'podium_number').values_list(*PLAYER_FIELDS):
+        game = games_by_id[row[1]]
+        player = PlayerRecord(row, game)
+        players.append(player)
+        players_of.setdefault(game.id, []).append(player)
+    for game in games:
+        game.players = tuple(players_of.get(game.id, ()))
+        _set_outcomes(game)
+
+    snapshot = ArchiveSnapshot(version, games, players)
+    snapshot.fragments = _load_fragments(snapshot)
+    return snapshot
+
+
+def load_snapshot(version):
+    """
+    Maps the shared snapshot file when ARCHIVE_SNAPSHOT_PATH is set and the file is current.
+    Otherwise builds the snapshot from the database (and writes the file for the other workers).
+    """
+    if not settings.ARCHIVE_SNAPSHOT_PATH:
+        return build_snapshot(version)
+    from .conditional import template_release
+    from .snapshot_file import open_snapshot, write_snapshot
+
+    mapped = open_snapshot(settings.ARCHIVE_SNAPSHOT_PATH, version, template_release())
+    if mapped is not None:
+        return mapped
+    snapshot = build_snapshot(version)
+    try:
+        write_snapshot(settings.ARCHIVE_SNAPSHOT_PATH, snapshot, template_release())
+    except Exception:
+        # A read-only or full disk only costs this worker its own in-memory copy
+        logger.exception('Writing the archive snapshot file %s failed', settings.ARCHIVE_SNAPSHOT_PATH)
+    return snapshot
+
+
+def publish_snapshot(version):
+    """
+    Writes the snapshot file for a new archive version (the statistics rebuild calls this), so
+    no worker has to load the archive from the database. A no-op without ARCHIVE_SNAPSHOT_PATH.
+    """
+    if not settings.ARCHIVE_SNAPSHOT_PATH:
+        return
+    from .conditional import template_release
+    from .snapshot_file import read_header, release_hash, write_snapshot
+
+    release = template_release()
+    if read_header(settings.ARCHIVE_SNAPSHOT_PATH) != (version, release_hash(release)):
+        write_snapshot(settings.ARCHIVE_SNAPSHOT_PATH, build_snapshot(version), release)
+
+
+def archive_version():
+    """
+    Id of the newest StatisticsCache row (0 for an empty archive); a single primary key lookup.
+    """
+    return StatisticsCache.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+_snapshot = None
+_checked_at = 0.0
+_retry_at = 0.0
+_generation = 0
+
+
+def _refresh():
+    global _snapshot, _checked_at, _retry_at
+    generation = _generation
+    try:
+        version = archive_version()
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = load_snapshot(version)
+    except Exception:
+        # Keep serving the current snapshot and try again after a probe interval
+        _retry_at = time.monotonic() + settings.READ_MODEL_PROBE_SECONDS
+        raise
+    # An invalidate() during the probe may have come after a newer version was saved
+    if generation == _generation:
+        _checked_at = time.monotonic()
+    return _snapshot
+
+
+def get_snapshot():
+    """
+    The current ArchiveSnapshot, served stale-while-revalidate (archives/swr.py): after
+    READ_MODEL_PROBE_SECONDS the version is probed (and the snapshot rebuilt if it changed) in
+    the background while requests keep using the snapshot they have. Only a snapshot not
+    confirmed for READ_MODEL_STALE_SECONDS, or invalidated, makes a request wait for the probe,
+    and if that fails the old snapshot is served anyway.
+    """
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None:
+        if now - _checked_at < settings.READ_MODEL_PROBE_SECONDS or now < _retry_at:
+            return snapshot
+        if now - _checked_at < settings.READ_MODEL_STALE_SECONDS:
+            swr.refresh_in_background('read_model', _refresh)
+            return snapshot
+    try:
+        return swr.refresh('read_model', _refresh)
+    except Exception:
+        if snapshot is None:
+            raise
+        return snapshot
+
+
+def invalidate():
+    """
+    Makes the next get_snapshot() in this process wait for a fresh probe instead of serving the
+    snapshot it has.
+    """
+    global _checked_at, _retry_at, _generation
+    _generation += 1
+    _checked_at = _retry_at = 0.0
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from .models import Player, PlayerRound, StatisticsCache, Syndication
+from .syndication import clear_syndication_cache
+from . import read_model, stats_versions
+
+
+@receiver(post_save, sender=StatisticsCache)
+@receiver(post_delete, sender=StatisticsCache)
+def archive_changed(sender, **kwargs):
+    # This process sees the new archive version on its next request (connected first, so the
+    # pre-rendering below already reads the new snapshot)
+    read_model.invalidate()
+
+
+@receiver(pre_delete, sender=StatisticsCache)
+def keep_delta_chains(sender, instance, **kwargs):
+    # Rows stored as deltas against this one become keyframes, so they stay readable
+    stats_versions.detach_dependents(instance)
+
+
+@receiver(post_save, sender=StatisticsCache)
+def prerender_on_stats_update(sender, instance, created, **kwargs):
+    """
+    A new statistics cache row is written after every saved game, which is exactly when the
+    public pages change. Re-render the affected ones if pre-rendering is enabled, in the background
+    once the row is committed, so saving a game doesn't wait on it.
+    """
+    if not created or not settings.PRERENDER_ON_SAVE:
+        return
+    from .prerender import prerender_in_background
+    changed = [instance.through_game_id] if instance.through_game_id else []
+    transaction.on_commit(lambda: prerender_in_background(changed))
+
+
+# Player fields its PlayerRound rows are copied from
+ROUND_SOURCE_FIELDS = {'game', 'game_id', 'podium_number'} | {
+    f'round{r}_{column}' for r in range(1, 5) for column in ('correct', 'score')}
+
+
+@receiver(post_save, sender=Player)
+def sync_player_rounds(sender, instance, created, raw, update_fields, **kwargs):
+    """
+    Keeps a player's normalized rounds in step with its round columns on every save (the score
+    entry API, the admin and its inlines, the shell). Deleting a player cascades to its rounds.
+    Bulk writes skip signals and write the rounds themselves, as synthetic.generate_archive does.
+    """
+    if raw or (update_fields is not None and not ROUND_SOURCE_FIELDS.intersection(update_fields)):
+        return
+    if created:
+        PlayerRound.objects.bulk_create(PlayerRound.rows_for([instance]))
+    else:
+        PlayerRound.sync([instance])
+
+
+@receiver(post_save, sender=Syndication)
+@receiver(post_delete, sender=Syndication)
+def syndication_changed(sender, **kwargs):
+    clear_syndication_cache()
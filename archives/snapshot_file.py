@@ -0,0 +1,246 @@
+"""
+Binary, memory-mapped form of the archive read model (archives/read_model.py), written to
+ARCHIVE_SNAPSHOT_PATH. Every worker maps the same file, so the archive is held once in the
+page cache however many gunicorn workers there are, and a freshly started worker serves from
+it without loading the archive from the database.
+
+Layout (little-endian, fixed-size records, offsets from the start of the file):
+
+    header      magic, format version, archive version, template release hash, counts, offsets
+    games       GAME records in display order (newest first); a game's position is its index
+    players     PLAYER records, grouped by game and ordered by podium
+    index       (game id, position) pairs sorted by id, for permalinks
+    top         player indexes of the top champions
+    fragments   (offset, length) of each statistics fragment, in FRAGMENT_NAMES order
+    strings     UTF-8 text: titles, names and fragment HTML
+
+A new file is written next to the old one and renamed over it; workers still mapping the old
+file keep reading it until they notice the new archive version.
+"""
+from .read_model import GameRecord, PlayerRecord
+from .stats_fragments import FRAGMENT_NAMES
+from datetime import date
+import hashlib
+import mmap
+import os
+import struct
+
+MAGIC = b'PLAS'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sHxxQ16s9I')
+GAME = struct.Struct('<IIBbxxIIII')
+PLAYER = struct.Struct('<IIIIBBBx6ihhh')
+INDEX_ENTRY = struct.Struct('<II')
+UINT = struct.Struct('<I')
+SPAN = struct.Struct('<II')
+
+# PLAYER flag bits
+WON_TIEBREAKER, ADVANCING, WINNER, HAS_FAST_LINE_SCORE = 1, 2, 4, 8
+
+
+def release_hash(release):
+    return hashlib.md5(release.encode()).digest()
+
+
+def _optional(value):
+    return -1 if value is None else value
+
+
+class _Strings:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def add(self, text):
+        data = (text or '').encode()
+        offset = len(self.buffer)
+        self.buffer += data
+        return offset, len(data)
+
+
+def write_snapshot(path, snapshot, release):
+    """
+    Serializes an ArchiveSnapshot built from the database and atomically replaces path with it.
+    """
+    strings = _Strings()
+    games, players, player_index = bytearray(), bytearray(), {}
+
+    for position, game in enumerate(snapshot.games):
+        title = strings.add(game.episode_title)
+        games += GAME.pack(game.id, game.air_date.toordinal(), game.episode_number,
+                           _optional(game.fast_line_tiebreaker_winner_podium), *title,
+                           len(player_index), len(game.players))
+        for p in game.players:
+            player_index[p.id] = len(player_index)
+            correct = 0
+            for r, value in enumerate((p.round1_correct, p.round2_correct, p.round3_correct, p.round4_correct)):
+                if value is not None:
+                    correct |= (1 << r) | (value << (r + 4))
+            flags = ((WON_TIEBREAKER if p.won_tiebreaker else 0) | (ADVANCING if p.is_advancing else 0)
+                     | (WINNER if p.is_winner else 0) | (HAS_FAST_LINE_SCORE if p.fast_line_score is not None else 0))
+            players += PLAYER.pack(p.id, position, *strings.add(p.name), p.podium_number, correct, flags,
+                                   p.round1_score, p.round2_score, p.round3_score, p.round4_score,
+                                   p.fast_line_score or 0, p.total_winnings, _optional(p.fast_line_correct_count),
+                                   _optional(p.fast_line_incorrect_count), _optional(p.final_round_correct_count))
+
+    index = b''.join(INDEX_ENTRY.pack(game_id, position) for game_id, position in sorted(snapshot.position.items()))
+    top = b''.join(UINT.pack(player_index[p.id]) for p in snapshot.top_champions)
+    fragments = b''.join(SPAN.pack(*strings.add(snapshot.fragments.get(name))) for name in FRAGMENT_NAMES)
+
+    offset = HEADER.size
+    offsets = []
+    for section in (games, players, index, top, fragments):
+        offsets.append(offset)
+        offset += len(section)
+    offsets.append(offset)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, snapshot.version, release_hash(release),
+                         len(snapshot.games), len(player_index), len(snapshot.top_champions), *offsets)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for section in (header, games, players, index, top, fragments, strings.buffer):
+            f.write(section)
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """
+    (archive version, release hash) of the file at path, or None if there is no usable file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, format_version, version, release, *_ = HEADER.unpack(data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None
+    return version, release
+
+
+class _Games:
+    """
+    The games in display order as a read-only sequence (what Paginator needs); records are
+    decoded from the mapping on access.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.game_count
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.snapshot.game(i) for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return self.snapshot.game(item)
+
+
+class _Positions:
+    """
+    Game id -> position lookups by binary search over the index section.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def get(self, game_id, default=None):
+        buffer, start = self.snapshot.buffer, self.snapshot.index_offset
+        low, high = 0, self.snapshot.game_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, position = INDEX_ENTRY.unpack_from(buffer, start + middle * INDEX_ENTRY.size)
+            if entry_id == game_id:
+                return position
+            if entry_id < game_id:
+                low = middle + 1
+            else:
+                high = middle
+        return default
+
+
+class MappedSnapshot:
+    """
+    The same interface the views use on ArchiveSnapshot (version, games, latest_game,
+    top_champions, position, fragments), read from a mapped snapshot file.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        (_, _, self.version, _, self.game_count, self.player_count, self.top_count, self.games_offset,
+         self.players_offset, self.index_offset, self.top_offset, self.fragments_offset,
+         self.strings_offset) = HEADER.unpack_from(buffer)
+        self.games = _Games(self)
+        self.position = _Positions(self)
+
+    def _string(self, offset, length):
+        start = self.strings_offset + offset
+        return str(self.buffer[start:start + length], 'utf-8')
+
+    def game(self, position):
+        game_id, ordinal, episode_number, tiebreaker, title_offset, title_length, first_player, player_count = (
+            GAME.unpack_from(self.buffer, self.games_offset + position * GAME.size))
+        game = GameRecord((game_id, self._string(title_offset, title_length), date.fromordinal(ordinal),
+                           episode_number, None if tiebreaker < 0 else tiebreaker))
+        game.players = tuple(self._player(i, game) for i in range(first_player, first_player + player_count))
+        return game
+
+    def _player(self, index, game):
+        (player_id, _, name_offset, name_length, podium, correct, flags, r1, r2, r3, r4, fast_line_score,
+         total_winnings, fast_line_correct, fast_line_incorrect, final_round_correct) = (
+            PLAYER.unpack_from(self.buffer, self.players_offset + index * PLAYER.size))
+        rounds_correct = [bool(correct >> (r + 4) & 1) if correct >> r & 1 else None for r in range(4)]
+        player = PlayerRecord((
+            player_id, game.id, self._string(name_offset, name_length), podium, *rounds_correct, r1, r2, r3, r4,
+            bool(flags & WON_TIEBREAKER), None if fast_line_correct < 0 else fast_line_correct,
+            None if fast_line_incorrect < 0 else fast_line_incorrect,
+            fast_line_score if flags & HAS_FAST_LINE_SCORE else None,
+            None if final_round_correct < 0 else final_round_correct, total_winnings), game)
+        player.is_advancing = bool(flags & ADVANCING)
+        player.is_winner = bool(flags & WINNER)
+        return player
+
+    @property
+    def latest_game(self):
+        return self.game(0) if self.game_count else None
+
+    @property
+    def top_champions(self):
+        champions = []
+        for i in range(self.top_count):
+            (index,) = UINT.unpack_from(self.buffer, self.top_offset + i * UINT.size)
+            # A PLAYER record starts with the player id and its game's position
+            player_id, position = INDEX_ENTRY.unpack_from(self.buffer, self.players_offset + index * PLAYER.size)
+            champions.append(next(p for p in self.game(position).players if p.id == player_id))
+        return champions
+
+    @property
+    def fragments(self):
+        html = {}
+        for i, name in enumerate(FRAGMENT_NAMES):
+            html[name] = self._string(*SPAN.unpack_from(self.buffer, self.fragments_offset + i * SPAN.size))
+        return html
+
+
+def open_snapshot(path, version, release):
+    """
+    Maps the snapshot file if it holds this archive version and was rendered with this
+    template release; otherwise returns None.
+    """
+    if read_header(path) != (version, release_hash(release)):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    snapshot = MappedSnapshot(buffer)
+    # The file may have been replaced between reading the header and mapping it
+    return snapshot if snapshot.version == version else None
@@ -0,0 +1,261 @@
+"""
+The statistics computed in the rebuild's per-game pass, as registered accumulators.
+
+Each accumulator keeps its own state through the pass: init() makes an empty one, add_game() adds
+one game (a stats_utils.GameRow, with the advancing and winning player ids worked out once for all
+accumulators), merge() combines the states of two disjoint sets of games and finalize() turns a
+state into output entries. accumulate() runs every registered accumulator over the games in one
+pass, so a new statistic costs one more add_game() call per game rather than another walk over the
+archive, and because states merge it works unchanged in the parallel rebuild (each shard
+accumulates, the parent merges) and when games are added one at a time (stats_history).
+
+The outputs of the accumulators below feed stats_utils.statistics_sections(). One registered with
+stored = True has its entries put into the statistics cache as they are, e.g.
+
+    @register
+    class Tiebreakers(Accumulator):
+        name = 'tiebreakers'
+        stored = True
+
+        def init(self):
+            return {'tiebreaker_games': 0}
+
+        def add_game(self, state, game, advancing_ids, winner_ids):
+            if game.fast_line_tiebreaker_winner_podium is not None:
+                state['tiebreaker_games'] += 1
+
+Outputs must be JSON serializable. The statistics history runs the accumulators whose outputs
+are summable counters (counters = True, and not stored) after every game and keeps their running
+totals, special-casing comeback_max_diff and top_comebacks; others set counters = False.
+"""
+import heapq
+
+TOP_COMEBACKS = 5
+
+ACCUMULATORS = []
+
+
+def register(accumulator_class):
+    """
+    Class decorator adding an accumulator to the per-game pass; outputs follow registration order.
+    """
+    ACCUMULATORS.append(accumulator_class())
+    return accumulator_class
+
+
+def calculate_game_outcomes(game):
+    """
+    Helper function to determine advancing players and winners for a given game.
+    """
+    players = sorted(game.players, key=lambda p: p.round_total, reverse=True)
+    if not players:
+        return [], []
+
+    # Determine advancing players from round 1-4
+    advancing_ids = []
+    if len(players) > 0 and players[0].round_total >= 0:
+        advancing_ids.append(players[0].id)
+
+    tiebreaker_winner = next((p for p in players if p.won_tiebreaker), None)
+    if tiebreaker_winner:
+        if tiebreaker_winner.id not in advancing_ids:
+            advancing_ids.append(tiebreaker_winner.id)
+    elif len(players) > 1 and players[1].round_total >= 0:
+        if players[1].id not in advancing_ids:
+            advancing_ids.append(players[1].id)
+
+    winner_ids = []
+    advancing_players = [p for p in players if p.id in advancing_ids]
+
+    if game.fast_line_tiebreaker_winner_podium is not None:
+        winner_player = next(
+            (p for p in advancing_players if p.podium_number == game.fast_line_tiebreaker_winner_podium), None)
+        if winner_player:
+            winner_ids.append(winner_player.id)
+    else:
+        fast_line_totals = [p.round_total + (p.fast_line_score or 0) for p in advancing_players]
+        max_fast_line_total = max(fast_line_totals, default=-1)
+        if max_fast_line_total >= 0:
+            winner_ids = [p.id for p, total in zip(advancing_players, fast_line_totals) if total == max_fast_line_total]
+
+    return advancing_ids, winner_ids
+
+
+def add_counts(a, b):
+    """
+    Adds two states of the same shape: numbers add, dicts add key by key.
+    """
+    if isinstance(a, dict):
+        return {key: add_counts(value, b[key]) for key, value in a.items()}
+    return a + b
+
+
+class Accumulator:
+    """
+    One statistic of the per-game pass. The defaults suit a dict of counters that is output as is.
+    """
+    name = None
+    stored = False
+    counters = True
+
+    def init(self):
+        raise NotImplementedError
+
+    def add_game(self, state, game, advancing_ids, winner_ids):
+        raise NotImplementedError
+
+    def merge(self, a, b):
+        return add_counts(a, b)
+
+    def finalize(self, state):
+        return state
+
+
+@register
+class PlayerDistributions(Accumulator):
+    """
+    Players by how many preliminary rounds they got right, and how many of each advanced.
+    """
+    name = 'player_distributions'
+
+    def init(self):
+        return {
+            'total_players': 0,
+            'player_prelim_correct_counts': {i: 0 for i in range(5)},
+            'player_advancement_by_correct_count': {i: {'advanced': 0, 'total': 0} for i in range(5)},
+        }
+
+    def add_game(self, state, game, advancing_ids, winner_ids):
+        state['total_players'] += len(game.players)
+        for p in game.players:
+            correct_total = sum(1 for r in p.round_correct if r is True)
+            state['player_prelim_correct_counts'][correct_total] += 1
+            advancement = state['player_advancement_by_correct_count'][correct_total]
+            advancement['total'] += 1
+            if p.id in advancing_ids: advancement['advanced'] += 1
+
+
+@register
+class PodiumAdvancement(Accumulator):
+    """
+    Players, advancers and winners by podium.
+    """
+    name = 'podium_advancement'
+
+    def init(self):
+        return {'advancement_stats_raw': {i: {'total': 0, 'advanced': 0, 'won': 0} for i in range(1, 5)}}
+
+    def add_game(self, state, game, advancing_ids, winner_ids):
+        for p in game.players:
+            advancement = state['advancement_stats_raw'][p.podium_number]
+            advancement['total'] += 1
+            if p.id in advancing_ids: advancement['advanced'] += 1
+            if p.id in winner_ids: advancement['won'] += 1
+
+
+def comeback_sort_key(comeback):
+    # Biggest deficit first; ties keep the archive's newest-first order, as in a serial pass
+    return comeback['diff'], comeback['air_date'], comeback['episode_number']
+
+
+@register
+class Comebacks(Accumulator):
+    """
+    Fast Line games won by the player who was behind after the rounds, and the biggest of those.
+    """
+    name = 'comebacks'
+
+    def init(self):
+        return {'total_fast_line_games': 0, 'comeback_count': 0, 'comeback_diff_sum': 0, 'comeback_max_diff': 0,
+                'top_comebacks': []}
+
+    def add_game(self, state, game, advancing_ids, winner_ids):
+        advancing_players = [p for p in game.players if p.id in advancing_ids]
+        if len(advancing_players) != 2:
+            return
+        state['total_fast_line_games'] += 1
+        p1, p2 = advancing_players
+        if p1.round_total < p2.round_total and p1.id in winner_ids:
+            winner, diff = p1, p2.round_total - p1.round_total
+        elif p2.round_total < p1.round_total and p2.id in winner_ids:
+            winner, diff = p2, p1.round_total - p2.round_total
+        else:
+            return
+        # The winner's fast line total is only known when no fast line tiebreaker was needed
+        fast_line_total = None
+        if game.fast_line_tiebreaker_winner_podium is None:
+            fast_line_total = winner.round_total + (winner.fast_line_score or 0)
+        state['comeback_count'] += 1
+        state['comeback_diff_sum'] += diff
+        state['comeback_max_diff'] = max(state['comeback_max_diff'], diff)
+        top = state['top_comebacks']
+        top.append({'player_id': winner.id, 'diff': diff, 'air_date': game.air_date,
+                    'episode_number': game.episode_number, 'round_total': winner.round_total,
+                    'fast_line_total': fast_line_total})
+        # Trimming keeps the list short; nlargest is stable, so ties still rank as in one sort
+        if len(top) > 4 * TOP_COMEBACKS:
+            top[:] = heapq.nlargest(TOP_COMEBACKS, top, key=comeback_sort_key)
+
+    def merge(self, a, b):
+        merged = add_counts({k: v for k, v in a.items() if k != 'top_comebacks'},
+                            {k: v for k, v in b.items() if k != 'top_comebacks'})
+        merged['comeback_max_diff'] = max(a['comeback_max_diff'], b['comeback_max_diff'])
+        merged['top_comebacks'] = heapq.nlargest(TOP_COMEBACKS, a['top_comebacks'] + b['top_comebacks'],
+                                                 key=comeback_sort_key)
+        return merged
+
+    def finalize(self, state):
+        return dict(state, top_comebacks=heapq.nlargest(TOP_COMEBACKS, state['top_comebacks'], key=comeback_sort_key))
+
+
+# --- The pass ---
+
+def init_states(accumulators=None):
+    """
+    Empty states for the given accumulators (by default every registered one); the functions
+    below run the accumulators the states are for.
+    """
+    return {accumulator.name: accumulator.init() for accumulator in accumulators or ACCUMULATORS}
+
+
+def _of(states):
+    return [accumulator for accumulator in ACCUMULATORS if accumulator.name in states]
+
+
+def accumulate(games, states=None):
+    """
+    Runs the accumulators over the games in one pass, adding to states if given.
+    """
+    states = init_states() if states is None else states
+    steps = [(accumulator.add_game, states[accumulator.name]) for accumulator in _of(states)]
+    for game in games:
+        advancing_ids, winner_ids = calculate_game_outcomes(game)
+        for add_game, state in steps:
+            add_game(state, game, advancing_ids, winner_ids)
+    return states
+
+
+def merge_states(a, b):
+    """
+    Combines the states of two disjoint sets of games.
+    """
+    return {accumulator.name: accumulator.merge(a[accumulator.name], b[accumulator.name])
+            for accumulator in _of(a)}
+
+
+def finalize_states(states):
+    """
+    Every accumulator's output entries, in one dict.
+    """
+    totals = {}
+    for accumulator in _of(states):
+        totals.update(accumulator.finalize(states[accumulator.name]))
+    return totals
+
+
+def stored_keys():
+    """
+    The output keys stored in the statistics cache as they are.
+    """
+    return [key for accumulator in ACCUMULATORS if accumulator.stored
+            for key in accumulator.finalize(accumulator.init())]
@@ -0,0 +1,192 @@
+"""
+Bootstrap confidence intervals for the podium and turn order statistics.
+
+On a small archive a podium's lead of a few points is often noise. So the per-game pass also
+works out, for each game, the counts behind podium_stats, advancement_stats and turn_performance
+(SAMPLE_COLUMNS), and the statistics are recomputed over STATS_BOOTSTRAP_RESAMPLES resamples of
+the games. The middle 95% of each statistic's resampled values is its interval, attached to its
+row as e.g. round1_pct_ci = [low, high], and statistics_sections() colors those columns by whether
+the intervals separate rather than by the raw min/max.
+
+It is a Poisson bootstrap: rather than drawing each resample's games with replacement, every game
+appears in each resample a Poisson(1) number of times, so a resample's column totals can be added
+up one game at a time. The state is then one row of totals per resample, whatever the size of the
+archive. A game's counts are weighted in per batch (weights as a resamples x games matrix product),
+and its weights come from hashing its id, so any order or sharding of the games gives the same
+totals and rebuilding an unchanged archive gives the same intervals. They still shift with every
+added game, so the statistics cache stores them beside its delta-encoded payload
+(stats_versions.split_intervals).
+
+Needs NumPy; without it (a warning is logged) or with STATS_BOOTSTRAP_RESAMPLES = 0 no intervals
+are computed and the statistics are colored as before.
+"""
+from .models import turn_position
+from .stats_accumulators import Accumulator, register
+from django.conf import settings
+import logging
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE = 0.95
+SEED = 0
+# Decimal places of the intervals, as the statistics templates format them (floatformat:1 unless listed)
+DISPLAY_DIGITS = {'avg_score': 0}
+# Resamples x games weighted per batch, which bounds the memory the weights take
+BATCH_CELLS = 500_000
+# Poisson(1) cumulative probabilities up to 20, beyond which the tail is below 2**-53
+POISSON_CDF = [sum(math.exp(-1) / math.factorial(i) for i in range(k + 1)) for k in range(21)]
+
+PODIUM_COUNTS = ('players', 'correct1', 'correct2', 'correct3', 'correct4', 'advanced', 'won', 'round_total')
+SAMPLE_COLUMNS = [(p, count) for p in range(1, 5) for count in PODIUM_COUNTS] + [
+    (f'turn{t}', count) for t in range(1, 5) for count in ('attempts', 'correct')]
+COLUMN_INDEX = {column: i for i, column in enumerate(SAMPLE_COLUMNS)}
+
+
+def _ratio(numerators, denominator, scale):
+    return [COLUMN_INDEX[n] for n in numerators], COLUMN_INDEX[denominator], scale
+
+
+# section: {row: {statistic: ([numerator columns], denominator column, scale)}}, the statistics
+# computed as in statistics_sections()
+RATIOS = {
+    'podium_stats': {p: dict(
+        {f'round{r}_pct': _ratio([(p, f'correct{r}')], (p, 'players'), 100) for r in range(1, 5)},
+        avg_correct=_ratio([(p, f'correct{r}') for r in range(1, 5)], (p, 'players'), 1)) for p in range(1, 5)},
+    'advancement_stats': {p: {
+        'advanced_pct': _ratio([(p, 'advanced')], (p, 'players'), 100),
+        'won_pct': _ratio([(p, 'won')], (p, 'players'), 100),
+        'avg_score': _ratio([(p, 'round_total')], (p, 'players'), 1)} for p in range(1, 5)},
+    'turn_performance': {t: {'pct': _ratio([(f'turn{t}', 'correct')], (f'turn{t}', 'attempts'), 100)}
+                         for t in range(1, 5)},
+}
+
+
+def game_sample(game, advancing_ids, winner_ids):
+    """
+    One game's counts, laid out like SAMPLE_COLUMNS.
+    """
+    sample = [0] * len(SAMPLE_COLUMNS)
+    for p in game.players:
+        base = COLUMN_INDEX[(p.podium_number, 'players')]
+        sample[base] += 1
+        for round_number, correct in enumerate(p.round_correct, start=1):
+            if correct is None:
+                continue
+            turn = COLUMN_INDEX[(f'turn{turn_position(round_number, p.podium_number)}', 'attempts')]
+            sample[turn] += 1
+            if correct:
+                sample[turn + 1] += 1
+                sample[base + round_number] += 1
+        if p.id in advancing_ids: sample[base + 5] += 1
+        if p.id in winner_ids: sample[base + 6] += 1
+        sample[base + 7] += p.round_total
+    return sample
+
+
+def _mix(x):
+    # splitmix64's finalizer, in place on a uint64 array
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def poisson_weights(game_ids, resamples, seed=SEED):
+    """
+    How many times each game appears in each resample: a resamples x games array of Poisson(1)
+    draws, a function of the game ids alone.
+    """
+    ids = np.asarray(game_ids, dtype=np.uint64)
+    keys = (ids[None, :] << np.uint64(32)) | np.arange(resamples, dtype=np.uint64)[:, None]
+    keys += np.uint64((seed + 1) * 0x9E3779B97F4A7C15 % 2 ** 64)
+    bits = _mix(keys)
+    uniform = (bits >> np.uint64(11)) * 2.0 ** -53
+    return np.searchsorted(POISSON_CDF, uniform, side='right')
+
+
+class Replicates:
+    """
+    The bootstrap state: each resample's column totals, and the games not yet weighted into them.
+    """
+
+    def __init__(self, resamples):
+        self.totals = np.zeros((resamples, len(SAMPLE_COLUMNS)))
+        self.game_ids = []
+        self.samples = []
+
+    def add(self, game_id, sample):
+        self.game_ids.append(game_id)
+        self.samples.append(sample)
+        if len(self.game_ids) * len(self.totals) >= BATCH_CELLS:
+            self.flush()
+
+    def flush(self):
+        if self.game_ids:
+            weights = poisson_weights(self.game_ids, len(self.totals))
+            self.totals += weights @ np.asarray(self.samples, dtype=np.float64)
+            self.game_ids, self.samples = [], []
+        return self.totals
+
+
+def bootstrap_intervals(totals):
+    """
+    {section: {row: {statistic: [low, high]}}} for the RATIOS, from the resamples' column totals.
+    """
+    resamples = len(totals)
+    tail = (1 - CONFIDENCE) / 2 * 100
+    intervals = {}
+    for section, rows in RATIOS.items():
+        for row, statistics in rows.items():
+            for name, (numerators, denominator, scale) in statistics.items():
+                denominators = totals[:, denominator]
+                values = np.divide(totals[:, numerators].sum(axis=1) * scale, denominators,
+                                   out=np.zeros(resamples), where=denominators > 0)
+                low, high = np.percentile(values, [tail, 100 - tail])
+                # Kept to the precision the page shows them at
+                digits = DISPLAY_DIGITS.get(name, 1)
+                intervals.setdefault(section, {}).setdefault(row, {})[name] = [round(float(low), digits),
+                                                                               round(float(high), digits)]
+    return intervals
+
+
+@register
+class BootstrapSamples(Accumulator):
+    """
+    The resamples' SAMPLE_COLUMNS totals, finalized into the confidence intervals.
+    """
+    name = 'bootstrap'
+    counters = False
+
+    def init(self):
+        if settings.STATS_BOOTSTRAP_RESAMPLES <= 0:
+            return None
+        if np is None:
+            logger.warning('NumPy is not installed, so the statistics are rebuilt without confidence intervals')
+            return None
+        return Replicates(settings.STATS_BOOTSTRAP_RESAMPLES)
+
+    def add_game(self, state, game, advancing_ids, winner_ids):
+        if state is not None:
+            state.add(game.id, game_sample(game, advancing_ids, winner_ids))
+
+    def merge(self, a, b):
+        if a is None:
+            return None
+        a.totals = a.flush() + b.flush()
+        return a
+
+    def finalize(self, state):
+        if state is None:
+            return {'confidence_intervals': None}
+        totals = state.flush()
+        if not totals.any():
+            return {'confidence_intervals': None}
+        return {'confidence_intervals': bootstrap_intervals(totals)}
@@ -0,0 +1,29 @@
+"""
+The statistics page is assembled from fragments (templates/archives/statistics/) that depend
+only on the cached statistics. They are rendered once when the cache is rebuilt and stored in
+StatisticsCache.fragments, so a /statistics/ request only concatenates stored HTML.
+"""
+from .conditional import template_release
+from django.template.loader import render_to_string
+
+FRAGMENT_NAMES = ['through_game', 'preliminary_rounds', 'advancement', 'fast_line', 'final_round', 'leaderboards']
+
+
+def render_fragments(context):
+    """
+    Renders every fragment for a statistics context (model instances or rehydrated players).
+    The result records the template release it was rendered with.
+    """
+    context = dict(context)
+    if 'chart_labels' in context:
+        context['chart_data'] = {'labels': context['chart_labels'], 'correct': context['correct_data'],
+                                 'incorrect': context['incorrect_data']}
+    html = {name: render_to_string(f'archives/statistics/{name}.html', context) for name in FRAGMENT_NAMES}
+    return {'release': template_release(), 'html': html}
+
+
+def fragments_are_current(fragments):
+    """
+    Stored fragments are only reused while the deployed templates match the ones that rendered them.
+    """
+    return bool(fragments) and fragments.get('release') == template_release()
@@ -0,0 +1,300 @@
+"""
+Statistics as of any game: "through game N" for every N, from one pass over the archive.
+
+Games are numbered 1..N in air order. Walking them once, every counter behind the statistics
+page (see stats_utils.statistics_sections) is kept as a running total, and the totals after each
+game are stored as one row of a flat prefix-sum table. Stats through game n are then row n, and a
+trend across all games is a strided slice of one column, so neither needs a rebuild per point.
+
+Top-N lists can't be summed, so each is kept as its change points: the games after which the list
+changed and what it became. Looking a list up through game n is a bisect. Ties keep the earlier
+game, which can order equal entries differently from the rebuild's database queries.
+
+    history = StatsHistory.build()
+    history.statistics_through(20)           # the statistics as cached, as of game 20
+    history.series(('comeback_count',))      # comebacks so far, after each game
+"""
+from .models import Game, Player, turn_position
+from .stats_accumulators import ACCUMULATORS, TOP_COMEBACKS, accumulate, comeback_sort_key, finalize_states, init_states
+from .stats_utils import PLAYER_ROW_FIELDS, _group_rows, statistics_data, statistics_sections
+from django.conf import settings
+from array import array
+from bisect import bisect_right
+from operator import itemgetter
+import copy
+
+FAST_LINE_BINS = 13
+# Games per recent-games page, for the leaderboards' page numbers
+GAMES_PER_PAGE = 5
+FINAL_ROUND_BINS = 6
+# The leaderboards tracked through history and their lengths, as on the statistics page
+TOP_LISTS = [('top_comebacks', TOP_COMEBACKS), ('top_fast_line_players', 5), ('top_fast_line_scores', 20),
+             ('leaderboard_data', 20)] + [(f'podium_{podium}', 10) for podium in range(1, 5)]
+
+# The rows the rebuild streams, read from the game side (an outer join, so games without players
+# still get a number)
+GAME_ROW_FIELDS = tuple('id' if f == 'game_id' else f[len('game__'):] if f.startswith('game__') else f'players__{f}'
+                        for f in PLAYER_ROW_FIELDS)
+
+
+# The per-game pass's accumulators whose outputs are kept as running totals
+HISTORY_ACCUMULATORS = [accumulator for accumulator in ACCUMULATORS if accumulator.counters and not accumulator.stored]
+
+
+def _game_totals(games):
+    return finalize_states(accumulate(games, init_states(HISTORY_ACCUMULATORS)))
+
+
+def _per_game_totals():
+    totals = _game_totals([])
+    del totals['top_comebacks']
+    return totals
+
+
+def _empty_counts():
+    """
+    Every counter kept per game: the rebuild's per-game totals, plus sums and counts standing in
+    for the rebuild's GROUP BY queries.
+    """
+    counts = _per_game_totals()
+    counts.update({
+        'games': 0,
+        'turn_stats': {t: {'attempts': 0, 'correct': 0} for t in range(1, 5)},
+        'prelim_dist_counts': {i: 0 for i in range(5)},
+        'podium_rounds': {p: {'total_players': 0, 'correct': {r: 0 for r in range(1, 5)}} for p in range(1, 5)},
+        'round_total_sum': {p: 0 for p in range(1, 5)},
+        'fast_line_correct_counts': {i: 0 for i in range(FAST_LINE_BINS)},
+        'fast_line_incorrect_counts': {i: 0 for i in range(FAST_LINE_BINS)},
+        'fast_line_sums': {'correct': 0, 'correct_players': 0, 'incorrect': 0, 'incorrect_players': 0},
+        'final_round_counts': {i: 0 for i in range(FINAL_ROUND_BINS)},
+    })
+    return counts
+
+
+def _paths(counts, prefix=()):
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            yield from _paths(value, prefix + (key,))
+        else:
+            yield prefix + (key,)
+
+
+COUNTER_PATHS = list(_paths(_empty_counts()))
+COUNTER_INDEX = {path: i for i, path in enumerate(COUNTER_PATHS)}
+# The leading counters, copied from each game's HISTORY_ACCUMULATORS totals
+TOTALS_PATHS = list(_paths(_per_game_totals()))
+# Kept as a running maximum rather than a running sum
+MAX_COUNTERS = {COUNTER_INDEX[('comeback_max_diff',)]}
+
+
+def _add_game(row, game, totals):
+    """
+    Adds one game's counters into row, a list laid out like COUNTER_PATHS.
+    """
+    index = COUNTER_INDEX
+    for i, path in enumerate(TOTALS_PATHS):
+        value = totals
+        for key in path:
+            value = value[key]
+        row[i] = max(row[i], value) if i in MAX_COUNTERS else row[i] + value
+
+    row[index[('games',)]] += 1
+    for r in range(4):
+        results = [p.round_correct[r] for p in game.players if p.round_correct[r] is not None]
+        if results:
+            row[index[('prelim_dist_counts', results.count(True))]] += 1
+    for p in game.players:
+        for round_number, correct in enumerate(p.round_correct, start=1):
+            if correct is None:
+                continue
+            turn = turn_position(round_number, p.podium_number)
+            row[index[('turn_stats', turn, 'attempts')]] += 1
+            if correct:
+                row[index[('turn_stats', turn, 'correct')]] += 1
+                row[index[('podium_rounds', p.podium_number, 'correct', round_number)]] += 1
+        row[index[('podium_rounds', p.podium_number, 'total_players')]] += 1
+        row[index[('round_total_sum', p.podium_number)]] += p.round_total
+        for field in ('correct', 'incorrect'):
+            value = getattr(p, f'fast_line_{field}_count')
+            if value is None:
+                continue
+            if value < FAST_LINE_BINS:
+                row[index[(f'fast_line_{field}_counts', value)]] += 1
+            row[index[('fast_line_sums', field)]] += value
+            row[index[('fast_line_sums', f'{field}_players')]] += 1
+        if p.final_round_correct_count is not None and p.final_round_correct_count < FINAL_ROUND_BINS:
+            row[index[('final_round_counts', p.final_round_correct_count)]] += 1
+
+
+def _top_list_entries(game, totals):
+    """
+    (list name, sort key, player id, values) for each of the game's candidates, keys ordered as
+    the rebuild's queries order the lists (a missing value ranks below any number).
+    """
+    for c in totals['top_comebacks']:
+        yield 'top_comebacks', comeback_sort_key(c), c['player_id'], {
+            'diff': c['diff'], 'round_total': c['round_total'], 'fast_line_total': c['fast_line_total']}
+    for p in game.players:
+        fast_line_total = p.round_total + p.fast_line_score if p.fast_line_score is not None else None
+        if p.fast_line_correct_count is not None:
+            incorrect = p.fast_line_incorrect_count
+            yield 'top_fast_line_players', (p.fast_line_correct_count, 1 if incorrect is None else -incorrect), p.id, {}
+        if fast_line_total is not None:
+            yield 'top_fast_line_scores', (fast_line_total,), p.id, {
+                'round_total': p.round_total, 'fast_line_total': fast_line_total}
+        yield 'leaderboard_data', (p.total_winnings, float('-inf') if fast_line_total is None else fast_line_total), \
+            p.id, {'round_total': p.round_total, 'fast_line_total': fast_line_total}
+        yield f'podium_{p.podium_number}', (p.round_total,), p.id, {'round_total': p.round_total}
+
+
+class _TopList:
+    """
+    A top-N list with the game numbers after which it changed.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = []  # (sort key, player id, values), best first
+        self.changed_at = []
+        self.versions = []
+
+    def offer(self, key, player_id, values):
+        if len(self.entries) == self.size and key <= self.entries[-1][0]:
+            return False
+        self.entries.append((key, player_id, values))
+        # Stable, so an entry tied with an earlier one stays behind it
+        self.entries.sort(key=itemgetter(0), reverse=True)
+        del self.entries[self.size:]
+        return True
+
+    def commit(self, game_number):
+        self.changed_at.append(game_number)
+        self.versions.append(tuple(self.entries))
+
+    def through(self, game_number):
+        i = bisect_right(self.changed_at, game_number)
+        return self.versions[i - 1] if i else ()
+
+
+class StatsHistory:
+    """
+    The statistics counters after every game, as prefix sums, and the top lists' change points.
+    Game numbers run from 1 (the first game aired) to len(history).
+    """
+
+    def __init__(self):
+        self.width = len(COUNTER_PATHS)
+        # Row n (width counters from n * width) holds the totals through game n; row 0 is zeros
+        self.prefix = array('q', [0] * self.width)
+        self.game_ids = array('q', [0])
+        self.top_lists = {name: _TopList(size) for name, size in TOP_LISTS}
+
+    @classmethod
+    def build(cls, queryset=None, chunk_size=None):
+        """
+        One pass over the games (all of them unless a Game queryset is given) in air order.
+        """
+        history = cls()
+        queryset = Game.objects.all() if queryset is None else queryset
+        rows = queryset.order_by('air_date', 'episode_number', 'id', 'players__podium_number').values_list(
+            *GAME_ROW_FIELDS).iterator(chunk_size=chunk_size or settings.STATS_CHUNK_SIZE)
+        for game in _group_rows(rows):
+            history.append(game)
+        return history
+
+    def append(self, game):
+        """
+        Adds the next game (a stats_utils.GameRow) in air order.
+        """
+        totals = _game_totals([game])
+        row = self.prefix[-self.width:].tolist()
+        _add_game(row, game, totals)
+        self.prefix.extend(row)
+        self.game_ids.append(game.id)
+
+        changed = set()
+        for name, key, player_id, values in _top_list_entries(game, totals):
+            if self.top_lists[name].offer(key, player_id, values):
+                changed.add(name)
+        for name in changed:
+            self.top_lists[name].commit(len(self))
+
+    def __len__(self):
+        return len(self.game_ids) - 1
+
+    def _check(self, game_number):
+        if not 0 <= game_number <= len(self):
+            raise IndexError(f'Game number {game_number} is outside 0..{len(self)}')
+
+    def counter(self, path, game_number):
+        """One counter (a COUNTER_PATHS entry) through the given game."""
+        self._check(game_number)
+        return self.prefix[game_number * self.width + COUNTER_INDEX[path]]
+
+    def series(self, path):
+        """One counter after each of games 1..len(), e.g. for a trend chart."""
+        return self.prefix[self.width + COUNTER_INDEX[path]::self.width]
+
+    def counts_through(self, game_number):
+        """
+        All counters through the given game, in the shape statistics_sections() takes.
+        """
+        self._check(game_number)
+        counts = _empty_counts()
+        start = game_number * self.width
+        for path, value in zip(COUNTER_PATHS, self.prefix[start:start + self.width]):
+            node = counts
+            for key in path[:-1]:
+                node = node[key]
+            node[path[-1]] = value
+
+        podium_rounds, sums = counts['podium_rounds'], counts['fast_line_sums']
+        counts['avg_score_by_podium'] = {
+            p: counts['round_total_sum'][p] / podium_rounds[p]['total_players']
+            for p in range(1, 5) if podium_rounds[p]['total_players']}
+        counts['avg_fast_line'] = {
+            'avg_correct': sums['correct'] / sums['correct_players'] if sums['correct_players'] else None,
+            'avg_incorrect': sums['incorrect'] / sums['incorrect_players'] if sums['incorrect_players'] else None}
+        return counts
+
+    def top_lists_through(self, game_number):
+        """
+        {list name: [(player id, values), ...]} through the given game.
+        """
+        self._check(game_number)
+        return {name: [(player_id, values) for _key, player_id, values in top.through(game_number)]
+                for name, top in self.top_lists.items()}
+
+    def statistics_through(self, game_number):
+        """
+        The statistics as update_statistics_cache() would have built them after the given game
+        (the same structure, without the confidence intervals), with its top lists' players looked
+        up in one query.
+        """
+        stats = statistics_sections(self.counts_through(game_number))
+        top_lists = self.top_lists_through(game_number)
+        players = Player.objects.select_related('game').in_bulk(
+            {player_id for entries in top_lists.values() for player_id, _ in entries})
+        # Pages of the archive as it stood then: newest game first, GAMES_PER_PAGE to a page
+        number_of = {game_id: n for n, game_id in enumerate(self.game_ids)}
+
+        def listed(name):
+            entries = []
+            for player_id, values in top_lists[name]:
+                if player_id not in players:
+                    continue
+                # A copy per list, as each list sets its own values on the player
+                p = copy.copy(players[player_id])
+                for key, value in values.items():
+                    if key != 'diff':
+                        setattr(p, key, value)
+                p.page_number = (game_number - number_of[p.game_id]) // GAMES_PER_PAGE + 1
+                entries.append((p, values))
+            return entries
+
+        return statistics_data(
+            self.game_ids[game_number] if game_number else None, stats,
+            [p for p, _ in listed('top_fast_line_players')], [p for p, _ in listed('top_fast_line_scores')],
+            [p for p, _ in listed('leaderboard_data')],
+            [{'podium_number': podium, 'players': [p for p, _ in listed(f'podium_{podium}')]} for podium in range(1, 5)],
+            [{'player': p, 'diff': values['diff']} for p, values in listed('top_comebacks')])
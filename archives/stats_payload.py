@@ -0,0 +1,293 @@
+"""
+Storage format for StatisticsCache.
+
+Version 1 is the original verbose JSON: every player entry is a dict with repeated keys and
+every colour is a string. Version 2 stores the same data compactly:
+
+    players        deduplicated table of player rows (PLAYER_COLUMNS), referenced by index
+    player_lists   top_fast_line_players/top_fast_line_scores/leaderboard_data as
+                   [player index, fast_line_total, round_total] rows
+    podium_leaderboards, top_comebacks   the same references (plus podium number / diff)
+    tables         the per-row stats lists as {'columns': [...], 'rows': [[...], ...]}, with
+                   colour columns stored as indexes into COLORS
+    scalars        everything else, unchanged
+
+A version 2 payload is stored either as JSON in `data` or, as zlib-compressed compact JSON or
+msgpack (when installed), in the binary `payload` field. decode_stats() reads every version,
+so older rows keep working and the 0009 migration upgrades them in place.
+
+Version 3 rows are deltas: the same containers hold a list of operations (diff_payload) that turn
+the version 2 payload of the row's `base` into its own. Reading them needs the rows they build
+on, so archives/stats_versions.py does that rather than decode_stats().
+"""
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PAYLOAD_VERSION = 2
+DELTA_VERSION = 3
+COLORS = ['green', 'yellow', 'red', 'gray', 'blue']
+
+PLAYER_COLUMNS = ['id', 'name', 'podium_number', 'game_id', 'air_date', 'total_winnings', 'final_round_correct_count',
+                  'fast_line_correct_count', 'fast_line_incorrect_count', 'page_number']
+PLAYER_LISTS = ['top_fast_line_players', 'top_fast_line_scores', 'leaderboard_data']
+TABLES = ['podium_stats', 'advancement_stats', 'turn_performance', 'preliminary_round_dist', 'player_prelim_dist',
+          'player_advancement_dist', 'final_round_stats']
+
+
+def encode_payload(data):
+    """
+    Converts version 1 statistics data (as built by update_statistics_cache) to version 2.
+    """
+    players, player_index = [], {}
+
+    def ref(p):
+        row = [p['id'], p['name'], p['podium_number'], p['game']['id'], p['game']['air_date'], p['total_winnings'],
+               p['final_round_correct_count'], p['fast_line_correct_count'], p['fast_line_incorrect_count'],
+               p['page_number']]
+        key = json.dumps(row)
+        if key not in player_index:
+            player_index[key] = len(players)
+            players.append(row)
+        return [player_index[key], p['fast_line_total'], p['round_total']]
+
+    def table(rows):
+        columns = []
+        for row in rows:
+            columns.extend(key for key in row if key not in columns)
+        return {'columns': columns, 'rows': [[_encode_cell(key, row.get(key)) for key in columns] for row in rows]}
+
+    return {
+        'v': PAYLOAD_VERSION,
+        'players': players,
+        'player_lists': {name: [ref(p) for p in data.get(name, [])] for name in PLAYER_LISTS},
+        'podium_leaderboards': [[pl['podium_number'], [ref(p) for p in pl['players']]]
+                                for pl in data.get('podium_leaderboards', [])],
+        'top_comebacks': [ref(c['player']) + [c['diff']] for c in data.get('top_comebacks', [])],
+        'tables': {name: table(data.get(name, [])) for name in TABLES},
+        'scalars': {key: value for key, value in data.items()
+                    if key not in PLAYER_LISTS and key not in TABLES and key not in ('podium_leaderboards',
+                                                                                     'top_comebacks')},
+    }
+
+
+def decode_payload(payload):
+    """
+    Converts a version 2 payload back to the version 1 shape the views and templates use.
+    """
+    players = payload['players']
+
+    def player(ref):
+        row = dict(zip(PLAYER_COLUMNS, players[ref[0]]))
+        return {'id': row['id'], 'name': row['name'], 'podium_number': row['podium_number'],
+                'game': {'id': row['game_id'], 'air_date': row['air_date']}, 'fast_line_total': ref[1],
+                'total_winnings': row['total_winnings'], 'final_round_correct_count': row['final_round_correct_count'],
+                'fast_line_correct_count': row['fast_line_correct_count'],
+                'fast_line_incorrect_count': row['fast_line_incorrect_count'], 'round_total': ref[2],
+                'page_number': row['page_number']}
+
+    def rows(table):
+        decoded = []
+        for values in table['rows']:
+            row = {}
+            for key, value in zip(table['columns'], values):
+                # Colours are only set on some rows; a missing colour is stored as None
+                if key.endswith('_color') and value is None: continue
+                row[key] = COLORS[value] if key.endswith('_color') and isinstance(value, int) else value
+            decoded.append(row)
+        return decoded
+
+    data = dict(payload['scalars'])
+    for name in PLAYER_LISTS:
+        data[name] = [player(ref) for ref in payload['player_lists'][name]]
+    data['podium_leaderboards'] = [{'podium_number': number, 'players': [player(ref) for ref in refs]}
+                                   for number, refs in payload['podium_leaderboards']]
+    data['top_comebacks'] = [{'player': player(ref[:3]), 'diff': ref[3]} for ref in payload['top_comebacks']]
+    for name in TABLES:
+        data[name] = rows(payload['tables'][name])
+    return data
+
+
+def _encode_cell(key, value):
+    if key.endswith('_color') and value in COLORS:
+        return COLORS.index(value)
+    return value
+
+
+def pack(payload, encoding):
+    """
+    Serializes a version 2 payload for the binary field. Returns (encoding actually used, bytes);
+    msgpack falls back to zlib when the package is not installed.
+    """
+    if encoding == 'msgpack' and msgpack:
+        return 'msgpack', zlib.compress(msgpack.packb(payload))
+    return 'zlib', zlib.compress(json.dumps(payload, separators=(',', ':')).encode())
+
+
+def unpack(blob, encoding):
+    raw = zlib.decompress(bytes(blob))
+    if encoding == 'msgpack':
+        return msgpack.unpackb(raw)
+    return json.loads(raw)
+
+
+def store_fields(data, encoding):
+    """
+    Model field values for storing version 1 data in the given encoding ('json', 'zlib' or 'msgpack').
+    """
+    return payload_fields(PAYLOAD_VERSION, encode_payload(data), encoding)
+
+
+def payload_fields(format_version, payload, encoding):
+    """
+    Model field values for a version 2 payload or version 3 delta in the given encoding.
+    """
+    if encoding == 'json':
+        return {'format_version': format_version, 'encoding': 'json', 'data': payload, 'payload': None}
+    encoding, blob = pack(payload, encoding)
+    return {'format_version': format_version, 'encoding': encoding, 'data': None, 'payload': blob}
+
+
+def stored_payload(encoding, data, blob):
+    """
+    The payload (or delta) a version 2 or 3 row holds, whichever container it is in.
+    """
+    return data if encoding == 'json' else unpack(blob, encoding)
+
+
+def align_players(old, new):
+    """
+    new with its players table reordered so every player old also lists keeps its index there,
+    and players new to the table take the places of those that dropped out. Only the table order
+    changes, not what the payload decodes to, but a delta against old then doesn't renumber the
+    references to every player after one that entered or left a leaderboard.
+    """
+    old_index = {row[0]: i for i, row in enumerate(old['players'])}
+    ids = [row[0] for row in new['players']]
+    if len(set(ids)) != len(ids):
+        return new
+    size = len(ids)
+    position = {}
+    for i, player_id in enumerate(ids):
+        if old_index.get(player_id, size) < size:
+            position[i] = old_index[player_id]
+    free = iter(sorted(set(range(size)) - set(position.values())))
+    for i in range(size):
+        if i not in position:
+            position[i] = next(free)
+    if all(i == j for i, j in position.items()):
+        return new
+
+    players = [None] * size
+    for i, row in enumerate(new['players']):
+        players[position[i]] = row
+
+    def ref(r):
+        return [position[r[0]]] + r[1:]
+
+    return dict(new, players=players,
+                player_lists={name: [ref(r) for r in refs] for name, refs in new['player_lists'].items()},
+                podium_leaderboards=[[number, [ref(r) for r in refs]] for number, refs in new['podium_leaderboards']],
+                top_comebacks=[ref(r) for r in new['top_comebacks']])
+
+
+def _row_keys(items):
+    """
+    The keys of a list of rows keyed by their first value (a player id or index, a podium...), or
+    None if it isn't one.
+    """
+    if not all(isinstance(item, list) and item and isinstance(item[0], (int, str)) for item in items):
+        return None
+    keys = [item[0] for item in items]
+    return keys if len(set(keys)) == len(keys) else None
+
+
+def _size(ops):
+    return len(json.dumps(ops, separators=(',', ':')))
+
+
+def diff_payload(old, new, path=None):
+    """
+    Operations turning one JSON value into another, descending into dicts and lists so only what
+    changed is kept: ['s', path, value] sets a value, ['d', path] removes a key and ['t', path,
+    start, items] replaces a list from index start on. Lists of rows keyed by their first value
+    whose keys moved, e.g. a leaderboard a player entered, can instead be matched up by key:
+    ['k', path, layout, items] rebuilds the list with the old row at index i for each i >= 0 in
+    layout and items[-i - 1] for each i < 0, and further operations update the kept rows. Paths
+    are lists of keys and indexes.
+    """
+    path = path or []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [['d', path + [key]] for key in old if key not in new]
+        for key, value in new.items():
+            ops += diff_payload(old[key], value, path + [key]) if key in old else [['s', path + [key], value]]
+    elif isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            ops += diff_payload(old[i], new[i], path + [i])
+        if len(old) != len(new):
+            ops.append(['t', path, common, new[common:]])
+        old_keys, new_keys = _row_keys(old), _row_keys(new)
+        if ops and old_keys and new_keys and old_keys[:common] != new_keys[:common]:
+            keyed = _diff_keyed(old, new, old_keys, new_keys, path)
+            if _size(keyed) < _size(ops):
+                ops = keyed
+    elif old == new and type(old) is type(new):
+        return []
+    else:
+        return [['s', path, new]]
+    # A row or section whose every value changed is smaller set as a whole than value by value
+    if len(ops) > 1 and _size([['s', path, new]]) < _size(ops):
+        return [['s', path, new]]
+    return ops
+
+
+def _diff_keyed(old, new, old_keys, new_keys, path):
+    old_index = {key: i for i, key in enumerate(old_keys)}
+    layout, items, updates = [], [], []
+    for j, key in enumerate(new_keys):
+        if key in old_index:
+            layout.append(old_index[key])
+            updates += diff_payload(old[old_index[key]], new[j], path + [j])
+        else:
+            items.append(new[j])
+            layout.append(-len(items))
+    return [['k', path, layout, items]] + updates
+
+
+def patch_payload(value, ops):
+    """
+    Applies diff_payload() operations to value in place and returns the result (which is a new
+    object when the whole value was replaced).
+    """
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == 's' and not path:
+            value = op[2]
+            continue
+        parent = value
+        for key in path[:-1] if kind not in 'tk' else path:
+            parent = parent[key]
+        if kind == 's':
+            parent[path[-1]] = op[2]
+        elif kind == 'd':
+            del parent[path[-1]]
+        elif kind == 't':
+            parent[op[2]:] = op[3]
+        else:
+            parent[:] = [parent[i] if i >= 0 else op[3][-i - 1] for i in op[2]]
+    return value
+
+
+def decode_stats(format_version, encoding, data, blob):
+    """
+    Returns version 1 statistics data from any stored format.
+    """
+    if format_version == 1:
+        return data
+    return decode_payload(stored_payload(encoding, data, blob))
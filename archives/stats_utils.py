@@ -1,242 +1,269 @@
-from .models import Game, Player, StatisticsCache
-from django.db.models import Count, Avg, Q, Sum, F
-from collections import defaultdict
-import json
+from .models import Game, Player, PlayerRound, StatisticsCache
+from .stats_accumulators import accumulate, finalize_states, init_states, merge_states, stored_keys
+from . import stats_bootstrap  # noqa: F401 (registers the confidence interval accumulator)
+from .stats_fragments import render_fragments
+from .stats_versions import newest_row, split_intervals, version_fields
+from .db_router import use_replica
+from .read_model import publish_snapshot
+from django.conf import settings
+from django.apps import apps
+from django.db import connection, connections, router
+from django.db.models import Count, Avg, Q, Sum, F, Min, Max
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import groupby
+from operator import itemgetter
+import django
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# The per-game pass streams narrow rows into these rather than loading model instances, so the
+# rebuild's memory stays flat as the archive grows
+GameRow = namedtuple('GameRow', 'id fast_line_tiebreaker_winner_podium air_date episode_number players')
+PlayerRow = namedtuple('PlayerRow', 'id podium_number round_correct round_total won_tiebreaker fast_line_score '
+                                     'fast_line_correct_count fast_line_incorrect_count final_round_correct_count '
+                                     'total_winnings')
+
+PLAYER_ROW_FIELDS = (
+    'game_id', 'game__fast_line_tiebreaker_winner_podium', 'game__air_date', 'game__episode_number',
+    'id', 'podium_number', 'round1_correct', 'round2_correct', 'round3_correct', 'round4_correct',
+    'round1_score', 'round2_score', 'round3_score', 'round4_score', 'won_tiebreaker', 'fast_line_score',
+    'fast_line_correct_count', 'fast_line_incorrect_count', 'final_round_correct_count', 'total_winnings',
+)
+
+
+def _group_rows(rows):
+    """
+    Groups PLAYER_ROW_FIELDS tuples, ordered by game, into GameRows. A row without a player id
+    (a game with no players, from an outer join) gives a GameRow with no players.
+    """
+    for _game_id, game_rows in groupby(rows, key=itemgetter(0)):
+        players = []
+        for row in game_rows:
+            if row[4] is not None:
+                players.append(PlayerRow(row[4], row[5], row[6:10], row[10] + row[11] + row[12] + row[13],
+                                         *row[14:]))
+        yield GameRow(row[0], row[1], row[2], row[3], players)
 
 
-def _calculate_game_outcomes(game):
+def _stream_games(queryset, chunk_size):
     """
-    Helper function to determine advancing players and winners for a given game.
+    Yields a GameRow per game with players, in game id order. The games are read in windows of
+    chunk_size ids, each window's rows streamed with .iterator(), so at most one window of rows
+    is held at a time even where the driver buffers a whole result set (MySQL).
     """
-    players = list(game.players.all())
-    if not players:
-        return [], []
-
-    for p in players:
-        p.round_total = p.round1_score + p.round2_score + p.round3_score + p.round4_score
-
-    players.sort(key=lambda p: p.round_total, reverse=True)
-
-    # Determine advancing players from round 1-4
-    advancing_ids = []
-    if len(players) > 0 and players[0].round_total >= 0:
-        advancing_ids.append(players[0].id)
-
-    tiebreaker_winner = next((p for p in players if p.won_tiebreaker), None)
-    if tiebreaker_winner:
-        if tiebreaker_winner.id not in advancing_ids:
-            advancing_ids.append(tiebreaker_winner.id)
-    elif len(players) > 1 and players[1].round_total >= 0:
-        if players[1].id not in advancing_ids:
-            advancing_ids.append(players[1].id)
-
-    winner_ids = []
-    advancing_players = [p for p in players if p.id in advancing_ids]
-
-    if game.fast_line_tiebreaker_winner_podium is not None:
-        winner_player = next(
-            (p for p in advancing_players if p.podium_number == game.fast_line_tiebreaker_winner_podium), None)
-        if winner_player:
-            winner_ids.append(winner_player.id)
-    else:
-        max_fast_line_total = -1
-        for p in advancing_players:
-            p.fast_line_total = p.round_total + (p.fast_line_score or 0)
-            if p.fast_line_total > max_fast_line_total:
-                max_fast_line_total = p.fast_line_total
+    bounds = queryset.aggregate(first=Min('game_id'), last=Max('game_id'))
+    if bounds['first'] is None:
+        return
+    for window_start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+        rows = queryset.filter(game_id__gte=window_start, game_id__lt=window_start + chunk_size).order_by(
+            'game_id', 'podium_number').values_list(*PLAYER_ROW_FIELDS).iterator(chunk_size=chunk_size)
+        yield from _group_rows(rows)
 
-        if max_fast_line_total >= 0:
-            winner_ids = [p.id for p in advancing_players if p.fast_line_total == max_fast_line_total]
 
-    return advancing_ids, winner_ids
+def _empty_totals():
+    """
+    The per-game pass's outputs (see archives/stats_accumulators.py) for no games.
+    """
+    return finalize_states(init_states())
 
 
-def update_statistics_cache():
+def _accumulate_games(games):
     """
-    Performs all statistics calculations and saves the result to the cache.
+    Walks the given GameRows (see _stream_games) once and returns their totals.
     """
-    latest_game = Game.objects.order_by('-id').first()
-    if not latest_game:
-        StatisticsCache.objects.all().delete()
-        return
+    return finalize_states(accumulate(games))
 
-    all_players = Player.objects.select_related('game').all()
-    all_games = Game.objects.prefetch_related('players').all()
-    all_games_count = all_games.count()
 
-    # --- Turn Order Performance Logic ---
-    turn_stats = {i: {'attempts': 0, 'correct': 0} for i in range(1, 5)}
-    turn_order_map = {
-        1: {1: 1, 2: 2, 3: 3, 4: 4}, 2: {1: 4, 2: 1, 3: 2, 4: 3},
-        3: {1: 3, 2: 4, 3: 1, 4: 2}, 4: {1: 2, 2: 3, 3: 4, 4: 1},
-    }
-    for player in all_players:
-        podium = player.podium_number
-        round_results = [player.round1_correct, player.round2_correct, player.round3_correct, player.round4_correct]
-        for i, is_correct in enumerate(round_results):
-            if is_correct is not None:
-                turn = turn_order_map[i + 1][podium]
-                turn_stats[turn]['attempts'] += 1
-                if is_correct: turn_stats[turn]['correct'] += 1
-    turn_performance = [{'turn': t, 'pct': (d['correct'] / d['attempts'] * 100) if d['attempts'] > 0 else 0} for t, d in
-                        turn_stats.items()]
+def _accumulate_game_range(id_range):
+    """
+    Worker entry point: the accumulator states for the games whose ids fall in [first_id,
+    last_id], read from the database alias the parent process would have used.
+    """
+    if not apps.ready:  # spawned (not forked) worker processes start without Django set up
+        django.setup()
+    first_id, last_id, alias = id_range
+    try:
+        return accumulate(_stream_games(
+            Player.objects.using(alias).filter(game_id__gte=first_id, game_id__lte=last_id),
+            settings.STATS_CHUNK_SIZE))
+    finally:
+        connections.close_all()
+
+
+def _accumulate_parallel(workers, shards_per_worker=4):
+    """
+    Shards the archive by game id range across a process pool, merges the shards' accumulator
+    states and returns the totals.
+    """
+    bounds = Game.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return _empty_totals()
+    shard_count = workers * shards_per_worker
+    span = bounds['last'] - bounds['first'] + 1
+    step = -(-span // shard_count)
+    alias = router.db_for_read(Game) or 'default'
+    id_ranges = [(start, min(start + step - 1, bounds['last']), alias)
+                 for start in range(bounds['first'], bounds['last'] + 1, step)]
+
+    # Children must open their own connections rather than inherit the parent's socket
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        states = reduce(merge_states, executor.map(_accumulate_game_range, id_ranges), init_states())
+    return finalize_states(states)
+
+
+def _color_code_dist(dist_list):
+    if not dist_list or not any(
+        s.get('count', 0) > 0 or s.get('total', 0) > 0 or s.get('total_players', 0) > 0 for s in dist_list): return
+    values = [s['pct'] for s in dist_list]
+    min_val, max_val = min(values), max(values)
+    if min_val == max_val:
+        for stat in dist_list: stat['pct_color'] = 'yellow'
+    else:
+        for stat in dist_list:
+            if stat['pct'] == max_val:
+                stat['pct_color'] = 'green'
+            elif stat['pct'] == min_val:
+                stat['pct_color'] = 'red'
+            else:
+                stat['pct_color'] = 'yellow'
 
-    # --- Distribution & Comeback Logic ---
-    prelim_dist_counts = {i: 0 for i in range(5)}
-    player_prelim_correct_counts = {i: 0 for i in range(5)}
-    player_advancement_by_correct_count = {i: {'advanced': 0, 'total': 0} for i in range(5)}
-    total_prelim_rounds = 0
-    come_from_behind_victories = []
-    total_fast_line_games = 0
-    for game in all_games:
-        players = list(game.players.all())
-        if not players: continue
-        advancing_ids, winner_ids = _calculate_game_outcomes(game)
-        for p in players:
-            correct_total = sum(
-                1 for r in [p.round1_correct, p.round2_correct, p.round3_correct, p.round4_correct] if r is True)
-            player_prelim_correct_counts[correct_total] += 1
-            player_advancement_by_correct_count[correct_total]['total'] += 1
-            if p.id in advancing_ids: player_advancement_by_correct_count[correct_total]['advanced'] += 1
-        for i in range(1, 5):
-            round_correct_field = f'round{i}_correct'
-            if any(getattr(p, round_correct_field) is not None for p in players):
-                correct_count = sum(1 for p in players if getattr(p, round_correct_field) is True)
-                prelim_dist_counts[correct_count] += 1
-                total_prelim_rounds += 1
-        advancing_players = [p for p in players if p.id in advancing_ids]
-        if len(advancing_players) == 2:
-            total_fast_line_games += 1
-            p1, p2 = advancing_players[0], advancing_players[1]
-            p1.round_total = p1.round1_score + p1.round2_score + p1.round3_score + p1.round4_score
-            p2.round_total = p2.round1_score + p2.round2_score + p2.round3_score + p2.round4_score
-
-            if p1.round_total < p2.round_total and p1.id in winner_ids:
-                come_from_behind_victories.append({'player': p1, 'diff': p2.round_total - p1.round_total})
-            elif p2.round_total < p1.round_total and p2.id in winner_ids:
-                come_from_behind_victories.append({'player': p2, 'diff': p1.round_total - p2.round_total})
-
-    def color_code_dist(dist_list):
-        if not dist_list or not any(
-            s.get('count', 0) > 0 or s.get('total', 0) > 0 or s.get('total_players', 0) > 0 for s in dist_list): return
-        values = [s['pct'] for s in dist_list]
+
+def _color_code_intervals(stats, key):
+    """
+    Colors a column by its confidence intervals (key + '_ci'), if the rows have them: green where
+    a row's interval lies wholly above another row's and below none, red the reverse, yellow
+    where the differences could be noise. Returns whether it did.
+    """
+    if not stats or not all(s.get(key + '_ci') for s in stats):
+        return False
+    for stat in stats:
+        low, high = stat[key + '_ci']
+        above = any(low > other[key + '_ci'][1] for other in stats)
+        below = any(high < other[key + '_ci'][0] for other in stats)
+        stat[key + '_color'] = 'green' if above and not below else 'red' if below and not above else 'yellow'
+    return True
+
+
+def _attach_intervals(stats, row_key, intervals):
+    """
+    Adds each row's confidence intervals, {row: {column: [low, high]}}, as column + '_ci'.
+    """
+    for stat in stats:
+        for column, interval in intervals.get(stat[row_key], {}).items():
+            stat[column + '_ci'] = interval
+
+
+def _color_code_columns(stats, keys):
+    """
+    Colors each of the given columns across the rows: highest green, lowest red, the rest yellow,
+    or by confidence intervals where the rows have them (_color_code_intervals).
+    """
+    for key in keys:
+        if _color_code_intervals(stats, key):
+            continue
+        values = [s[key] for s in stats]
         min_val, max_val = min(values), max(values)
         if min_val == max_val:
-            for stat in dist_list: stat['pct_color'] = 'yellow'
-        else:
-            for stat in dist_list:
-                if stat['pct'] == max_val:
-                    stat['pct_color'] = 'green'
-                elif stat['pct'] == min_val:
-                    stat['pct_color'] = 'red'
-                else:
-                    stat['pct_color'] = 'yellow'
-
-    all_players_count = all_players.count()
+            for stat in stats: stat[key + '_color'] = 'yellow'
+            continue
+        for stat in stats:
+            if stat[key] == max_val:
+                stat[key + '_color'] = 'green'
+            elif stat[key] == min_val:
+                stat[key + '_color'] = 'red'
+            else:
+                stat[key + '_color'] = 'yellow'
+
+
+def statistics_sections(counts):
+    """
+    The statistics page sections that follow from counts alone: the per-game totals (see
+    _empty_totals) plus games, turn_stats, prelim_dist_counts, podium_rounds ({podium:
+    {'total_players', 'correct': {round: n}}}), avg_score_by_podium, fast_line_correct_counts,
+    fast_line_incorrect_counts, avg_fast_line, and final_round_counts. The outputs of stored
+    accumulators in counts are passed through as they are. Shared by the rebuild and the
+    statistics history (archives/stats_history.py).
+    """
+    all_games_count = counts['games']
+    # Bootstrap intervals for the podium and turn order sections, see archives/stats_bootstrap.py
+    intervals = counts.get('confidence_intervals') or {}
+
+    # --- Turn Order ---
+    turn_performance = [{'turn': t, 'pct': (d['correct'] / d['attempts'] * 100) if d['attempts'] > 0 else 0} for t, d in
+                        counts['turn_stats'].items()]
+    _attach_intervals(turn_performance, 'turn', intervals.get('turn_performance', {}))
+    _color_code_intervals(turn_performance, 'pct')
+
+    # --- Distributions ---
+    all_players_count = counts['total_players']
     player_prelim_dist = [
         {'correct_count': i, 'count': c, 'pct': (c / all_players_count * 100) if all_players_count > 0 else 0} for i, c
-        in player_prelim_correct_counts.items()]
-    color_code_dist(player_prelim_dist)
+        in counts['player_prelim_correct_counts'].items()]
+    _color_code_dist(player_prelim_dist)
     player_advancement_dist = [{'correct_count': i, 'advanced_count': d['advanced'], 'total_players': d['total'],
                                 'pct': (d['advanced'] / d['total'] * 100) if d['total'] > 0 else 0} for i, d in
-                               player_advancement_by_correct_count.items()]
-    color_code_dist(player_advancement_dist)
+                               counts['player_advancement_by_correct_count'].items()]
+    _color_code_dist(player_advancement_dist)
+    total_prelim_rounds = sum(counts['prelim_dist_counts'].values())
     preliminary_round_dist = [
         {'correct_count': i, 'count': c, 'pct': (c / total_prelim_rounds * 100) if total_prelim_rounds > 0 else 0} for
-        i, c in prelim_dist_counts.items()]
-    color_code_dist(preliminary_round_dist)
+        i, c in counts['prelim_dist_counts'].items()]
+    _color_code_dist(preliminary_round_dist)
 
     # --- Come From Behind Stats ---
-    top_comebacks = sorted(come_from_behind_victories, key=lambda x: x['diff'], reverse=True)[:5]
+    comeback_count = counts['comeback_count']
+    total_fast_line_games = counts['total_fast_line_games']
     come_from_behind_stats = {
-        'count': len(come_from_behind_victories),
-        'pct': (len(come_from_behind_victories) / total_fast_line_games * 100) if total_fast_line_games > 0 else 0,
-        'avg_diff': sum(v['diff'] for v in come_from_behind_victories) / len(
-            come_from_behind_victories) if come_from_behind_victories else 0,
-        'max_diff': max(v['diff'] for v in come_from_behind_victories) if come_from_behind_victories else 0
+        'count': comeback_count,
+        'pct': (comeback_count / total_fast_line_games * 100) if total_fast_line_games > 0 else 0,
+        'avg_diff': counts['comeback_diff_sum'] / comeback_count if comeback_count else 0,
+        'max_diff': counts['comeback_max_diff']
     }
 
     # --- Podium Performance ---
-    podium_stats_query = Player.objects.values('podium_number').annotate(total_players=Count('id'),
-                                                                         r1_correct=Count('id', filter=Q(
-                                                                             round1_correct=True)),
-                                                                         r2_correct=Count('id', filter=Q(
-                                                                             round2_correct=True)),
-                                                                         r3_correct=Count('id', filter=Q(
-                                                                             round3_correct=True)),
-                                                                         r4_correct=Count('id', filter=Q(
-                                                                             round4_correct=True))).order_by(
-        'podium_number')
+    podium_rounds = counts['podium_rounds']
     podium_stats = []
     for i in range(1, 5):
-        data = next((item for item in podium_stats_query if item['podium_number'] == i), None)
+        data = podium_rounds.get(i)
         if not data or data['total_players'] == 0:
             podium_stats.append(
                 {'podium': i, 'round1_pct': 0, 'round2_pct': 0, 'round3_pct': 0, 'round4_pct': 0, 'avg_correct': 0})
             continue
 
         total_players = data['total_players']
-        total_correct = data['r1_correct'] + data['r2_correct'] + data['r3_correct'] + data['r4_correct']
-        avg_correct = (total_correct / total_players) if total_players > 0 else 0
-
+        correct = data['correct']
         podium_stats.append({
             'podium': i,
-            'round1_pct': (data['r1_correct'] / total_players) * 100,
-            'round2_pct': (data['r2_correct'] / total_players) * 100,
-            'round3_pct': (data['r3_correct'] / total_players) * 100,
-            'round4_pct': (data['r4_correct'] / total_players) * 100,
-            'avg_correct': avg_correct
+            'round1_pct': (correct[1] / total_players) * 100,
+            'round2_pct': (correct[2] / total_players) * 100,
+            'round3_pct': (correct[3] / total_players) * 100,
+            'round4_pct': (correct[4] / total_players) * 100,
+            'avg_correct': (correct[1] + correct[2] + correct[3] + correct[4]) / total_players
         })
-
-    if podium_stats:
-        keys_to_color = ['round1_pct', 'round2_pct', 'round3_pct', 'round4_pct', 'avg_correct']
-        for key in keys_to_color:
-            values = [s[key] for s in podium_stats]
-            min_val, max_val = min(values), max(values)
-            if min_val == max_val:
-                for stat in podium_stats: stat[key + '_color'] = 'yellow'
-                continue
-            for stat in podium_stats:
-                if stat[key] == max_val:
-                    stat[key + '_color'] = 'green'
-                elif stat[key] == min_val:
-                    stat[key + '_color'] = 'red'
-                else:
-                    stat[key + '_color'] = 'yellow'
+    _attach_intervals(podium_stats, 'podium', intervals.get('podium_stats', {}))
+    _color_code_columns(podium_stats, ['round1_pct', 'round2_pct', 'round3_pct', 'round4_pct', 'avg_correct'])
 
     # --- Aggregate Podium Performance Logic ---
     aggregate_stats = None
     if all_games_count > 0:
-        total_r1_correct = sum(s['r1_correct'] for s in podium_stats_query)
-        total_r2_correct = sum(s['r2_correct'] for s in podium_stats_query)
-        total_r3_correct = sum(s['r3_correct'] for s in podium_stats_query)
-        total_r4_correct = sum(s['r4_correct'] for s in podium_stats_query)
-        total_correct_answers = total_r1_correct + total_r2_correct + total_r3_correct + total_r4_correct
-
+        round_correct = [sum(d['correct'][r] for d in podium_rounds.values()) for r in range(1, 5)]
         aggregate_stats = {
-            'avg_r1': total_r1_correct / all_games_count,
-            'avg_r2': total_r2_correct / all_games_count,
-            'avg_r3': total_r3_correct / all_games_count,
-            'avg_r4': total_r4_correct / all_games_count,
-            'avg_total': total_correct_answers / all_games_count
+            'avg_r1': round_correct[0] / all_games_count,
+            'avg_r2': round_correct[1] / all_games_count,
+            'avg_r3': round_correct[2] / all_games_count,
+            'avg_r4': round_correct[3] / all_games_count,
+            'avg_total': sum(round_correct) / all_games_count
         }
 
     # --- Advancement Stats Logic ---
-    advancement_stats_raw = {i: {'total': 0, 'advanced': 0, 'won': 0} for i in range(1, 5)}
-    for game in all_games:
-        advancing_ids, winner_ids = _calculate_game_outcomes(game)
-        for p in game.players.all():
-            podium = p.podium_number
-            advancement_stats_raw[podium]['total'] += 1
-            if p.id in advancing_ids: advancement_stats_raw[podium]['advanced'] += 1
-            if p.id in winner_ids: advancement_stats_raw[podium]['won'] += 1
-
-    avg_scores_by_podium = Player.objects.annotate(
-        round_total=F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score')).values(
-        'podium_number').annotate(avg_score=Avg('round_total'))
-    avg_score_map = {item['podium_number']: item['avg_score'] for item in avg_scores_by_podium}
+    avg_score_map = counts['avg_score_by_podium']
     advancement_stats = []
-    for podium, data in advancement_stats_raw.items():
+    for podium, data in counts['advancement_stats_raw'].items():
         total = data['total']
         advancement_stats.append({
             'podium': podium, 'advanced_count': data['advanced'],
@@ -244,29 +271,155 @@ def update_statistics_cache():
             'won_count': data['won'], 'won_pct': (data['won'] / total * 100) if total > 0 else 0,
             'avg_score': avg_score_map.get(podium, 0) or 0
         })
+    _attach_intervals(advancement_stats, 'podium', intervals.get('advancement_stats', {}))
+    _color_code_columns(advancement_stats, ['avg_score', 'won_pct'])
+    sorted_by_adv_pct = sorted(advancement_stats, key=lambda x: x['advanced_pct'], reverse=True)
+    # Without intervals: the two podiums that advance most often green, the other two red
+    if not _color_code_intervals(advancement_stats, 'advanced_pct') and len(sorted_by_adv_pct) == 4:
+        podium_color_map = {
+            sorted_by_adv_pct[0]['podium']: 'green', sorted_by_adv_pct[1]['podium']: 'green',
+            sorted_by_adv_pct[2]['podium']: 'red', sorted_by_adv_pct[3]['podium']: 'red',
+        }
+        for stat in advancement_stats: stat['advanced_pct_color'] = podium_color_map.get(stat['podium'], 'gray')
+
+    # --- Fast Line ---
+    avg_fast_line = counts['avg_fast_line']
+
+    # --- Final Round Performance ---
+    final_round_counts = counts['final_round_counts']
+    total_final_round_players = sum(final_round_counts.values())
+    final_round_stats = []
+    for i in range(6):
+        count = final_round_counts.get(i, 0)
+        final_round_stats.append({'correct_count': i, 'count': count, 'pct': (
+                    count / total_final_round_players * 100) if total_final_round_players > 0 else 0})
+    _color_code_dist(final_round_stats)
+
+    sections = {
+        'podium_stats': podium_stats,
+        'aggregate_stats': aggregate_stats,
+        'advancement_stats': advancement_stats,
+        'turn_performance': turn_performance,
+        'preliminary_round_dist': preliminary_round_dist,
+        'player_prelim_dist': player_prelim_dist,
+        'player_advancement_dist': player_advancement_dist,
+        'chart_labels': list(range(13)),
+        'correct_data': [counts['fast_line_correct_counts'].get(i, 0) for i in range(13)],
+        'incorrect_data': [counts['fast_line_incorrect_counts'].get(i, 0) for i in range(13)],
+        'avg_stats': {'avg_correct': avg_fast_line['avg_correct'], 'avg_incorrect': avg_fast_line['avg_incorrect']},
+        'final_round_stats': final_round_stats,
+        'come_from_behind_stats': come_from_behind_stats,
+    }
+    sections.update({key: counts[key] for key in stored_keys() if key in counts})
+    return sections
+
+
+@use_replica()
+def serialize_players(players):
+    """
+    Serializes Player objects (with round_total, fast_line_total and page_number set where a list
+    has them) to dicts for JSON.
+    """
+    return [{'id': p.id, 'name': p.name, 'podium_number': p.podium_number,
+             'game': {'id': p.game.id, 'air_date': p.game.air_date.isoformat()},
+             'fast_line_total': getattr(p, 'fast_line_total', None), 'total_winnings': p.total_winnings,
+             'final_round_correct_count': p.final_round_correct_count,
+             'fast_line_correct_count': p.fast_line_correct_count,
+             'fast_line_incorrect_count': p.fast_line_incorrect_count,
+             'round_total': getattr(p, 'round_total', None), 'page_number': p.page_number} for p in players]
+
+
+def statistics_data(latest_game_id, sections, top_fast_line_players, top_fast_line_scores, leaderboard_data,
+                    podium_leaderboards, top_comebacks):
+    """
+    The statistics as cached: statistics_sections() output plus the serialized top lists. Also
+    the shape of stats_history.StatsHistory.statistics_through().
+    """
+    context_data = {
+        'latest_game_id': latest_game_id,
+        'podium_stats': sections['podium_stats'],
+        'advancement_stats': sections['advancement_stats'],
+        'turn_performance': sections['turn_performance'],
+        'preliminary_round_dist': sections['preliminary_round_dist'],
+        'player_prelim_dist': sections['player_prelim_dist'],
+        'player_advancement_dist': sections['player_advancement_dist'],
+        'chart_labels': sections['chart_labels'],
+        'correct_data': sections['correct_data'],
+        'incorrect_data': sections['incorrect_data'],
+        'avg_stats': sections['avg_stats'],
+        'top_fast_line_players': serialize_players(top_fast_line_players),
+        'final_round_stats': sections['final_round_stats'],
+        'top_fast_line_scores': serialize_players(top_fast_line_scores),
+        'leaderboard_data': serialize_players(leaderboard_data),
+        'podium_leaderboards': [{'podium_number': pl['podium_number'], 'players': serialize_players(pl['players'])}
+                                for pl in podium_leaderboards],
+        'aggregate_stats': sections['aggregate_stats'],
+        'come_from_behind_stats': sections['come_from_behind_stats'],
+        'top_comebacks': [{'player': serialize_players([c['player']])[0], 'diff': c['diff']} for c in
+                          top_comebacks],
+    }
+    context_data.update({key: sections[key] for key in stored_keys() if key in sections})
+    return context_data
+
+
+def update_statistics_cache(save=True, profiler=None, workers=1):
+    """
+    Performs all statistics calculations and saves the result to the cache.
+    With save=False nothing is written and the computed data is only returned. A
+    SectionProfiler, if given, is marked at the end of each section. With workers > 1
+    the per-game pass is sharded across that many processes. Reads go to the replica
+    when one is configured, unless this request already wrote (e.g. game_entry_api).
+    """
+    mark = profiler.mark if profiler else lambda name: None
+
+    latest_game = Game.objects.order_by('-id').first()
+    if not latest_game:
+        if save:
+            StatisticsCache.objects.all().delete()
+        return None
+
+    all_games_count = Game.objects.count()
+    mark('setup')
 
-    if advancement_stats:
-        for key in ['avg_score', 'won_pct']:
-            values = [s[key] for s in advancement_stats]
-            min_val, max_val = min(values), max(values)
-            if min_val == max_val:
-                for stat in advancement_stats: stat[key + '_color'] = 'yellow'
-                continue
-            for stat in advancement_stats:
-                if stat[key] == max_val:
-                    stat[key + '_color'] = 'green'
-                elif stat[key] == min_val:
-                    stat[key + '_color'] = 'red'
-                else:
-                    stat[key + '_color'] = 'yellow'
-
-        sorted_by_adv_pct = sorted(advancement_stats, key=lambda x: x['advanced_pct'], reverse=True)
-        if len(sorted_by_adv_pct) == 4:
-            podium_color_map = {
-                sorted_by_adv_pct[0]['podium']: 'green', sorted_by_adv_pct[1]['podium']: 'green',
-                sorted_by_adv_pct[2]['podium']: 'red', sorted_by_adv_pct[3]['podium']: 'red',
-            }
-            for stat in advancement_stats: stat['advanced_pct_color'] = podium_color_map.get(stat['podium'], 'gray')
+    # --- Per-Game Pass: every registered accumulator (player distributions, advancement, comebacks) ---
+    if workers > 1 and not connection.in_atomic_block:
+        totals = _accumulate_parallel(workers)
+    else:
+        totals = _accumulate_games(_stream_games(Player.objects.all(), settings.STATS_CHUNK_SIZE))
+    mark('game_pass')
+
+    # --- Turn Order & Round Distribution: grouped straight from PlayerRound ---
+    turn_stats = {i: {'attempts': 0, 'correct': 0} for i in range(1, 5)}
+    for row in PlayerRound.objects.filter(correct__isnull=False).values('turn_position').annotate(
+            attempts=Count('id'), correct_count=Count('id', filter=Q(correct=True))).order_by():
+        turn_stats[row['turn_position']] = {'attempts': row['attempts'], 'correct': row['correct_count']}
+
+    # Number of players correct in each played round of each game, tallied into a histogram
+    round_correct_counts = PlayerRound.objects.filter(correct__isnull=False).values(
+        'game_id', 'round_number').annotate(correct_count=Count('id', filter=Q(correct=True))).order_by()
+    prelim_dist_counts = {i: 0 for i in range(5)}
+    prelim_dist_counts.update(Counter(round_correct_counts.values_list('correct_count', flat=True).iterator(
+        chunk_size=settings.STATS_CHUNK_SIZE)))
+    mark('rounds')
+
+    # --- Podium Performance ---
+    # One row per (podium, round); every player has all four rounds, so round 1 counts the players
+    podium_rounds = {}
+    for row in PlayerRound.objects.values('podium_number', 'round_number').annotate(
+            players=Count('id'), correct_count=Count('id', filter=Q(correct=True))).order_by():
+        data = podium_rounds.setdefault(row['podium_number'],
+                                        {'total_players': 0, 'correct': {r: 0 for r in range(1, 5)}})
+        if row['round_number'] == 1:
+            data['total_players'] = row['players']
+        data['correct'][row['round_number']] = row['correct_count']
+    mark('podium')
+
+    # --- Advancement Stats Logic ---
+    avg_scores_by_podium = Player.objects.annotate(
+        round_total=F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score')).values(
+        'podium_number').annotate(avg_score=Avg('round_total'))
+    avg_score_map = {item['podium_number']: item['avg_score'] for item in avg_scores_by_podium}
+    mark('advancement')
 
     # --- Fast Line & Leaderboards ---
     correct_counts = dict(
@@ -274,91 +427,99 @@ def update_statistics_cache():
             count=Count('id')))
     incorrect_counts = dict(Player.objects.filter(fast_line_incorrect_count__isnull=False).values_list(
         'fast_line_incorrect_count').annotate(count=Count('id')))
-    chart_labels = list(range(13))
-    correct_data = [correct_counts.get(i, 0) for i in range(13)]
-    incorrect_data = [incorrect_counts.get(i, 0) for i in range(13)]
     avg_stats = Player.objects.aggregate(avg_correct=Avg('fast_line_correct_count'),
                                          avg_incorrect=Avg('fast_line_incorrect_count'))
-    top_fast_line_players = Player.objects.select_related('game').filter(
-        fast_line_correct_count__isnull=False).order_by('-fast_line_correct_count', 'fast_line_incorrect_count')[:5]
-    top_fast_line_scores = Player.objects.annotate(
-        round_total=Sum(F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score'))).annotate(
-        fast_line_total=F('round_total') + (F('fast_line_score') or 0)).filter(
-        fast_line_score__isnull=False).select_related('game').order_by('-fast_line_total')[:20]
-    leaderboard_data = Player.objects.annotate(
-        round_total=Sum(F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score'))).annotate(
-        fast_line_total=F('round_total') + (F('fast_line_score') or 0)).select_related('game').order_by(
-        '-total_winnings', '-fast_line_total')[:20]
-
-    all_game_ids = list(Game.objects.values_list('id', flat=True).order_by('-air_date', '-episode_number'))
-    leaderboard_players = list(top_fast_line_players) + list(top_fast_line_scores) + list(leaderboard_data) + [
-        v['player'] for v in top_comebacks]
-    game_ids_to_map = {p.game_id for p in leaderboard_players if hasattr(p, 'game_id')}
-    game_page_map = {game_id: (all_game_ids.index(game_id) // 5) + 1 for game_id in game_ids_to_map if
-                     game_id in all_game_ids}
-    for p in leaderboard_players:
-        if hasattr(p, 'game_id'): p.page_number = game_page_map.get(p.game_id)
+    top_fast_line_players = list(Player.objects.select_related('game').filter(
+        fast_line_correct_count__isnull=False).order_by('-fast_line_correct_count', 'fast_line_incorrect_count')[:5])
+    mark('fast_line')
 
     # --- Final Round Performance ---
     final_round_counts = dict(Player.objects.filter(final_round_correct_count__isnull=False).values_list(
         'final_round_correct_count').annotate(count=Count('id')))
-    total_final_round_players = sum(final_round_counts.values())
-    final_round_stats = []
-    for i in range(6):
-        count = final_round_counts.get(i, 0)
-        final_round_stats.append({'correct_count': i, 'count': count, 'pct': (
-                    count / total_final_round_players * 100) if total_final_round_players > 0 else 0})
-    color_code_dist(final_round_stats)
+    mark('final_round')
+
+    sections = statistics_sections(dict(
+        totals, games=all_games_count, turn_stats=turn_stats, prelim_dist_counts=prelim_dist_counts,
+        podium_rounds=podium_rounds, avg_score_by_podium=avg_score_map, fast_line_correct_counts=correct_counts,
+        fast_line_incorrect_counts=incorrect_counts, avg_fast_line=avg_stats, final_round_counts=final_round_counts))
+
+    # --- Come From Behind Stats ---
+    top_comeback_players = Player.objects.select_related('game').in_bulk(
+        [c['player_id'] for c in totals['top_comebacks']])
+    top_comebacks = []
+    for c in totals['top_comebacks']:
+        player = top_comeback_players[c['player_id']]
+        player.round_total = c['round_total']
+        if c['fast_line_total'] is not None:
+            player.fast_line_total = c['fast_line_total']
+        top_comebacks.append({'player': player, 'diff': c['diff']})
+    mark('distributions')
+
+    top_fast_line_scores = list(Player.objects.annotate(
+        round_total=Sum(F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score'))).annotate(
+        fast_line_total=F('round_total') + (F('fast_line_score') or 0)).filter(
+        fast_line_score__isnull=False).select_related('game').order_by('-fast_line_total')[:20])
+    leaderboard_data = list(Player.objects.annotate(
+        round_total=Sum(F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score'))).annotate(
+        fast_line_total=F('round_total') + (F('fast_line_score') or 0)).select_related('game').order_by(
+        '-total_winnings', '-fast_line_total')[:20])
+    mark('leaderboards')
 
     # --- Top Podium Scores ---
     podium_leaderboards = []
     for i in range(1, 5):
-        top_players = Player.objects.filter(podium_number=i).annotate(round_total=Sum(
+        top_players = list(Player.objects.filter(podium_number=i).annotate(round_total=Sum(
             F('round1_score') + F('round2_score') + F('round3_score') + F('round4_score'))).select_related(
-            'game').order_by('-round_total')[:10]
-        for p in top_players: p.page_number = game_page_map.get(p.game_id)
+            'game').order_by('-round_total')[:10])
         podium_leaderboards.append({'podium_number': i, 'players': top_players})
+    mark('podium_leaderboards')
 
-    # Serialize Player objects to dicts for JSON
-    def serialize_player_list(players):
-        return [{'id': p.id, 'name': p.name, 'podium_number': p.podium_number,
-                 'game': {'id': p.game.id, 'air_date': p.game.air_date.isoformat()},
-                 'fast_line_total': getattr(p, 'fast_line_total', None), 'total_winnings': p.total_winnings,
-                 'final_round_correct_count': p.final_round_correct_count,
-                 'fast_line_correct_count': p.fast_line_correct_count,
-                 'fast_line_incorrect_count': p.fast_line_incorrect_count,
-                 'round_total': getattr(p, 'round_total', None), 'page_number': p.page_number} for p in players]
+    leaderboard_players = list(top_fast_line_players) + list(top_fast_line_scores) + list(leaderboard_data) + [
+        v['player'] for v in top_comebacks] + [p for pl in podium_leaderboards for p in pl['players']]
+    game_ids_to_map = {p.game_id for p in leaderboard_players if hasattr(p, 'game_id')}
+    # Walk the archive order without holding it; stop once every wanted game has been seen
+    game_page_map = {}
+    all_game_ids = Game.objects.values_list('id', flat=True).order_by('-air_date', '-episode_number')
+    for position, game_id in enumerate(all_game_ids.iterator(chunk_size=settings.STATS_CHUNK_SIZE)):
+        if game_id in game_ids_to_map:
+            game_page_map[game_id] = position // 5 + 1
+            if len(game_page_map) == len(game_ids_to_map):
+                break
+    for p in leaderboard_players:
+        if hasattr(p, 'game_id'): p.page_number = game_page_map.get(p.game_id)
+    mark('page_mapping')
 
     # --- Final Context ---
-    context_data = {
-        'latest_game_id': latest_game.id,
-        'podium_stats': podium_stats,
-        'advancement_stats': advancement_stats,
-        'turn_performance': turn_performance,
-        'preliminary_round_dist': preliminary_round_dist,
-        'player_prelim_dist': player_prelim_dist,
-        'player_advancement_dist': player_advancement_dist,
-        'chart_labels': chart_labels,
-        'correct_data': correct_data,
-        'incorrect_data': incorrect_data,
-        'avg_stats': {
-            'avg_correct': avg_stats['avg_correct'],
-            'avg_incorrect': avg_stats['avg_incorrect']
-        },
-        'top_fast_line_players': serialize_player_list(top_fast_line_players),
-        'final_round_stats': final_round_stats,
-        'top_fast_line_scores': serialize_player_list(top_fast_line_scores),
-        'leaderboard_data': serialize_player_list(leaderboard_data),
-        'podium_leaderboards': [{'podium_number': pl['podium_number'], 'players': serialize_player_list(pl['players'])}
-                                for pl in podium_leaderboards],
-        'aggregate_stats': aggregate_stats,
-        'come_from_behind_stats': come_from_behind_stats,
-        'top_comebacks': [{'player': serialize_player_list([c['player']])[0], 'diff': c['diff']} for c in
-                          top_comebacks],
-    }
-
-    StatisticsCache.objects.create(
-        through_game=latest_game,
-        data=context_data
-    )
+    context_data = statistics_data(latest_game.id, sections, top_fast_line_players, top_fast_line_scores,
+                                   leaderboard_data, podium_leaderboards, top_comebacks)
+
+    mark('serialization')
+
+    if save:
+        # The fragments render straight from the model instances, so no rehydration is needed
+        fragments = render_fragments(dict(
+            context_data, latest_game=latest_game, top_fast_line_players=top_fast_line_players,
+            top_fast_line_scores=top_fast_line_scores, leaderboard_data=leaderboard_data,
+            podium_leaderboards=podium_leaderboards, top_comebacks=top_comebacks))
+        mark('fragments')
+        previous = newest_row()
+        stored, intervals = split_intervals(context_data)
+        cache = StatisticsCache.objects.create(
+            through_game=latest_game,
+            fragments=fragments,
+            intervals=intervals,
+            **version_fields(stored, settings.STATS_CACHE_ENCODING, previous)
+        )
+        if previous is not None:
+            # Only the newest row's fragments are served
+            StatisticsCache.objects.filter(pk=previous.pk).update(fragments={})
+        mark('save')
+        try:
+            publish_snapshot(cache.id)
+        except Exception:
+            # The statistics are saved either way; with the file left at the old version, each
+            # worker builds the new snapshot from the database instead
+            logger.exception('Publishing the archive snapshot for statistics cache %s failed', cache.id)
+        mark('snapshot')
+    return context_data
 
@@ -0,0 +1,164 @@
+"""
+StatisticsCache history as keyframes and deltas.
+
+Every rebuild adds a StatisticsCache row, and consecutive rows differ only where the new game
+moved a number or a leaderboard. So a new row is stored as a delta against the newest one (a
+version 3 row: the diff_payload() operations in the usual containers, see stats_payload), and
+every STATS_CACHE_KEYFRAME_INTERVAL rows as a full version 2 keyframe. History then grows with
+the amount of change rather than by a full document per game, and reading any row takes one
+query for its chain (the keyframe plus the deltas after it) and at most interval - 1 patches.
+
+Deleting a row that others build on first turns its dependents into keyframes (the pre_delete
+receiver in signals.py), and `manage.py compact_stats_cache` re-encodes existing history.
+
+The bootstrap confidence intervals (stats_bootstrap) shift with every game, and would be most of
+each delta, so they are stored beside the payload in the row's intervals field instead, a few
+hundred bytes per row (split_intervals, load_stats).
+"""
+from .models import StatisticsCache
+from .stats_payload import (DELTA_VERSION, PAYLOAD_VERSION, align_players, decode_payload, diff_payload,
+                            encode_payload, patch_payload, payload_fields, stored_payload)
+from django.conf import settings
+from django.db import router
+from django.db.models import Q
+import json
+
+CHAIN_FIELDS = ('id', 'format_version', 'encoding', 'data', 'payload', 'base', 'keyframe')
+
+
+def _stored(row):
+    return stored_payload(row.encoding, row.data, row.payload)
+
+
+def _chain(row):
+    """
+    The rows row's chain is stored in, by id: one query, on the row's own database.
+    """
+    rows = StatisticsCache.objects.using(row._state.db).filter(
+        Q(pk=row.keyframe_id) | Q(keyframe_id=row.keyframe_id, pk__lte=row.pk)).only(*CHAIN_FIELDS)
+    chain = {r.pk: r for r in rows}
+    chain[row.pk] = row
+    return chain
+
+
+def load_payload(row):
+    """
+    The version 2 payload of a version 2 or 3 row.
+    """
+    if row.format_version != DELTA_VERSION:
+        return _stored(row)
+    chain = _chain(row)
+    deltas = []
+    while row.format_version == DELTA_VERSION:
+        deltas.append(row)
+        row = chain.get(row.base_id)
+        if row is None:
+            raise ValueError(f'Statistics cache {deltas[0].pk} has a broken delta chain at {deltas[-1].pk}')
+    payload = _stored(row)
+    for delta in reversed(deltas):
+        payload = patch_payload(payload, _stored(delta))
+    return payload
+
+
+def load_stats(row):
+    """
+    The statistics of any row in their original (version 1) shape, with its intervals if it has them.
+    """
+    if row.format_version == 1:
+        return with_intervals(row.data, row.intervals)
+    return with_intervals(decode_payload(load_payload(row)), row.intervals)
+
+
+def split_intervals(data):
+    """
+    Version 1 data without its confidence intervals (the statistics rows' *_ci values), and those
+    intervals as {section: [{key: [low, high]} for each row]}.
+    """
+    stripped, intervals = dict(data), {}
+    for section, rows in data.items():
+        if not isinstance(rows, list) or not any(
+                isinstance(row, dict) and any(key.endswith('_ci') for key in row) for row in rows):
+            continue
+        stripped[section] = [{key: value for key, value in row.items() if not key.endswith('_ci')} for row in rows]
+        intervals[section] = [{key: value for key, value in row.items() if key.endswith('_ci')} for row in rows]
+    return stripped, intervals
+
+
+def with_intervals(data, intervals):
+    """
+    Puts split_intervals() intervals back into the rows of version 1 data.
+    """
+    if not intervals:
+        return data
+    data = dict(data)
+    for section, row_intervals in intervals.items():
+        data[section] = [dict(row, **row_intervals[i]) if i < len(row_intervals) else row
+                         for i, row in enumerate(data.get(section, []))]
+    return data
+
+
+def normalized(payload):
+    # Compare what a reader will get back, e.g. tuples as lists and dict keys as strings
+    return json.loads(json.dumps(payload))
+
+
+def version_fields(data, encoding, previous):
+    """
+    Model field values for a new row holding version 1 data, stored after previous (the newest
+    row, or None): a delta against it, or a keyframe when the chain is long enough.
+    """
+    return payload_version_fields(normalized(encode_payload(data)), encoding, previous)
+
+
+def payload_version_fields(payload, encoding, previous, previous_payload=None, interval=None, deltas=None):
+    """
+    version_fields() for a version 2 payload. A caller that already has them can pass the previous
+    row's payload and the number of deltas in its chain, and can override the keyframe interval.
+    A delta is taken against the payload with its players aligned to the previous row's
+    (align_players), which is then what the new row reads back as.
+    """
+    interval = settings.STATS_CACHE_KEYFRAME_INTERVAL if interval is None else interval
+    keyframe = dict(payload_fields(PAYLOAD_VERSION, payload, encoding), base=None, keyframe=None)
+    if previous is None or previous.format_version == 1 or interval <= 1:
+        return keyframe
+
+    keyframe_id = previous.keyframe_id or previous.pk
+    if deltas is None:
+        deltas = StatisticsCache.objects.using(previous._state.db).filter(keyframe_id=keyframe_id).count()
+    if deltas + 1 >= interval:
+        return keyframe
+    if previous_payload is None:
+        previous_payload = load_payload(previous)
+    ops = diff_payload(previous_payload, align_players(previous_payload, payload))
+    return dict(payload_fields(DELTA_VERSION, ops, encoding), base=previous, keyframe_id=keyframe_id)
+
+
+def newest_row():
+    """
+    The newest row, read from the primary: a delta must build on the row that really is newest.
+    """
+    return StatisticsCache.objects.db_manager(router.db_for_write(StatisticsCache)).only(
+        *CHAIN_FIELDS).order_by('-id').first()
+
+
+def detach_dependents(row):
+    """
+    Before row is deleted: each row stored as a delta against it becomes a keyframe, and the rows
+    further down that branch of the chain are re-pointed at it.
+    """
+    manager = StatisticsCache.objects.db_manager(row._state.db)
+    dependents = list(manager.filter(base=row).only(*CHAIN_FIELDS))
+    if not dependents:
+        return
+    # Re-read: deleting several rows at once can have detached this one since it was loaded
+    keyframe_id = manager.filter(pk=row.pk).values_list('keyframe', flat=True).get() or row.pk
+    chain = list(manager.filter(keyframe_id=keyframe_id).values_list('id', 'base_id'))
+    for dependent in dependents:
+        payload = load_payload(dependent)
+        descendants, frontier = set(), {dependent.pk}
+        while frontier:
+            frontier = {pk for pk, base_id in chain if base_id in frontier}
+            descendants |= frontier
+        manager.filter(pk__in=descendants).update(keyframe=dependent.pk)
+        manager.filter(pk=dependent.pk).update(
+            base=None, keyframe=None, **payload_fields(PAYLOAD_VERSION, payload, dependent.encoding))
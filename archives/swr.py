@@ -0,0 +1,139 @@
+"""
+Stale-while-revalidate with single-flight refreshes, for data that is slow to compute but fine
+to serve slightly out of date (the archive read model, the gameplay leaderboards).
+
+A value younger than its fresh TTL is served as is. Between the fresh and the stale TTL it is
+still served straight away, while one background thread recomputes it. Only older (or missing)
+values make a request wait, and concurrent requests then wait on the same computation rather
+than each starting one. If a refresh fails, the last good value keeps being served.
+"""
+from django.core.cache import cache
+from django.db import connections
+from concurrent.futures import Future
+from contextvars import copy_context
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_flights = {}
+_flights_lock = threading.Lock()
+# Last successfully computed value per cached() key in this process, the fallback when a
+# refresh fails after the cache entry expired
+_last_good = {}
+# Keys of run_coalesced_in_background() runs asked for again while in progress
+_reruns = set()
+
+
+def _run(key, future, compute, background):
+    try:
+        future.set_result(compute())
+    except Exception as e:
+        logger.exception('Refreshing %s failed', key)
+        future.set_exception(e)
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        if background:
+            # Database connections are per thread; don't leave this one's open
+            connections.close_all()
+
+
+def _flight(key, compute, background):
+    with _flights_lock:
+        future = _flights.get(key)
+        started = future is None
+        if started:
+            future = _flights[key] = Future()
+    if started:
+        if background:
+            # Runs with the request's context, so e.g. its replica routing carries over
+            context = copy_context()
+            threading.Thread(target=context.run, args=(_run, key, future, compute, True), daemon=True,
+                             name=f'refresh {key}').start()
+        else:
+            _run(key, future, compute, False)
+    return future
+
+
+def refresh(key, compute):
+    """
+    Runs compute() and returns its result, or waits for the run already in progress for key.
+    """
+    return _flight(key, compute, background=False).result()
+
+
+def refresh_in_background(key, compute):
+    """
+    Starts compute() in a background thread unless a run for key is already in progress.
+    """
+    _flight(key, compute, background=True)
+
+
+def _run_coalesced(key, future, compute):
+    try:
+        while True:
+            try:
+                compute()
+            except Exception:
+                logger.exception('Running %s failed', key)
+            with _flights_lock:
+                if key not in _reruns:
+                    _flights.pop(key, None)
+                    break
+                _reruns.discard(key)
+        future.set_result(None)
+    finally:
+        connections.close_all()
+
+
+def run_coalesced_in_background(key, compute):
+    """
+    Starts compute() in a background thread; if a run for key is already in progress, it runs once
+    more after that one instead, so the change that asked for it is never missed. However many
+    requests come in during a run, they share that one rerun.
+    """
+    with _flights_lock:
+        if key in _flights:
+            _reruns.add(key)
+            return
+        future = _flights[key] = Future()
+    context = copy_context()
+    threading.Thread(target=context.run, args=(_run_coalesced, key, future, compute), daemon=True,
+                     name=f'run {key}').start()
+
+
+def cached(key, compute, fresh_seconds, stale_seconds):
+    """
+    compute()'s value, kept in the Django cache for fresh_seconds and served stale (while being
+    refreshed) for another stale_seconds.
+    """
+    def store():
+        value = compute()
+        cache.set(key, (value, time.time() + fresh_seconds), fresh_seconds + stale_seconds)
+        _last_good[key] = value
+        return value
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        # The marker keeps other requests (and, with a shared cache, other processes) from starting
+        # another refresh; after a failed one it stays until it expires, so retries back off
+        if time.time() >= fresh_until and cache.add(f'{key}:refreshing', True, fresh_seconds):
+            refresh_in_background(key, lambda: _release(key, store))
+        return value
+    try:
+        return refresh(key, store)
+    except Exception:
+        if key not in _last_good:
+            raise
+        # Serve the last good value as if fresh, so the next attempt waits a fresh interval
+        cache.set(key, (_last_good[key], time.time() + fresh_seconds), fresh_seconds + stale_seconds)
+        return _last_good[key]
+
+
+def _release(key, store):
+    value = store()
+    cache.delete(f'{key}:refreshing')
+    return value
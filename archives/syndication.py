@@ -0,0 +1,37 @@
+from .models import Syndication
+from django.core.cache import cache
+import hashlib
+import json
+
+SYNDICATION_CACHE_KEY = 'syndication:by_state'
+# Saves and deletes clear the key directly; the timeout only bounds staleness in other processes
+# when the cache isn't shared between workers.
+SYNDICATION_CACHE_TIMEOUT = 300
+
+
+def get_syndication_by_state():
+    """
+    Returns the syndication listings grouped by state, built once per Syndication change:
+    {'states': [...], 'by_state': {state: {'json': '<stations JSON>', 'etag': '"<hash>"'}}}.
+    """
+    data = cache.get(SYNDICATION_CACHE_KEY)
+    if data is not None:
+        return data
+
+    grouped = {}
+    for state, city, station, time in Syndication.objects.order_by('state', 'city').values_list(
+            'state', 'city', 'station', 'time'):
+        grouped.setdefault(state, []).append({'city': city, 'station': station, 'time': time})
+
+    by_state = {}
+    for state, stations in grouped.items():
+        payload = json.dumps(stations)
+        by_state[state] = {'json': payload, 'etag': f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'}
+
+    data = {'states': sorted(grouped), 'by_state': by_state}
+    cache.set(SYNDICATION_CACHE_KEY, data, SYNDICATION_CACHE_TIMEOUT)
+    return data
+
+
+def clear_syndication_cache():
+    cache.delete(SYNDICATION_CACHE_KEY)
@@ -0,0 +1,168 @@
+from .models import Game, Player, PlayerRound, PreliminaryLine, Leaderboard, StatisticsCache, CustomUser
+from django.db import transaction
+from datetime import date, timedelta
+from django.utils import timezone
+import random
+
+# Mirrors the constants used by the scorekeeper page (score_game.html)
+ROUND_VALUES = [2400, 3000, 3600, 4200]
+FAST_LINE_VALUE = 500
+FINAL_ROUND_CONSOLATION = 1000
+
+# Chance of placing an item correctly by turn position; later turns face a more crowded line
+TURN_SUCCESS_RATE = {1: 0.78, 2: 0.68, 3: 0.58, 4: 0.5}
+
+FIRST_NAMES = ['Alex', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn', 'Drew',
+               'Sam', 'Cameron', 'Reese', 'Parker', 'Rowan', 'Dana', 'Jesse', 'Kendall', 'Logan', 'Skyler']
+LAST_NAMES = ['Smith', 'Lee', 'Garcia', 'Brown', 'Nguyen', 'Patel', 'Kim', 'Lopez', 'Clark', 'Young',
+              'Hill', 'Baker', 'Adams', 'Reed', 'Cook', 'Bell', 'Ward', 'Price', 'Gray', 'Hughes']
+TOPICS = [('State Admission', 'Earliest to Latest'), ('Mountain Heights', 'Lowest to Highest'),
+          ('Stadium Locations', 'West to East'), ('Movie Releases', 'Earliest to Latest'),
+          ('Grocery Prices', 'Lowest to Highest'), ('River Lengths', 'Shortest to Longest')]
+
+SYNTHETIC_USER_EMAIL = 'synthetic@example.com'
+
+
+def _simulate_players(rng):
+    """
+    Plays out one game using the same scoring rules as the scorekeeper page and returns
+    (player field dicts, fast line tiebreaker podium, per-round correct counts).
+    """
+    players = [{'podium_number': podium, 'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                'won_tiebreaker': False, 'fast_line_correct_count': None, 'fast_line_incorrect_count': None,
+                'fast_line_score': None, 'final_round_correct_count': None, 'total_winnings': 0}
+               for podium in range(1, 5)]
+
+    round_correct_counts = []
+    for round_index in range(4):
+        results = []
+        for p in players:
+            turn = (p['podium_number'] - round_index - 1) % 4 + 1
+            results.append(rng.random() < TURN_SUCCESS_RATE[turn])
+        num_correct = sum(results)
+        round_correct_counts.append(num_correct)
+        for p, is_correct in zip(players, results):
+            p[f'round{round_index + 1}_correct'] = is_correct
+            p[f'round{round_index + 1}_score'] = round(ROUND_VALUES[round_index] / num_correct) if is_correct else 0
+
+    for p in players:
+        p['round_total'] = sum(p[f'round{i}_score'] for i in range(1, 5))
+    ranked = sorted(players, key=lambda p: p['round_total'], reverse=True)
+
+    advancing = [ranked[0]] if ranked[0]['round_total'] > 0 else []
+    second = ranked[1]['round_total']
+    if ranked[0]['round_total'] > second == ranked[2]['round_total'] and second > 0:
+        tiebreaker_winner = rng.choice([p for p in ranked if p['round_total'] == second])
+        tiebreaker_winner['won_tiebreaker'] = True
+        advancing.append(tiebreaker_winner)
+    elif second > 0:
+        advancing.append(ranked[1])
+
+    for p in advancing:
+        p['fast_line_correct_count'] = min(12, max(0, int(rng.gauss(6, 2.5))))
+        p['fast_line_incorrect_count'] = min(12, max(0, int(rng.gauss(2, 1.5))))
+        p['fast_line_score'] = p['fast_line_correct_count'] * FAST_LINE_VALUE
+        p['fast_line_total'] = p['round_total'] + p['fast_line_score']
+
+    fast_line_tiebreaker_podium = None
+    if advancing:
+        best = max(p['fast_line_total'] for p in advancing)
+        leaders = [p for p in advancing if p['fast_line_total'] == best]
+        winner = rng.choice(leaders)
+        if len(leaders) > 1:
+            fast_line_tiebreaker_podium = winner['podium_number']
+        winner['final_round_correct_count'] = rng.choices([0, 1, 2, 3, 5], weights=[5, 20, 30, 30, 15])[0]
+        winner['total_winnings'] = (winner['fast_line_total'] if winner['final_round_correct_count'] == 5
+                                    else FINAL_ROUND_CONSOLATION)
+
+    for p in players:
+        p.pop('round_total')
+        p.pop('fast_line_total', None)
+    return players, fast_line_tiebreaker_podium, round_correct_counts
+
+
+def _preliminary_line(rng, game_id, round_number, correct_count):
+    topic, order_description = rng.choice(TOPICS)
+    orders = rng.sample(range(1, 6), 5)
+    fields = {'game_id': game_id, 'round_number': round_number, 'topic': topic,
+              'order_description': order_description, 'episode_correct_count': correct_count,
+              'seed_name': f'{topic} seed', 'seed_value': str(orders[0] * 100), 'seed_order': orders[0]}
+    for i in range(1, 5):
+        fields[f'item{i}_name'] = f'{topic} item {i}'
+        fields[f'item{i}_value'] = str(orders[i] * 100)
+        fields[f'item{i}_order'] = orders[i]
+    return PreliminaryLine(**fields)
+
+
+def generate_archive(num_games, seed=0, leaderboard_entries=None, batch_size=1000):
+    """
+    Fills the database with a synthetic archive of `num_games` games (two episodes per air
+    date, four players each, four preliminary lines each) plus gameplay leaderboard scores
+    spread over the last 45 days. Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    if leaderboard_entries is None:
+        leaderboard_entries = min(num_games * 2, 20000)
+
+    user, _ = CustomUser.objects.get_or_create(email=SYNTHETIC_USER_EMAIL,
+                                               defaults={'role': CustomUser.Role.ADMIN})
+    start_date = date(2025, 1, 1)
+    all_game_ids = []
+
+    with transaction.atomic():
+        for batch_start in range(0, num_games, batch_size):
+            batch = range(batch_start, min(batch_start + batch_size, num_games))
+            simulated = {}
+            games = []
+            for n in batch:
+                key = (start_date + timedelta(days=n // 2), n % 2 + 1)
+                players, tiebreaker_podium, round_counts = _simulate_players(rng)
+                simulated[key] = (players, round_counts)
+                games.append(Game(air_date=key[0], episode_number=key[1], episode_title=f'Synthetic Episode {n + 1}',
+                                  submitted_by=user, fast_line_tiebreaker_winner_podium=tiebreaker_podium))
+            Game.objects.bulk_create(games)
+
+            # bulk_create doesn't return primary keys on MySQL, so look them up by the natural key
+            game_ids = {(d, ep): pk for pk, d, ep in Game.objects.filter(
+                air_date__range=(games[0].air_date, games[-1].air_date)).values_list('id', 'air_date', 'episode_number')}
+            all_game_ids.extend(game_ids.values())
+
+            new_players, new_lines = [], []
+            for key, (players, round_counts) in simulated.items():
+                game_id = game_ids[key]
+                new_players.extend(Player(game_id=game_id, **p) for p in players)
+                new_lines.extend(_preliminary_line(rng, game_id, r + 1, c) for r, c in enumerate(round_counts))
+            Player.objects.bulk_create(new_players, batch_size=batch_size)
+            PlayerRound.objects.bulk_create(PlayerRound.rows_for(
+                Player.objects.filter(game_id__in=game_ids.values())), batch_size=batch_size)
+            PreliminaryLine.objects.bulk_create(new_lines, batch_size=batch_size)
+
+        if leaderboard_entries and all_game_ids:
+            Leaderboard.objects.bulk_create(
+                [Leaderboard(game_type='prelim', play_type='solo', name=rng.choice(FIRST_NAMES),
+                             score=rng.randrange(0, 13201, 100), game_played_id=rng.choice(all_game_ids))
+                 for _ in range(leaderboard_entries)], batch_size=batch_size)
+
+            # auto_now_add stamps every row with "now"; backdate contiguous id ranges, one per day
+            ids = list(Leaderboard.objects.order_by('id').values_list('id', flat=True))
+            per_day = max(1, len(ids) // 45)
+            now = timezone.now()
+            for day, offset in enumerate(range(0, len(ids), per_day)):
+                chunk = ids[offset:offset + per_day]
+                Leaderboard.objects.filter(id__gte=chunk[0], id__lte=chunk[-1]).update(
+                    date=now - timedelta(days=day % 45))
+
+    return user
+
+
+def clear_archive():
+    """
+    Deletes all archive and gameplay data, children first so each delete stays a single query.
+    """
+    with transaction.atomic():
+        Leaderboard.objects.all().delete()
+        PreliminaryLine.objects.all().delete()
+        PlayerRound.objects.all().delete()
+        StatisticsCache.objects.all().delete()
+        Player.objects.all().delete()
+        Game.objects.all().delete()
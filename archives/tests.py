@@ -0,0 +1,909 @@
+from .models import (Game, Leaderboard, Player, PlayerRound, PreliminaryLine, StatisticsCache, Syndication,
+                     turn_position)
+from .synthetic import clear_archive, generate_archive
+from . import (conditional, db_router, prerender, read_model, stats_accumulators, stats_bootstrap, stats_payload,
+               stats_utils, stats_versions)
+from .stats_history import StatsHistory
+from .stats_utils import update_statistics_cache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import SystemCheckError
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from unittest import mock, skipIf
+from collections import Counter
+import contextvars
+import gzip
+import io
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class SyntheticArchiveTests(TestCase):
+    def test_generate_and_clear(self):
+        generate_archive(6, leaderboard_entries=10)
+        self.assertEqual(Game.objects.count(), 6)
+        self.assertEqual(Player.objects.count(), 24)
+        self.assertEqual(PlayerRound.objects.count(), 96)
+        self.assertEqual(PreliminaryLine.objects.count(), 24)
+        self.assertEqual(Leaderboard.objects.count(), 10)
+
+        clear_archive()
+        self.assertFalse(Game.objects.exists())
+        self.assertFalse(Leaderboard.objects.exists())
+
+    def test_deterministic_for_a_seed(self):
+        def totals():
+            return list(Player.objects.order_by('game__air_date', 'game__episode_number', 'podium_number').values_list(
+                'round1_score', 'round2_score', 'round3_score', 'round4_score', 'total_winnings'))
+
+        generate_archive(4, seed=3, leaderboard_entries=0)
+        first = totals()
+        clear_archive()
+        generate_archive(4, seed=3, leaderboard_entries=0)
+        self.assertEqual(totals(), first)
+
+
+class PlayerRoundTests(TestCase):
+    def setUp(self):
+        generate_archive(8, seed=3, leaderboard_entries=0)
+
+    def _rounds(self, player):
+        return list(PlayerRound.objects.filter(player=player).values_list(
+            'game_id', 'round_number', 'podium_number', 'turn_position', 'correct', 'score'))
+
+    def _expected(self, player):
+        return [(player.game_id, r, player.podium_number, turn_position(r, player.podium_number),
+                 getattr(player, f'round{r}_correct'), getattr(player, f'round{r}_score')) for r in range(1, 5)]
+
+    def test_turn_position(self):
+        # Podium 1 plays first in round 1, then the first turn moves one podium along each round
+        self.assertEqual([turn_position(1, p) for p in range(1, 5)], [1, 2, 3, 4])
+        self.assertEqual([turn_position(2, p) for p in range(1, 5)], [4, 1, 2, 3])
+        self.assertEqual([turn_position(r, 1) for r in range(1, 5)], [1, 4, 3, 2])
+
+    def test_sync_rewrites_rounds_from_the_round_columns(self):
+        player = Player.objects.first()
+        # QuerySet.update() skips the signals, so the rounds are stale until synced
+        Player.objects.filter(pk=player.pk).update(round1_correct=not player.round1_correct, round1_score=700)
+        player.refresh_from_db()
+        self.assertNotEqual(self._rounds(player), self._expected(player))
+        PlayerRound.sync([player])
+        self.assertEqual(self._rounds(player), self._expected(player))
+
+    def test_saving_a_player_keeps_its_rounds_in_step(self):
+        player = Player.objects.first()
+        player.round2_correct = None
+        player.round3_score += 100
+        player.save()
+        self.assertEqual(self._rounds(player), self._expected(player))
+
+        player.delete()
+        self.assertFalse(PlayerRound.objects.filter(player_id=player.pk).exists())
+        added = Player.objects.create(game_id=player.game_id, name='Added', podium_number=player.podium_number,
+                                      round1_correct=True, round2_correct=False, round1_score=100, total_winnings=100)
+        self.assertEqual(self._rounds(added), self._expected(added))
+
+    @override_settings(STATS_BOOTSTRAP_RESAMPLES=0)
+    def test_turn_performance_matches_the_round_columns(self):
+        attempts, correct = Counter(), Counter()
+        for player in Player.objects.all():
+            for r in range(1, 5):
+                result = getattr(player, f'round{r}_correct')
+                if result is not None:
+                    attempts[turn_position(r, player.podium_number)] += 1
+                    correct[turn_position(r, player.podium_number)] += result
+        data = update_statistics_cache(save=False)
+        self.assertEqual({row['turn']: row['pct'] for row in data['turn_performance']},
+                         {t: correct[t] / attempts[t] * 100 for t in range(1, 5)})
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_smoke(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('benchmark', games=[5], repeat=1, output=output, stdout=out)
+            with open(output) as f:
+                results = json.load(f)
+        self.assertEqual(results['scales'][0]['games'], 5)
+        names = [b['name'] for b in results['scales'][0]['benchmarks']]
+        self.assertIn('update_statistics_cache', names)
+        self.assertIn('statistics_view', names)
+        # The synthetic archive is cleared afterwards unless --keep is given
+        self.assertFalse(Game.objects.exists())
+
+
+def _settings_with(**env):
+    """
+    The settings module as evaluated under the given environment variables (None unsets one).
+    """
+    with mock.patch.dict(os.environ, {name: value for name, value in env.items() if value is not None}):
+        for name in [name for name, value in env.items() if value is None]:
+            os.environ.pop(name, None)
+        return runpy.run_path(os.path.join(settings.BASE_DIR, 'perfectarchive', 'settings.py'))
+
+
+class ConnectionSettingsTests(TestCase):
+    def test_persistent_connections_with_health_checks_by_default(self):
+        database = _settings_with(DB_ENGINE='mysql', DB_CONN_MAX_AGE=None, DB_CONN_HEALTH_CHECKS=None,
+                                  DB_POOL=None)['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.mysql')
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+
+    def test_pooled_backend_owns_connection_lifetime(self):
+        database = _settings_with(DB_ENGINE='mysql', DB_POOL='True', DB_POOL_SIZE='4',
+                                  DB_CONN_HEALTH_CHECKS='False')['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'dj_db_conn_pool.backends.mysql')
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['POOL_OPTIONS']['POOL_SIZE'], 4)
+        self.assertFalse(database['POOL_OPTIONS']['PRE_PING'])
+
+    def test_asgi_closes_connections_per_request_by_default(self):
+        env = {name: value for name, value in os.environ.items() if name != 'DB_CONN_MAX_AGE'}
+        output = subprocess.run(
+            [sys.executable, '-c', 'import perfectarchive.asgi; from django.db import connection; '
+                                   'print(connection.settings_dict["CONN_MAX_AGE"])'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), '0')
+
+
+class ConnectionBenchmarkTests(TransactionTestCase):
+    # Not TestCase: the real WSGI handler closes connections at the end of each request, which
+    # would end a test transaction
+    def test_reports_both_modes(self):
+        from django.db import connection
+
+        # The command sets CONN_MAX_AGE on the connection as it goes
+        self.addCleanup(connection.settings_dict.__setitem__, 'CONN_MAX_AGE', connection.settings_dict['CONN_MAX_AGE'])
+        out = io.StringIO()
+        call_command('bench_connections', path='/about/', requests=3, max_age=30, stdout=out)
+        self.assertIn('per-request connections (CONN_MAX_AGE=0): mean', out.getvalue())
+        self.assertIn('persistent connections (CONN_MAX_AGE=30): mean', out.getvalue())
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = db_router.PrimaryReplicaRouter()
+        patcher = mock.patch.dict(settings.DATABASES, {db_router.REPLICA: {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _in_new_context(self, fn):
+        # Routing state is per request (context variables); each test starts from a fresh one
+        return contextvars.copy_context().run(fn)
+
+    def test_only_marked_reads_go_to_the_replica(self):
+        def route():
+            outside = self.router.db_for_read(Game)
+            with db_router.use_replica():
+                inside = self.router.db_for_read(Game)
+            return outside, inside
+        self.assertEqual(self._in_new_context(route), (None, db_router.REPLICA))
+
+        with mock.patch.dict(settings.DATABASES):
+            del settings.DATABASES[db_router.REPLICA]
+            self.assertIsNone(self._in_new_context(lambda: self.router.db_for_read(Game)))
+
+    def test_a_write_pins_the_rest_of_the_request_to_primary(self):
+        def route():
+            with db_router.use_replica():
+                before = self.router.db_for_read(Game)
+                written = self.router.db_for_write(Game)
+                return before, written, self.router.db_for_read(Game)
+        self.assertEqual(self._in_new_context(route), (db_router.REPLICA, 'default', None))
+
+    def test_migrations_only_run_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'archives'))
+        self.assertFalse(self.router.allow_migrate(db_router.REPLICA, 'archives'))
+
+    def test_pin_cookie_carries_over_to_the_next_request(self):
+        def writes(request):
+            self.router.db_for_write(Game)
+            return HttpResponse()
+
+        def reads(request):
+            with db_router.use_replica():
+                return HttpResponse(self.router.db_for_read(Game) or 'default')
+
+        factory = RequestFactory()
+        response = self._in_new_context(lambda: db_router.ReplicaPinMiddleware(writes)(factory.post('/')))
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+
+        pinned = factory.get('/')
+        pinned.COOKIES[db_router.PIN_COOKIE] = '1'
+        middleware = db_router.ReplicaPinMiddleware(reads)
+        self.assertEqual(self._in_new_context(lambda: middleware(pinned)).content, b'default')
+        self.assertEqual(self._in_new_context(lambda: middleware(factory.get('/'))).content, b'replica')
+
+    def test_replica_configured_from_the_environment(self):
+        configured = _settings_with(DB_REPLICA_NAME='replica.sqlite3', DB_REPLICA_HOST=None)
+        self.assertEqual(configured['DATABASES'][db_router.REPLICA]['NAME'], 'replica.sqlite3')
+        self.assertEqual(configured['DATABASE_ROUTERS'], ['archives.db_router.PrimaryReplicaRouter'])
+        self.assertNotIn(db_router.REPLICA, _settings_with(DB_REPLICA_NAME=None, DB_REPLICA_HOST=None)['DATABASES'])
+
+
+class StatisticsRebuildTests(TestCase):
+    def test_snapshot_failure_keeps_saved_statistics(self):
+        generate_archive(3, leaderboard_entries=0)
+        with mock.patch.object(stats_utils, 'publish_snapshot', side_effect=OSError('disk full')), \
+                self.assertLogs('archives.stats_utils', 'ERROR'):
+            update_statistics_cache(save=True)
+        self.assertEqual(StatisticsCache.objects.count(), 1)
+        self.assertEqual(self.client.get('/statistics/').status_code, 200)
+
+
+class AdminRebuildTests(TestCase):
+    def test_rebuilds_after_commit_in_the_background(self):
+        from django.contrib import admin
+
+        generate_archive(2, leaderboard_entries=0)
+        rebuilt = threading.Event()
+        threads = []
+
+        def rebuild():
+            threads.append(threading.current_thread())
+            rebuilt.set()
+
+        game = Game.objects.first()
+        with mock.patch.object(stats_utils, 'update_statistics_cache', side_effect=rebuild):
+            with self.captureOnCommitCallbacks() as callbacks:
+                admin.site._registry[Game].delete_model(None, game)
+            self.assertFalse(rebuilt.is_set())
+            for callback in callbacks:
+                callback()
+            self.assertTrue(rebuilt.wait(10))
+        self.assertIsNot(threads[0], threading.current_thread())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        generate_archive(3, leaderboard_entries=0)
+        update_statistics_cache(save=True)
+        read_model.invalidate()
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get('/').headers['ETag']
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_no_shared_etag_when_signed_in(self):
+        self.client.force_login(get_user_model().objects.create_superuser(email='staff@example.com', password='x'))
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_etag_changes_with_a_new_cache_row(self):
+        etag = self.client.get('/').headers['ETag']
+        update_statistics_cache(save=True)
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+class StatisticsFragmentsTests(TestCase):
+    def setUp(self):
+        generate_archive(12, seed=4, leaderboard_entries=0)
+
+    def test_rebuild_stores_the_fragments_the_page_serves(self):
+        from .stats_fragments import FRAGMENT_NAMES, fragments_are_current
+
+        update_statistics_cache(save=True)
+        first = stats_versions.newest_row()
+        update_statistics_cache(save=True)
+        row = stats_versions.newest_row()
+        self.assertEqual(StatisticsCache.objects.get(pk=first.pk).fragments, {})
+        self.assertTrue(fragments_are_current(row.fragments))
+        self.assertEqual(sorted(row.fragments['html']), sorted(FRAGMENT_NAMES))
+
+        read_model.invalidate()
+        page = self.client.get('/statistics/').content.decode()
+        for html in row.fragments['html'].values():
+            self.assertIn(html, page)
+
+    def test_rendered_from_the_cached_data_they_match(self):
+        from .stats_fragments import render_fragments
+
+        # The rebuild renders from model instances, a stale cache from the stored data
+        update_statistics_cache(save=True)
+        row = stats_versions.newest_row()
+        snapshot = read_model.build_snapshot(row.pk)
+        rendered = render_fragments(read_model.statistics_context(row.stats, snapshot))
+        self.assertEqual(rendered['html'], row.fragments['html'])
+
+    def test_fragments_follow_the_template_release(self):
+        from .stats_fragments import fragments_are_current
+
+        update_statistics_cache(save=True)
+        fragments = stats_versions.newest_row().fragments
+        with mock.patch.object(conditional, '_release', 'next-deploy'):
+            self.assertFalse(fragments_are_current(fragments))
+
+
+class ReadModelTests(TestCase):
+    def setUp(self):
+        generate_archive(6, leaderboard_entries=0)
+        update_statistics_cache(save=True)
+        read_model.invalidate()
+
+    def test_stale_fragments_are_not_written_on_a_request(self):
+        row = stats_versions.newest_row()
+        stale = {'release': 'an earlier deploy', 'html': {}}
+        StatisticsCache.objects.filter(pk=row.pk).update(fragments=stale)
+
+        response = self.client.get('/statistics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Preliminary', response.content)
+        self.assertEqual(StatisticsCache.objects.get(pk=row.pk).fragments, stale)
+
+    def test_unwritable_snapshot_file_serves_from_memory(self):
+        from . import snapshot_file
+
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(ARCHIVE_SNAPSHOT_PATH=os.path.join(root, 'snapshot.bin')), \
+                mock.patch.object(snapshot_file, 'write_snapshot', side_effect=OSError('read-only file system')):
+            snapshot = read_model.load_snapshot(read_model.archive_version())
+            self.assertEqual(self.client.get('/recent-games/').status_code, 200)
+        self.assertIsInstance(snapshot, read_model.ArchiveSnapshot)
+
+    def test_mapped_snapshot_matches_the_built_one(self):
+        from .conditional import template_release
+        from .snapshot_file import open_snapshot, write_snapshot
+
+        version = read_model.archive_version()
+        built = read_model.build_snapshot(version)
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'snapshot.bin')
+            write_snapshot(path, built, template_release())
+            mapped = open_snapshot(path, version, template_release())
+
+            self.assertEqual(mapped.version, built.version)
+            self.assertEqual([_game_record(g) for g in mapped.games], [_game_record(g) for g in built.games])
+            self.assertEqual(_game_record(mapped.latest_game), _game_record(built.latest_game))
+            self.assertTrue(built.top_champions)
+            self.assertEqual([p.id for p in mapped.top_champions], [p.id for p in built.top_champions])
+            self.assertEqual({g.id: mapped.position.get(g.id) for g in built.games}, built.position)
+            self.assertIsNone(mapped.position.get(-1))
+            self.assertEqual(mapped.fragments, built.fragments)
+            mapped.buffer.close()
+
+
+def _game_record(game):
+    players = [tuple(getattr(p, name) for name in read_model.PlayerRecord.__slots__ if name != 'game')
+               for p in game.players]
+    return tuple(getattr(game, name) for name in read_model.GAME_FIELDS) + (players,)
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        generate_archive(6, leaderboard_entries=10)
+        update_statistics_cache(save=True)
+        # A fresh worker: no snapshot loaded yet (an earlier test's may carry the same version id)
+        patcher = mock.patch.object(read_model, '_snapshot', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        read_model.invalidate()
+        cache.clear()
+
+    def test_warmed_worker_serves_the_snapshot_and_leaderboards_without_queries(self):
+        from .warmup import warm_up
+        from gameplay.leaderboards import get_leaderboard_tables
+
+        results = warm_up()
+        self.assertEqual([name for name, _, _ in results],
+                         ['templates', 'urls', 'databases', 'archive', 'leaderboards'])
+        self.assertNotIn('failed', [detail for _, _, detail in results])
+        with self.assertNumQueries(0):
+            snapshot = read_model.get_snapshot()
+            get_leaderboard_tables('prelim', 'solo')
+        self.assertEqual(snapshot.version, read_model.archive_version())
+        self.assertEqual(len(snapshot.games), 6)
+
+    def test_a_failing_step_is_logged_and_skipped(self):
+        from .warmup import warm_up
+
+        def broken():
+            raise RuntimeError('database unreachable')
+
+        with self.assertLogs('archives.warmup', 'ERROR'):
+            results = warm_up([('broken', broken), ('after', lambda: 'ran')])
+        self.assertEqual([(name, detail) for name, _, detail in results], [('broken', 'failed'), ('after', 'ran')])
+
+    def test_command_reports_each_step(self):
+        out = io.StringIO()
+        call_command('warmup', stdout=out)
+        for name in ('templates', 'urls', 'databases', 'archive', 'leaderboards', 'Warm-up took'):
+            self.assertIn(name, out.getvalue())
+
+    def test_gunicorn_hooks(self):
+        from . import warmup
+        from perfectarchive import gunicorn_conf
+
+        worker = mock.Mock()
+        with mock.patch.object(warmup, 'warm_up', return_value=[('archive', 0.25, 'ArchiveSnapshot')]) as warm_up, \
+                mock.patch.object(gunicorn_conf, 'preload_app', True), mock.patch.object(gunicorn_conf, 'warmup', True):
+            gunicorn_conf.when_ready(None)
+            warm_up.assert_called_once_with(warmup.PROCESS_STEPS)
+            gunicorn_conf.post_worker_init(worker)
+            warm_up.assert_called_with()
+            with mock.patch.object(gunicorn_conf, 'warmup', False):
+                gunicorn_conf.post_worker_init(worker)
+        self.assertEqual(warm_up.call_count, 2)
+        worker.log.debug.assert_called_once_with('Warm-up %s: %.1f ms (%s)', 'archive', 250.0, 'ArchiveSnapshot')
+
+
+@override_settings(READ_MODEL_PROBE_SECONDS=2, READ_MODEL_STALE_SECONDS=300)
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        generate_archive(6, leaderboard_entries=10)
+        update_statistics_cache(save=True)
+        read_model.invalidate()
+        self.addCleanup(read_model.invalidate)
+        cache.clear()
+
+    def test_concurrent_refreshes_share_one_computation(self):
+        from . import swr
+
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(10)
+            return 'value'
+
+        first = threading.Thread(target=lambda: results.append(swr.refresh('test', compute)))
+        first.start()
+        self.assertTrue(started.wait(10))
+        second = threading.Thread(target=lambda: results.append(swr.refresh('test', compute)))
+        second.start()
+        release.set()
+        first.join(10)
+        second.join(10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value', 'value'])
+
+    def test_stale_snapshot_is_served_while_refreshing_in_the_background(self):
+        import time
+        from . import swr
+
+        snapshot = read_model.get_snapshot()
+        read_model._checked_at = time.monotonic() - 10
+        with mock.patch.object(swr, 'refresh_in_background') as refresh_in_background, self.assertNumQueries(0):
+            self.assertIs(read_model.get_snapshot(), snapshot)
+        refresh_in_background.assert_called_once_with('read_model', read_model._refresh)
+
+    def test_expired_snapshot_waits_for_the_new_version(self):
+        import time
+
+        read_model.get_snapshot()
+        update_statistics_cache(save=True)
+        read_model._checked_at = time.monotonic() - 400
+        self.assertEqual(read_model.get_snapshot().version, read_model.archive_version())
+
+    def test_failed_probe_serves_the_old_snapshot_and_backs_off(self):
+        import time
+        from django.db import OperationalError
+
+        snapshot = read_model.get_snapshot()
+        read_model._checked_at = time.monotonic() - 400
+        with mock.patch.object(read_model, 'archive_version', side_effect=OperationalError('gone away')) as probe, \
+                self.assertLogs('archives.swr', 'ERROR'):
+            self.assertIs(read_model.get_snapshot(), snapshot)
+            self.assertIs(read_model.get_snapshot(), snapshot)
+        probe.assert_called_once_with()
+
+    def test_leaderboards_are_cached_and_served_stale(self):
+        import time
+        from django.core.cache import cache
+        from . import swr
+        from gameplay import leaderboards
+
+        tables = leaderboards.get_leaderboard_tables('prelim', 'solo')
+        with self.assertNumQueries(0):
+            self.assertEqual(leaderboards.get_leaderboard_tables('prelim', 'solo'), tables)
+
+        key = leaderboards._cache_key('prelim', 'solo')
+        cache.set(key, (tables, time.time() - 1), 600)
+        with mock.patch.object(swr, 'refresh_in_background') as refresh_in_background, self.assertNumQueries(0):
+            self.assertEqual(leaderboards.get_leaderboard_tables('prelim', 'solo'), tables)
+            leaderboards.get_leaderboard_tables('prelim', 'solo')
+        refresh_in_background.assert_called_once()
+
+    def test_failed_leaderboard_refresh_serves_the_last_good_tables(self):
+        from django.core.cache import cache
+        from gameplay import leaderboards
+
+        tables = leaderboards.get_leaderboard_tables('prelim', 'solo')
+        cache.clear()
+        failing = mock.patch.object(leaderboards, 'render_leaderboard_tables', side_effect=RuntimeError('timeout'))
+        with failing as render, self.assertLogs('archives.swr', 'ERROR'):
+            self.assertEqual(leaderboards.get_leaderboard_tables('prelim', 'solo'), tables)
+            self.assertEqual(leaderboards.get_leaderboard_tables('prelim', 'solo'), tables)
+        render.assert_called_once_with('prelim', 'solo')
+
+
+@override_settings(REQUEST_METRICS=True, METRICS_TOKEN='scraper', REQUEST_QUERY_BUDGET=50,
+                   MIDDLEWARE=['archives.middleware.QueryTimingMiddleware'] + settings.MIDDLEWARE)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        from . import middleware
+
+        for recorded in (middleware._samples, middleware._totals):
+            self.addCleanup(recorded.clear)
+            recorded.clear()
+        generate_archive(2, leaderboard_entries=0)
+        update_statistics_cache(save=True)
+        read_model.invalidate()
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get('/')
+        self.assertRegex(response.headers['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", app;dur=')
+
+        metrics = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scraper')
+        self.assertEqual(metrics.status_code, 200)
+        self.assertIn('perfectarchive_request_ms_count{view="index"} 1', metrics.content.decode())
+        self.assertIn('perfectarchive_request_queries{view="index",quantile="0.95"}', metrics.content.decode())
+
+    def test_metrics_need_staff_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.force_login(get_user_model().objects.create_superuser(email='staff@example.com', password='x'))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+        with override_settings(REQUEST_METRICS=False):
+            self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+    def test_warns_over_the_query_budget(self):
+        with override_settings(REQUEST_QUERY_BUDGET=0), self.assertLogs('archives.middleware', 'WARNING') as logs:
+            self.client.get('/')
+        self.assertIn('index issued', logs.output[0])
+
+
+class SyndicationTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        # Replaces the listings the data migration loads
+        Syndication.objects.all().delete()
+        Syndication.objects.create(state='Ohio', city='Toledo', station='WTOL', time='7:00 PM')
+        Syndication.objects.create(state='Ohio', city='Akron', station='WAKR', time='6:30 PM')
+        Syndication.objects.create(state='Texas', city='Austin', station='KXAN', time='5:00 PM')
+
+    def test_page_lists_states_and_stations_load_per_state(self):
+        page = self.client.get('/show-info/').content.decode()
+        self.assertIn('Ohio', page)
+        self.assertIn('Texas', page)
+        self.assertNotIn('WTOL', page)
+
+        response = self.client.get('/show-info/stations/Ohio/')
+        self.assertEqual(response.json(), [{'city': 'Akron', 'station': 'WAKR', 'time': '6:30 PM'},
+                                           {'city': 'Toledo', 'station': 'WTOL', 'time': '7:00 PM'}])
+        self.assertEqual(self.client.get('/show-info/stations/Utah/').status_code, 404)
+
+    def test_state_etag_changes_with_its_stations(self):
+        etag = self.client.get('/show-info/stations/Ohio/').headers['ETag']
+        self.assertEqual(self.client.get('/show-info/stations/Ohio/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Syndication.objects.create(state='Ohio', city='Dayton', station='WDTN', time='7:30 PM')
+        response = self.client.get('/show-info/stations/Ohio/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('WDTN', response.content.decode())
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        generate_archive(3, leaderboard_entries=0)
+
+    def test_gzip(self):
+        plain = self.client.get('/').content
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(response.content), plain)
+
+    @skipIf(brotli is None, 'needs the brotli package')
+    def test_brotli_preferred(self):
+        plain = self.client.get('/').content
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain)
+
+    @skipIf(brotli is None, 'needs the brotli package')
+    def test_gzip_for_pages_with_a_csrf_token(self):
+        self.client.force_login(get_user_model().objects.create_superuser(email='staff@example.com', password='x'))
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+    def test_no_accepted_encoding(self):
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    @override_settings(COMPRESSION_MIN_SIZE=10 ** 9)
+    def test_small_response_not_compressed(self):
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Accept-Encoding', response.headers['Vary'])
+
+
+def _line(game, round_number):
+    entry = {'game': game, 'round_number': round_number, 'topic': 'Rivers', 'order_description': 'Shortest to Longest',
+             'seed_name': 'Thames', 'seed_order': 1, 'episode_correct_count': 2}
+    for i in range(1, 5):
+        entry.update({f'item{i}_name': f'River {i}', f'item{i}_order': i + 1})
+    return entry
+
+
+class PreliminaryLinesApiTests(TestCase):
+    def setUp(self):
+        generate_archive(2, leaderboard_entries=0)
+        self.game = Game.objects.order_by('id').first()
+        PreliminaryLine.objects.filter(game=self.game).delete()
+        self.user = get_user_model().objects.create_superuser(email='scorekeeper@example.com', password='x')
+        self.client.force_login(self.user)
+
+    def post(self, *lines, client=None):
+        return (client or self.client).post('/add-line/batch/', json.dumps({'lines': list(lines)}),
+                                            content_type='application/json')
+
+    def test_saves_lines(self):
+        response = self.post(_line(self.game.id, 1), _line(self.game.id, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(PreliminaryLine.objects.filter(game=self.game).count(), 2)
+
+    def test_requires_csrf_token(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        self.assertEqual(self.post(_line(self.game.id, 1), client=client).status_code, 403)
+        client.get('/add-line/')
+        response = client.post('/add-line/batch/', json.dumps({'lines': [_line(self.game.id, 1)]}),
+                               content_type='application/json', HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 201)
+
+    def test_rejects_boolean_game(self):
+        response = self.post(_line(True, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PreliminaryLine.objects.filter(game=self.game).exists())
+
+    def test_reports_existing_line(self):
+        self.assertEqual(self.post(_line(self.game.id, 1)).status_code, 201)
+        response = self.post(_line(self.game.id, 1))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errors'], [f'Game {self.game.id}, Round 1 already has a line.'])
+
+    def test_integrity_error_is_reported(self):
+        with mock.patch.object(PreliminaryLine.objects, 'bulk_create', side_effect=IntegrityError):
+            response = self.post(_line(self.game.id, 1))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(PreliminaryLine.objects.filter(game=self.game).exists())
+
+
+class StaticManifestTests(TestCase):
+    def test_page_renders_with_manifest_storage(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as root:
+            for name in ('site.css', 'vendor/chart.umd.js', 'vendor/tone.js'):
+                path = os.path.join(source, 'dist', name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(f'/* {name} */')
+            storages = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'}}
+            with override_settings(STORAGES=storages, STATICFILES_DIRS=[source], STATIC_ROOT=root):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                response = self.client.get('/about/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.content.decode(), r'/static/dist/site\.[0-9a-f]{12}\.css')
+
+    def test_collectstatic_fails_without_the_built_assets(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as root:
+            with override_settings(STATICFILES_DIRS=[source], STATIC_ROOT=root):
+                with self.assertRaisesRegex(SystemCheckError, 'archives.E001'):
+                    call_command('collectstatic', interactive=False, verbosity=0, skip_checks=False)
+
+
+class AccumulatorRegistryTests(TestCase):
+    def test_registered_accumulator_reaches_the_statistics(self):
+        @stats_accumulators.register
+        class GamesSeen(stats_accumulators.Accumulator):
+            name = 'games_seen'
+            stored = True
+
+            def init(self):
+                return {'games_seen': 0}
+
+            def add_game(self, state, game, advancing_ids, winner_ids):
+                state['games_seen'] += 1
+
+        self.addCleanup(stats_accumulators.ACCUMULATORS.pop)
+        generate_archive(7, leaderboard_entries=0)
+
+        sections = []
+        statistics_sections = stats_utils.statistics_sections
+
+        def record(counts):
+            sections.append(statistics_sections(counts))
+            return sections[-1]
+
+        with mock.patch.object(stats_utils, 'statistics_sections', side_effect=record):
+            data = update_statistics_cache(save=False)
+        self.assertEqual(sections[0]['games_seen'], 7)
+        self.assertEqual(data['games_seen'], 7)
+
+
+class RebuildMemoryTests(TestCase):
+    def _peak(self, games):
+        clear_archive()
+        generate_archive(games, seed=1, leaderboard_entries=0)
+        update_statistics_cache(save=False)  # warm up imports and caches outside the measurement
+        tracemalloc.start()
+        try:
+            update_statistics_cache(save=False)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # Small windows and bootstrap batches, so both archives span several
+    @override_settings(STATS_CHUNK_SIZE=25, STATS_BOOTSTRAP_RESAMPLES=200)
+    def test_peak_memory_flat_in_archive_size(self):
+        with mock.patch.object(stats_bootstrap, 'BATCH_CELLS', 200 * 25):
+            small = self._peak(100)
+            large = self._peak(400)
+        self.assertLess(large, small * 1.2, f'peak {small} bytes for 100 games, {large} for 400')
+
+
+class StatisticsPayloadTests(TestCase):
+    def setUp(self):
+        generate_archive(40, seed=6, leaderboard_entries=0)
+        self.data = update_statistics_cache(save=False)
+        self.latest_game = Game.objects.latest('id')
+
+    def test_every_encoding_reads_back_the_original_data(self):
+        encodings = ['json', 'zlib'] + (['msgpack'] if stats_payload.msgpack else [])
+        fields = [{'data': self.data}] + [stats_payload.store_fields(self.data, encoding) for encoding in encodings]
+        rows = [StatisticsCache.objects.create(through_game=self.latest_game, **f) for f in fields]
+        for row in rows:
+            row = StatisticsCache.objects.get(pk=row.pk)
+            self.assertEqual(_canonical(row.stats), _canonical(self.data), f'{row.format_version} {row.encoding}')
+        self.assertEqual([row.encoding for row in rows[1:]], encodings)
+
+    def test_payload_is_smaller_than_the_verbose_json(self):
+        payload = stats_payload.encode_payload(self.data)
+        self.assertEqual(payload['v'], stats_payload.PAYLOAD_VERSION)
+        # Each listed player is stored once, however many lists name them
+        ids = [row[0] for row in payload['players']]
+        self.assertEqual(len(ids), len(set(ids)))
+        verbose = len(json.dumps(self.data, default=str))
+        self.assertLess(len(json.dumps(payload)), verbose * 0.6)
+        self.assertLess(len(stats_payload.store_fields(self.data, 'zlib')['payload']), verbose * 0.2)
+
+
+class StatisticsDeltaTests(TestCase):
+    @override_settings(STATS_BOOTSTRAP_RESAMPLES=0)
+    def test_one_game_delta_is_small(self):
+        generate_archive(120, seed=5, leaderboard_entries=0)
+        data = update_statistics_cache(save=False)
+        # Store the archive as it was before its newest game, then the new game's statistics against it
+        Game.objects.order_by('-air_date', '-episode_number').first().delete()
+        update_statistics_cache(save=True)
+        previous = stats_versions.newest_row()
+        payload = stats_versions.normalized(stats_payload.encode_payload(data))
+        fields = stats_versions.payload_version_fields(payload, 'json', previous)
+
+        self.assertEqual(fields['format_version'], stats_payload.DELTA_VERSION)
+        delta, keyframe = len(json.dumps(fields['data'])), len(json.dumps(payload))
+        self.assertLess(delta, keyframe * 0.4, f'{delta} byte delta for a {keyframe} byte keyframe')
+        patched = stats_payload.patch_payload(stats_versions.load_payload(previous), fields['data'])
+        self.assertEqual(_canonical(stats_payload.decode_payload(patched)),
+                         _canonical(stats_payload.decode_payload(payload)))
+
+    @skipIf(stats_bootstrap.np is None, 'needs NumPy')
+    @override_settings(STATS_BOOTSTRAP_RESAMPLES=200)
+    def test_intervals_kept_beside_the_payload(self):
+        generate_archive(30, leaderboard_entries=0)
+        data = update_statistics_cache(save=True)
+        first = stats_versions.newest_row()
+        self.assertTrue(data['podium_stats'][0]['round1_pct_ci'])
+        self.assertNotIn('_ci', json.dumps(stats_versions.load_payload(first)))
+        self.assertEqual(_canonical(StatisticsCache.objects.get(pk=first.pk).stats), _canonical(data))
+
+        # Unlike the fragments, older rows keep theirs
+        update_statistics_cache(save=True)
+        self.assertEqual(_canonical(StatisticsCache.objects.get(pk=first.pk).stats), _canonical(data))
+        self.assertTrue(stats_versions.newest_row().intervals)
+
+
+class StatsHistoryTests(TestCase):
+    @override_settings(STATS_BOOTSTRAP_RESAMPLES=0)
+    def test_newest_game_matches_the_rebuild(self):
+        generate_archive(60, seed=2, leaderboard_entries=0)
+        history = StatsHistory.build()
+        self.assertEqual(len(history), 60)
+        self.assertEqual(_canonical(history.statistics_through(len(history))),
+                         _canonical(update_statistics_cache(save=False)))
+
+
+def _canonical(data):
+    return json.dumps(data, sort_keys=True, default=str)
+
+
+class ParallelStatisticsTests(TransactionTestCase):
+    # Not TestCase: inside its transaction the rebuild stays serial (workers couldn't see the data)
+
+    def test_parallel_matches_serial(self):
+        generate_archive(40, seed=1, leaderboard_entries=0)
+        serial = update_statistics_cache(save=False, workers=1)
+        with mock.patch.object(stats_utils, '_accumulate_parallel', wraps=stats_utils._accumulate_parallel) as parallel:
+            sharded = update_statistics_cache(save=False, workers=2)
+        parallel.assert_called_once_with(2)
+        self.assertEqual(_canonical(sharded), _canonical(serial))
+
+
+class PrerenderOnSaveTests(TestCase):
+    @override_settings(PRERENDER_ON_SAVE=True)
+    def test_renders_after_commit_in_the_background(self):
+        generate_archive(3, leaderboard_entries=0)
+        rendered = threading.Event()
+        threads = []
+
+        def render(**kwargs):
+            threads.append((threading.current_thread(), kwargs))
+            rendered.set()
+
+        with mock.patch.object(prerender, 'prerender_site', side_effect=render):
+            with self.captureOnCommitCallbacks() as callbacks:
+                update_statistics_cache(save=True)
+            self.assertFalse(rendered.is_set())
+            for callback in callbacks:
+                callback()
+            self.assertTrue(rendered.wait(10))
+
+        thread, kwargs = threads[0]
+        self.assertIsNot(thread, threading.current_thread())
+        self.assertEqual(kwargs, {'incremental': True, 'changed_game_ids': [Game.objects.latest('id').id]})
+
+    def test_admin_edit_of_an_older_game_rerenders_its_page(self):
+        from django.contrib import admin
+        from . import swr
+
+        generate_archive(8, leaderboard_entries=0)
+        update_statistics_cache(save=True)
+        oldest = Game.objects.order_by('air_date', 'episode_number').first()
+        with tempfile.TemporaryDirectory() as root, override_settings(PRERENDER_ROOT=root, PRERENDER_ON_SAVE=True):
+            prerender.prerender_site()
+            page = os.path.join(root, 'recent-games', 'page-2.html')
+            with open(page, 'rb') as f:
+                before = f.read()
+
+            oldest.episode_title = 'Edited In The Admin'
+            run_inline = lambda key, compute: compute()
+            with mock.patch.object(swr, 'run_coalesced_in_background', side_effect=run_inline), \
+                    mock.patch.object(prerender, 'run_coalesced_in_background', side_effect=run_inline):
+                with self.captureOnCommitCallbacks(execute=True):
+                    admin.site._registry[Game].save_model(None, oldest, None, True)
+
+            with open(page, 'rb') as f:
+                after = f.read()
+        self.assertNotEqual(after, before)
+        self.assertIn(b'Edited In The Admin', after)
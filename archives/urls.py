@@ -10,6 +10,7 @@ urlpatterns = [
     path('statistics/', views.statistics_view, name='statistics'),
     path('analysis/', views.analysis_view, name='analysis'),
     path('show-info/', views.show_info_view, name='show_info'),
+    path('show-info/stations/<str:state>/', views.syndication_state_api, name='syndication_state_api'),
     path('about/', views.about_view, name='about'),
 
     # Permalink route for individual games
@@ -18,6 +19,10 @@ urlpatterns = [
     # Admin-only pages
     path('score-game/', views.score_game_view, name='score_game'),
     path('add-line/', views.add_preliminary_line_view, name='add_line'),
+    path('add-line/batch/', views.preliminary_lines_api, name='preliminary_lines_api'),
+
+    # Request metrics (opt-in via REQUEST_METRICS)
+    path('metrics/', views.metrics_view, name='metrics'),
 
     # API endpoint
     path('game_entry', views.game_entry_api, name='game_entry_api'),
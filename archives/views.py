@@ -1,87 +1,30 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required, permission_required, user_passes_test
-from .models import Game, Player, CustomUser, Syndication, StatisticsCache, PreliminaryLine
+from .models import Game, Player, CustomUser, PreliminaryLine
 import json
 from django.core.paginator import Paginator
-from django.db.models import Count, Avg, Q, Sum, F
-from collections import defaultdict
-from .stats_utils import update_statistics_cache
-from .forms import PreliminaryLineForm
 from django.urls import reverse
-from django.contrib import messages
-
-
-def _calculate_game_outcomes(game):
-    """
-    Helper function to determine advancing players and winners for a given game.
-    This avoids duplicating logic across multiple views.
-    """
-    players = list(game.players.all())
-    if not players:
-        return [], []
-
-    for p in players:
-        p.round_total = p.round1_score + p.round2_score + p.round3_score + p.round4_score
-
-    players.sort(key=lambda p: p.round_total, reverse=True)
-
-    # Determine advancing players from round 1-4
-    advancing_ids = []
-    if len(players) > 0 and players[0].round_total >= 0:
-        advancing_ids.append(players[0].id)
-
-    tiebreaker_winner = next((p for p in players if p.won_tiebreaker), None)
-    if tiebreaker_winner:
-        if tiebreaker_winner.id not in advancing_ids:
-            advancing_ids.append(tiebreaker_winner.id)
-    elif len(players) > 1 and players[1].round_total >= 0:
-        if players[1].id not in advancing_ids:
-            advancing_ids.append(players[1].id)
-
-    # Determine the final winner(s)
-    winner_ids = []
-    advancing_players = [p for p in players if p.id in advancing_ids]
-
-    # Check for a fast line tie-breaker first
-    if game.fast_line_tiebreaker_winner_podium is not None:
-        winner_player = next(
-            (p for p in advancing_players if p.podium_number == game.fast_line_tiebreaker_winner_podium), None)
-        if winner_player:
-            winner_ids.append(winner_player.id)
-    else:
-        # If no tie-breaker, determine winner by highest score
-        max_fast_line_total = -1
-        for p in advancing_players:
-            p.fast_line_total = p.round_total + (p.fast_line_score or 0)
-            if p.fast_line_total > max_fast_line_total:
-                max_fast_line_total = p.fast_line_total
-
-        if max_fast_line_total >= 0:
-            winner_ids = [p.id for p in advancing_players if p.fast_line_total == max_fast_line_total]
-
-    return advancing_ids, winner_ids
+from django.conf import settings
+from django.db import transaction
+from .middleware import render_metrics
+from .syndication import get_syndication_by_state
+from .conditional import archive_etag, show_info_etag, static_page_etag
+from .db_router import replica_reads
+from .read_model import get_snapshot
 
 
 # Home page view
+@replica_reads
+@condition(etag_func=archive_etag)
 def index(request):
-    latest_game = Game.objects.prefetch_related('players').order_by('-air_date', '-episode_number').first()
-    if latest_game:
-        advancing_ids, winner_ids = _calculate_game_outcomes(latest_game)
-        for p in latest_game.players.all():
-            p.is_advancing = p.id in advancing_ids
-            p.is_winner = p.id in winner_ids
-            # Add calculated fields for template display
-            p.round_total_score = p.round1_score + p.round2_score + p.round3_score + p.round4_score
-            p.fast_line_total_score = p.round_total_score + (p.fast_line_score or 0)
-
-    top_champions = Player.objects.filter(total_winnings__gt=1000).select_related('game').order_by('-total_winnings')[
-                    :3]
-
+    snapshot = get_snapshot()
     context = {
-        'latest_game': latest_game,
-        'top_champions': top_champions,
+        'latest_game': snapshot.latest_game,
+        'top_champions': snapshot.top_champions,
     }
     return render(request, 'archives/index.html', context)
 
@@ -94,114 +37,87 @@ def score_game_view(request):
 
 
 # View for the Recent Games page
+@replica_reads
+@condition(etag_func=archive_etag)
 def recent_games_view(request):
-    game_list = Game.objects.prefetch_related('players').order_by('-air_date', '-episode_number')
-
-    for game in game_list:
-        advancing_ids, winner_ids = _calculate_game_outcomes(game)
-        for p in game.players.all():
-            p.is_advancing = p.id in advancing_ids
-            p.is_winner = p.id in winner_ids
-            p.round_total_score = p.round1_score + p.round2_score + p.round3_score + p.round4_score
-            p.fast_line_total_score = p.round_total_score + (p.fast_line_score or 0)
-
-    paginator = Paginator(game_list, 5)
+    # Outcomes are computed once per archive version in the read model
+    paginator = Paginator(get_snapshot().games, 5)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-
     return render(request, 'archives/recent_games.html', {'page_obj': page_obj})
 
 
 # View for Permalink Redirection
+@replica_reads
 def game_permalink_view(request, game_id):
-    all_game_ids = list(Game.objects.values_list('id', flat=True).order_by('-air_date', '-episode_number'))
-
-    try:
-        index = all_game_ids.index(game_id)
-        page_number = (index // 5) + 1
-
-        redirect_url = f"{reverse('recent_games')}?page={page_number}#game-{game_id}"
-        return redirect(redirect_url)
-    except ValueError:
+    index = get_snapshot().position.get(game_id)
+    if index is None:
         return redirect('recent_games')
 
+    page_number = (index // 5) + 1
+    redirect_url = f"{reverse('recent_games')}?page={page_number}#game-{game_id}"
+    return redirect(redirect_url)
+
 
 # View for Show Info page
+@replica_reads
+@condition(etag_func=show_info_etag)
 def show_info_view(request):
-    stations = Syndication.objects.all().order_by('state', 'city')
-    syndication_data = defaultdict(list)
-    for station in stations:
-        syndication_data[station.state].append({
-            "city": station.city,
-            "station": station.station,
-            "time": station.time
-        })
-
-    context = {
-        'states': sorted(syndication_data.keys()),
-        'syndication_data_json': json.dumps(syndication_data)
-    }
+    # Only the state list ships with the page; stations are fetched per state
+    context = {'states': get_syndication_by_state()['states']}
     return render(request, 'archives/show_info.html', context)
 
 
-# View for Statistics page
-def statistics_view(request):
-    cached_stats = StatisticsCache.objects.order_by('-updated_at').first()
-    context = {}
-
-    if cached_stats:
-        context = cached_stats.data
-
-        latest_game_id = context.get('latest_game_id')
-        if latest_game_id:
-            context['latest_game'] = Game.objects.get(id=latest_game_id)
-
-        def rehydrate_players(player_data_list):
-            if not player_data_list: return []
-
-            player_ids = [p_data.get('id') for p_data in player_data_list if p_data.get('id')]
-            if not player_ids: return []
-
-            players_dict = {p.id: p for p in Player.objects.filter(id__in=player_ids).select_related('game')}
+def _syndication_state_etag(request, state):
+    entry = get_syndication_by_state()['by_state'].get(state)
+    return entry['etag'] if entry else None
 
-            rehydrated_list = []
-            for p_data in player_data_list:
-                player_id = p_data.get('id')
-                player_obj = players_dict.get(player_id)
-                if player_obj:
-                    player_obj.fast_line_total = p_data.get('fast_line_total')
-                    player_obj.round_total = p_data.get('round_total')
-                    player_obj.page_number = p_data.get('page_number')
-                    rehydrated_list.append(player_obj)
-            return rehydrated_list
 
-        context['top_fast_line_players'] = rehydrate_players(context.get('top_fast_line_players', []))
-        context['top_fast_line_scores'] = rehydrate_players(context.get('top_fast_line_scores', []))
-        context['leaderboard_data'] = rehydrate_players(context.get('leaderboard_data', []))
+# Stations for one state, for the Show Info dropdown
+@replica_reads
+@cache_control(public=True, max_age=3600)
+@condition(etag_func=_syndication_state_etag)
+def syndication_state_api(request, state):
+    entry = get_syndication_by_state()['by_state'].get(state)
+    if not entry:
+        return JsonResponse({'message': 'No syndication data for this state.'}, status=404)
+    return HttpResponse(entry['json'], content_type='application/json')
 
-        for podium_lb in context.get('podium_leaderboards', []):
-            podium_lb['players'] = rehydrate_players(podium_lb.get('players', []))
 
-        # Re-hydrating comebacks requires the player object for the link
-        for comeback in context.get('top_comebacks', []):
-            player_data = comeback.get('player', {})
-            player_id = player_data.get('id')
-            if player_id:
-                comeback['player'] = Player.objects.get(id=player_id)
-
-    return render(request, 'archives/statistics.html', context)
+# View for Statistics page
+@replica_reads
+@condition(etag_func=archive_etag)
+def statistics_view(request):
+    return render(request, 'archives/statistics.html', {'fragments': get_snapshot().fragments})
 
 
 # View for Analysis page
+@replica_reads
+@condition(etag_func=static_page_etag)
 def analysis_view(request):
     return render(request, 'archives/analysis.html')
 
 
 # View for About page
+@replica_reads
+@condition(etag_func=static_page_etag)
 def about_view(request):
     return render(request, 'archives/about.html')
 
 
+# Request metrics (only when REQUEST_METRICS is enabled)
+def metrics_view(request):
+    if not settings.REQUEST_METRICS:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        authorized = True
+    if not authorized:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4')
+
+
 # Helper function and view for the new Beta Test page
 def is_beta_tester(user):
     return user.is_authenticated and user.role == CustomUser.Role.BETA_TESTER
@@ -217,54 +133,79 @@ def play_view(request):
 @login_required
 @permission_required('archives.add_game', raise_exception=True)
 def add_preliminary_line_view(request):
+    """
+    Enters the preliminary lines of one game (any of its missing rounds, up to all four) in one
+    submission. Without a ?game= the page opens on the next (game, round) that has no line.
+    """
+    # Scorekeeper-only modules are imported on first use rather than by every worker at startup
+    from .forms import PreliminaryBatchGameForm, PreliminaryRoundFormSet
+    from .preliminary_lines import missing_rounds, next_missing_line, save_lines
+    from django.contrib import messages
+
     if request.method == 'POST':
-        form = PreliminaryLineForm(request.POST)
-        if form.is_valid():
-            instance = form.save()
-            messages.success(request,
-                             f"Successfully added line for Game {instance.game.id}, Round {instance.round_number}.")
-
-            # Smart redirect logic
-            next_game_id = instance.game.id
-            next_round_number = instance.round_number + 1
-            if instance.round_number == 4:
-                next_game_id += 1
-                next_round_number = 1
-
-            redirect_url = f"{reverse('add_line')}?game={next_game_id}&round_number={next_round_number}"
-            return redirect(redirect_url)
+        game_form = PreliminaryBatchGameForm(request.POST)
+        formset = PreliminaryRoundFormSet(request.POST, form_kwargs={'empty_permitted': True,
+                                                                     'use_required_attribute': False})
+        if game_form.is_valid() and formset.is_valid():
+            game = game_form.cleaned_data['game']
+            lines = [PreliminaryLine(game=game, **form.cleaned_data) for form in formset if form.has_changed()]
+            errors = save_lines(lines) if lines else ['Fill in at least one round.']
+            if not errors:
+                rounds = ', '.join(str(line.round_number) for line in lines)
+                messages.success(request, f"Successfully added lines for Game {game.id}, Round(s) {rounds}.")
+                return redirect('add_line')
+            for error in errors:
+                formset.non_form_errors().append(error)
     else:
-        initial_data = {
-            'game': request.GET.get('game'),
-            'round_number': request.GET.get('round_number')
-        }
-        form = PreliminaryLineForm(initial=initial_data)
-
-    # If no initial data is provided via GET, determine the next logical entry
-    if not request.GET.get('game'):
-        last_line = PreliminaryLine.objects.order_by('-game__id', '-round_number').first()
-        if last_line:
-            next_game = last_line.game
-            next_round = last_line.round_number + 1
-            if next_round > 4:
-                next_round = 1
-                # Find the next game ID in sequence
-                next_game_obj = Game.objects.filter(id__gt=next_game.id).order_by('id').first()
-                if next_game_obj:
-                    next_game = next_game_obj
-                else:  # Or just increment if there's a gap
-                    next_game = Game.objects.get(id=next_game.id + 1)
-
-            form.initial['game'] = next_game
-            form.initial['round_number'] = next_round
+        game_id = request.GET.get('game')
+        if not game_id:
+            next_line = next_missing_line()
+            game_id = next_line[0] if next_line else None
+        rounds = missing_rounds(game_id) if game_id else []
+        game_form = PreliminaryBatchGameForm(initial={'game': game_id})
+        formset = PreliminaryRoundFormSet(initial=[{'round_number': r} for r in rounds],
+                                          form_kwargs={'empty_permitted': True, 'use_required_attribute': False})
+
+    return render(request, 'archives/add_preliminary_line.html', {'game_form': game_form, 'formset': formset})
+
+
+# Batch API: {"lines": [{"game": <id>, "round_number": 1, "topic": ..., ...}, ...]} for any number of games.
+# Session authenticated, so clients send the csrftoken cookie's value in an X-CSRFToken header
+@login_required
+@permission_required('archives.add_game', raise_exception=True)
+def preliminary_lines_api(request):
+    from .forms import PreliminaryRoundForm
+    from .preliminary_lines import next_missing_line, save_lines
+
+    if request.method != 'POST':
+        return JsonResponse({'message': 'Only POST method is allowed.'}, status=405)
+    try:
+        entries = json.loads(request.body).get('lines', [])
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'message': 'Invalid JSON format.'}, status=400)
+
+    lines, errors = [], []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({'index': index, 'errors': {'__all__': ['Each line must be an object.']}})
+            continue
+        form = PreliminaryRoundForm(entry)
+        if not form.is_valid():
+            errors.append({'index': index, 'errors': form.errors})
+        elif not isinstance(entry.get('game'), int) or isinstance(entry['game'], bool):
+            errors.append({'index': index, 'errors': {'game': ['A game id is required.']}})
         else:
-            # First ever entry, default to first game
-            first_game = Game.objects.order_by('id').first()
-            if first_game:
-                form.initial['game'] = first_game
-                form.initial['round_number'] = 1
+            lines.append(PreliminaryLine(game_id=entry['game'], **form.cleaned_data))
+    if errors:
+        return JsonResponse({'message': 'Some lines are invalid.', 'errors': errors}, status=400)
 
-    return render(request, 'archives/add_preliminary_line.html', {'form': form})
+    conflicts = save_lines(lines)
+    if conflicts:
+        return JsonResponse({'message': 'Nothing was saved.', 'errors': conflicts}, status=409)
+    next_line = next_missing_line()
+    return JsonResponse({'message': f'Saved {len(lines)} lines.', 'created': len(lines),
+                         'next': {'game': next_line[0], 'round_number': next_line[1]} if next_line else None},
+                        status=201)
 
 
 # API Endpoint
@@ -275,7 +216,7 @@ def game_entry_api(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            from django.db import transaction
+            from .stats_utils import update_statistics_cache
             with transaction.atomic():
                 game = Game.objects.create(
                     submitted_by=request.user,
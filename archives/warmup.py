@@ -0,0 +1,81 @@
+"""
+Warm-up for a freshly started process, so its first requests don't pay the one-off costs:
+compiling the templates, building the URL resolver, connecting to the databases and loading the
+archive snapshot (which also holds the statistics page) and the default leaderboards.
+
+gunicorn_conf runs the process steps in the master when the app is preloaded (the workers
+inherit the compiled templates and resolver) and all steps in every worker after boot.
+`manage.py warmup` runs them by hand and reports how long each took.
+"""
+from .db_router import use_replica
+from .read_model import get_snapshot
+from gameplay.leaderboards import get_leaderboard_tables
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def warm_templates():
+    names = []
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for dirpath, _, filenames in os.walk(directory):
+            names += [os.path.relpath(os.path.join(dirpath, name), directory)
+                      for name in filenames if name.endswith('.html')]
+    for name in names:
+        get_template(name)
+    return f'{len(names)} templates'
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.resolve('/')
+    reverse('index')
+    return f'{len(resolver.reverse_dict)} URL names'
+
+
+def warm_databases():
+    # Under gthread each request thread still opens its own connection; this warms the worker's
+    # own thread and checks the databases are reachable before traffic arrives
+    for alias in connections:
+        connections[alias].ensure_connection()
+    return f'{len(connections.all())} connections'
+
+
+def warm_archive():
+    with use_replica():
+        snapshot = get_snapshot()
+    return f'{type(snapshot).__name__} version {snapshot.version}, {len(snapshot.games)} games'
+
+
+def warm_leaderboards():
+    with use_replica():
+        get_leaderboard_tables('prelim', 'solo')
+    return 'prelim/solo'
+
+
+# No database access, so safe before gunicorn forks the workers
+PROCESS_STEPS = [('templates', warm_templates), ('urls', warm_urls)]
+WORKER_STEPS = [('databases', warm_databases), ('archive', warm_archive), ('leaderboards', warm_leaderboards)]
+
+
+def warm_up(steps=None):
+    """
+    Runs the warm-up steps (all by default) and returns [(name, seconds, detail), ...]. A step
+    that fails is logged and skipped; the request that needs it will simply be slower.
+    """
+    results = []
+    for name, step in steps or PROCESS_STEPS + WORKER_STEPS:
+        start = time.perf_counter()
+        try:
+            detail = step()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+            detail = 'failed'
+        results.append((name, time.perf_counter() - start, detail))
+    return results
@@ -0,0 +1,58 @@
+from archives.models import Leaderboard
+from archives.swr import cached
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from datetime import date, timedelta
+import hashlib
+import json
+
+PERIODS = ('daily', 'weekly', 'monthly')
+
+
+def leaderboard_scores(game_type, play_type):
+    """
+    The daily, weekly and monthly top 10 scores for one game type and play type.
+    """
+    today = date.today()
+    scores = Leaderboard.objects.filter(game_type=game_type, play_type=play_type).select_related(
+        'game_played').order_by('-score')
+    return {
+        'daily': scores.filter(date__date=today)[:10],
+        'weekly': scores.filter(date__date__gte=today - timedelta(days=7))[:10],
+        'monthly': scores.filter(date__date__gte=today - timedelta(days=30))[:10],
+    }
+
+
+def render_leaderboard_tables(game_type, play_type):
+    """
+    The three leaderboard tables as HTML, as returned by the leaderboard API.
+    """
+    scores = leaderboard_scores(game_type, play_type)
+    return {f'{period}_html': render_to_string('gameplay/leaderboard_table.html',
+                                               {'scores': scores[period], 'type': period})
+            for period in PERIODS}
+
+
+def _cache_key(game_type, play_type):
+    return f'leaderboard:{game_type}:{play_type}'
+
+
+def get_leaderboard_tables(game_type, play_type):
+    """
+    The rendered tables and their ETag, {'html': {...}, 'etag': ...}, served stale-while-revalidate.
+    Types outside the model's choices aren't cached (they come straight from the query string).
+    """
+    def compute():
+        html = render_leaderboard_tables(game_type, play_type)
+        return {'html': html, 'etag': hashlib.md5(json.dumps(html, sort_keys=True).encode()).hexdigest()}
+
+    if (game_type not in dict(Leaderboard.GAME_TYPE_CHOICES)
+            or play_type not in dict(Leaderboard.PLAY_TYPE_CHOICES)):
+        return compute()
+    return cached(_cache_key(game_type, play_type), compute, settings.LEADERBOARD_FRESH_SECONDS,
+                  settings.LEADERBOARD_STALE_SECONDS)
+
+
+def clear_leaderboard_cache(game_type, play_type):
+    cache.delete(_cache_key(game_type, play_type))
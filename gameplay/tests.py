@@ -1,3 +1,31 @@
-from django.test import TestCase
+from archives.models import CustomUser, Leaderboard
+from archives.synthetic import generate_archive
+from django.test import Client, TestCase
+from django.urls import reverse
+import json
 
-# Create your tests here.
+
+class GameplaySmokeTests(TestCase):
+    def setUp(self):
+        generate_archive(4, leaderboard_entries=12)
+        self.client = Client()
+        self.client.force_login(CustomUser.objects.create_superuser(email='tester@example.com', password='x'))
+
+    def test_prelim_game_page(self):
+        response = self.client.get(reverse('gameplay:prelim_game'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('rounds', response.context['game_data_json'])
+
+    def test_leaderboard_api(self):
+        response = self.client.get(reverse('gameplay:get_leaderboard_api'), {'game_type': 'prelim', 'play_type': 'solo'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(json.loads(response.content)), {'daily_html', 'weekly_html', 'monthly_html'})
+
+    def test_save_score_clears_leaderboard(self):
+        game = Leaderboard.objects.first().game_played
+        response = self.client.post(reverse('gameplay:save_score_api'), json.dumps(
+            {'name': 'Top', 'score': 99999, 'game_type': 'prelim', 'play_type': 'solo', 'game_id': game.id}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        tables = json.loads(self.client.get(reverse('gameplay:get_leaderboard_api')).content)
+        self.assertIn('99999', tables['daily_html'])
@@ -5,8 +5,10 @@ import json
 import random
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from datetime import date, timedelta
-from django.template.loader import render_to_string
+from django.views.decorators.http import condition
+from archives.conditional import leaderboard_etag
+from archives.db_router import replica_reads
+from .leaderboards import clear_leaderboard_cache, get_leaderboard_tables
 
 
 def is_beta_tester_or_superuser(user):
@@ -24,6 +26,7 @@ def play_view(request):
     return render(request, 'gameplay/play.html')
 
 
+@replica_reads
 @user_passes_test(is_beta_tester_or_superuser)
 def prelim_game_view(request):
     """
@@ -56,26 +59,12 @@ def prelim_game_view(request):
             'rounds': rounds_data
         }
 
-    # Fetch Leaderboard Data for initial page load
-    today = date.today()
-
-    daily_scores = Leaderboard.objects.filter(
-        game_type='prelim', play_type='solo', date__date=today
-    ).select_related('game_played').order_by('-score')[:10]
-
-    weekly_scores = Leaderboard.objects.filter(
-        game_type='prelim', play_type='solo', date__date__gte=today - timedelta(days=7)
-    ).select_related('game_played').order_by('-score')[:10]
-
-    monthly_scores = Leaderboard.objects.filter(
-        game_type='prelim', play_type='solo', date__date__gte=today - timedelta(days=30)
-    ).select_related('game_played').order_by('-score')[:10]
+    # Leaderboard tables for initial page load (the same cached HTML the leaderboard API returns)
+    leaderboards = get_leaderboard_tables('prelim', 'solo')['html']
 
     context = {
         'game_data_json': json.dumps(game_data),
-        'daily_scores': daily_scores,
-        'weekly_scores': weekly_scores,
-        'monthly_scores': monthly_scores,
+        'leaderboards': leaderboards,
     }
     return render(request, 'gameplay/prelim_game.html', context)
 
@@ -98,37 +87,20 @@ def save_score_api(request):
                 play_type=data.get('play_type'),
                 game_played_id=data.get('game_id')
             )
+            clear_leaderboard_cache(data.get('game_type'), data.get('play_type'))
             return JsonResponse({'message': 'Score saved successfully!'}, status=201)
         except Exception as e:
             return JsonResponse({'message': f'An error occurred: {str(e)}'}, status=500)
     return JsonResponse({'message': 'Invalid request method'}, status=405)
 
 
+@replica_reads
 @user_passes_test(is_beta_tester_or_superuser)
+@condition(etag_func=leaderboard_etag)
 def get_leaderboard_api(request):
     """
     API endpoint to fetch and render leaderboard tables.
     """
     game_type = request.GET.get('game_type', 'prelim')
     play_type = request.GET.get('play_type', 'solo')
-    today = date.today()
-
-    daily_scores = Leaderboard.objects.filter(game_type=game_type, play_type=play_type,
-                                              date__date=today).select_related('game_played').order_by('-score')[:10]
-    weekly_scores = Leaderboard.objects.filter(game_type=game_type, play_type=play_type,
-                                               date__date__gte=today - timedelta(days=7)).select_related(
-        'game_played').order_by('-score')[:10]
-    monthly_scores = Leaderboard.objects.filter(game_type=game_type, play_type=play_type,
-                                                date__date__gte=today - timedelta(days=30)).select_related(
-        'game_played').order_by('-score')[:10]
-
-    daily_html = render_to_string('gameplay/leaderboard_table.html', {'scores': daily_scores, 'type': 'daily'})
-    weekly_html = render_to_string('gameplay/leaderboard_table.html', {'scores': weekly_scores, 'type': 'weekly'})
-    monthly_html = render_to_string('gameplay/leaderboard_table.html', {'scores': monthly_scores, 'type': 'monthly'})
-
-    return JsonResponse({
-        'daily_html': daily_html,
-        'weekly_html': weekly_html,
-        'monthly_html': monthly_html,
-    })
-
+    return JsonResponse(get_leaderboard_tables(game_type, play_type)['html'])
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'perfectarchive.settings')
 
+# Under ASGI each request can land on a different thread, so persistent per-thread connections
+# pile up instead of being reused. Default to closing them per request; set DB_POOL=True to
+# share a connection pool across threads instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
 application = get_asgi_application()
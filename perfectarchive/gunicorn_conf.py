@@ -0,0 +1,66 @@
+"""
+Gunicorn settings for production (python -m gunicorn -c python:perfectarchive.gunicorn_conf).
+Every value can be overridden from the environment; see the README for the knobs.
+
+The default worker model is gthread: several threads per worker process, so one slow
+/statistics/ rebuild or game_entry_api request ties up a thread rather than the whole site.
+Set GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker (needs the uvicorn package) to serve
+the ASGI application instead.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Each thread keeps its own persistent database connection, so MySQL sees up to workers * threads
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+wsgi_app = ('perfectarchive.asgi:application' if 'uvicorn' in worker_class
+            else 'perfectarchive.wsgi:application')
+
+# Import Django and the project once in the master; workers share those pages copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Recycle workers now and then so slow leaks (per-process caches, fragmentation) can't build up;
+# the jitter keeps them from all restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+# A full statistics rebuild runs inside game_entry_api, so allow well over the default 30s
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Heartbeat files on a container's overlay filesystem can stall workers; use memory instead
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+# Compile templates, load the archive snapshot etc. before a worker takes traffic (archives/warmup.py)
+warmup = os.environ.get('GUNICORN_WARMUP', 'True') == 'True'
+
+
+def when_ready(server):
+    # The preloaded master compiles the templates and URL resolver once; every worker inherits them
+    if preload_app and warmup:
+        from archives.warmup import PROCESS_STEPS, warm_up
+        warm_up(PROCESS_STEPS)
+
+
+def post_worker_init(worker):
+    if warmup:
+        from archives.warmup import warm_up
+        for name, seconds, detail in warm_up():
+            worker.log.debug('Warm-up %s: %.1f ms (%s)', name, seconds * 1000, detail)
+
+
+def pre_fork(server, worker):
+    # Nothing should have connected during preload, but a socket inherited by the workers would
+    # be shared between processes
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
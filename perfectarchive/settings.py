@@ -37,6 +37,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'archives.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -45,6 +47,30 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in request instrumentation: Server-Timing headers, per-view percentiles at /metrics/ and a
+# warning log whenever a request issues more than REQUEST_QUERY_BUDGET queries.
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', 'False') == 'True'
+REQUEST_QUERY_BUDGET = int(os.environ.get('REQUEST_QUERY_BUDGET', '50'))
+# Lets a scraper read /metrics/ with "Authorization: Bearer <token>"; otherwise staff only
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'archives.middleware.QueryTimingMiddleware')
+
+# Responses smaller than this many bytes are sent uncompressed (archives.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+# How often each worker checks whether its in-memory archive snapshot (archives/read_model.py) is
+# still current; 0 checks on every request
+READ_MODEL_PROBE_SECONDS = float(os.environ.get('READ_MODEL_PROBE_SECONDS', '2'))
+# Until a snapshot has gone this long without a successful check, requests are served from it
+# while the check runs in the background; after that they wait for it (archives/swr.py)
+READ_MODEL_STALE_SECONDS = float(os.environ.get('READ_MODEL_STALE_SECONDS', '300'))
+# Binary archive snapshot written by the statistics rebuild and memory-mapped by every worker
+# (archives/snapshot_file.py), so the archive is held once per host instead of once per worker.
+# Must be on storage shared by the workers; empty disables it.
+ARCHIVE_SNAPSHOT_PATH = os.environ.get('ARCHIVE_SNAPSHOT_PATH', '')
+# Part of every page ETag (archives/conditional.py); defaults to the newest template mtime
+APP_RELEASE = os.environ.get('APP_RELEASE', '')
+
 ROOT_URLCONF = 'perfectarchive.urls'
 
 TEMPLATES = [
@@ -53,6 +79,8 @@ TEMPLATES = [
         # THIS IS THE FIX: This line tells Django to look in your top-level 'templates' folder.
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
+        # No 'loaders' here on purpose: Django then wraps the default loaders in the cached loader,
+        # so each template is compiled once per process (and reloaded on change under runserver).
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -78,6 +106,61 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Keep connections open between requests instead of paying a fresh TCP+auth handshake
+        # every time. Set DB_CONN_MAX_AGE=0 to go back to one connection per request.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        # Ping a reused connection before the first query of a request so a connection that
+        # MySQL dropped (wait_timeout, failover) is replaced instead of erroring.
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    }
+}
+
+# Pooled mode (mainly for the ASGI path, where each request may run on a different thread and
+# persistent connections can't be reused). Requires the optional django-db-connection-pool[mysql]
+# package; the pool owns connection lifetime, so Django's own reuse is switched off.
+if os.environ.get('DB_POOL', 'False') == 'True':
+    DATABASES['default']['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL_OPTIONS'] = {
+        'POOL_SIZE': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'MAX_OVERFLOW': int(os.environ.get('DB_POOL_MAX_OVERFLOW', '10')),
+        'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', '3600')),
+        'PRE_PING': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    }
+
+# Local stand-in for MySQL (benchmarks, offline development): DB_ENGINE=sqlite
+if os.environ.get('DB_ENGINE', 'mysql') == 'sqlite':
+    DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
+    DATABASES['default']['NAME'] = os.environ.get('DB_NAME') or os.path.join(BASE_DIR, 'db.sqlite3')
+
+# Optional read replica (archives/db_router.py). Public read views and the statistics rebuild read
+# from it; writes, the scorekeeper flows and the admin stay on primary, and a client that just
+# wrote keeps reading from primary for DB_REPLICA_PIN_SECONDS. Locally, point DB_REPLICA_NAME at
+# a copy of the SQLite file.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ.get('DB_REPLICA_NAME') or DATABASES['default']['NAME'],
+        USER=os.environ.get('DB_REPLICA_USER') or DATABASES['default']['USER'],
+        PASSWORD=os.environ.get('DB_REPLICA_PASSWORD') or DATABASES['default']['PASSWORD'],
+        HOST=os.environ.get('DB_REPLICA_HOST') or DATABASES['default']['HOST'],
+        PORT=os.environ.get('DB_REPLICA_PORT') or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_ROUTERS = ['archives.db_router.PrimaryReplicaRouter']
+    DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '5'))
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+                      'archives.db_router.ReplicaPinMiddleware')
+
+
+# Cache
+# Defaults to a per-process in-memory cache. Point CACHE_BACKEND/CACHE_LOCATION at a shared cache
+# (e.g. django.core.cache.backends.redis.RedisCache) so invalidations reach every gunicorn worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'perfectarchive'),
     }
 }
 
@@ -120,6 +203,49 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Front-end assets are built ahead of time (npm run build -> static/dist/) instead of compiled in the
+# browser. collectstatic writes content-hashed copies plus .gz/.br variants, and WhiteNoise serves
+# the hashed files with far-future immutable cache headers. Hashed URLs need the manifest that
+# collectstatic writes, so STATIC_MANIFEST defaults to whether it exists: a checkout that hasn't
+# run the build and collectstatic serves files under their own names instead of failing every
+# page. Deploys run STATIC_MANIFEST=True python manage.py collectstatic (the Dockerfile does).
+STATIC_MANIFEST = os.environ.get(
+    'STATIC_MANIFEST', str(os.path.exists(os.path.join(STATIC_ROOT, 'staticfiles.json')))) == 'True'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': ('whitenoise.storage.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+                    else 'whitenoise.storage.CompressedStaticFilesStorage'),
+    },
+}
+
+# How new StatisticsCache rows are stored: 'zlib' (compact JSON, compressed), 'msgpack' (needs the
+# msgpack package, else zlib) or 'json' (compact but uncompressed, readable in the admin/DB shell)
+STATS_CACHE_ENCODING = os.environ.get('STATS_CACHE_ENCODING', 'zlib')
+# Each new StatisticsCache row is stored as a delta against the previous one, with a full keyframe
+# every this many rows (archives/stats_versions.py); 1 stores every row in full
+STATS_CACHE_KEYFRAME_INTERVAL = int(os.environ.get('STATS_CACHE_KEYFRAME_INTERVAL', '20'))
+
+# The statistics rebuild streams the archive in windows of this many games (archives/stats_utils.py),
+# so its memory use stays flat however large the archive gets
+STATS_CHUNK_SIZE = int(os.environ.get('STATS_CHUNK_SIZE', '2000'))
+# Bootstrap resamples behind the confidence intervals on the podium and turn order statistics
+# (archives/stats_bootstrap.py, needs numpy, in requirements.txt); 0 turns them off
+STATS_BOOTSTRAP_RESAMPLES = int(os.environ.get('STATS_BOOTSTRAP_RESAMPLES', '2000'))
+
+# Gameplay leaderboard tables are cached for LEADERBOARD_FRESH_SECONDS and then served stale for up
+# to LEADERBOARD_STALE_SECONDS more while one request refreshes them (archives/swr.py). A new score
+# clears its leaderboard right away.
+LEADERBOARD_FRESH_SECONDS = int(os.environ.get('LEADERBOARD_FRESH_SECONDS', '30'))
+LEADERBOARD_STALE_SECONDS = int(os.environ.get('LEADERBOARD_STALE_SECONDS', '600'))
+
+# Static pre-rendering of the public archive (manage.py prerender_site). With PRERENDER_ON_SAVE
+# the affected pages are re-rendered whenever a new statistics cache is saved (i.e. a game).
+PRERENDER_ROOT = os.environ.get('PRERENDER_ROOT', os.path.join(BASE_DIR, 'prerendered'))
+PRERENDER_ON_SAVE = os.environ.get('PRERENDER_ON_SAVE', 'False') == 'True'
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -0,0 +1,11 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+  // Every class used by the site appears literally in a template (including inline JS)...
+  content: ['./templates/**/*.html'],
+  // ...except the stat colors, which are built as text-{{ color }}-400 from stats_utils values
+  safelist: [{ pattern: /^text-(green|yellow|red|gray)-400$/ }],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};